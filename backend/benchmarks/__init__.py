@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+"""
+Benchmarks of the ingestion and query paths, on a database of synthetic measurements:
+
+	python -m benchmarks [--days 90] [--step 60] [--only queries api] [--json results.json]
+
+Each suite module has a `run(options)` function returning a list of result dicts, each one with the `suite` and
+`name` keys identifying it between runs and its measured values. Results saved with `--json` from two versions are
+compared with:
+
+	python -m benchmarks.compare before.json after.json
+"""
+
+__author__ = 'quentingerome'
+
+from coolnhot.factory import create_app
+import resource
+import time
+
+
+def create_benchmark_app(database, **config):
+	"""
+	An app on the SQLite `database` file, with the benchmarks settings and the `config` overrides.
+	"""
+	class Config(object):
+		SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database
+
+	for name, value in config.iteritems():
+		setattr(Config, name, value)
+	return create_app(__name__, Config)
+
+
+def best_of(repeat, f):
+	"""
+	The lowest wall clock time of `repeat` calls of `f`, in seconds.
+	"""
+	timings = []
+	for _ in range(repeat):
+		started = time.time()
+		f()
+		timings.append(time.time() - started)
+	return min(timings)
+
+
+def peak_memory():
+	"""
+	The peak resident set size of the process, in kilobytes (as reported by Linux).
+	"""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
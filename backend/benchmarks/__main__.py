@@ -0,0 +1,122 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+
+from datetime import datetime
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+from coolnhot.extensions import db
+from . import create_benchmark_app, peak_memory
+from . import queries, api, aggregation, validation, ingestion
+from .data import generate, populate
+
+#: Suites in the order they run, the ingestion one writes to the database
+SUITES = (
+	('queries', queries), ('api', api), ('aggregation', aggregation), ('validation', validation), ('ingestion', ingestion),
+)
+
+
+def _sensors(count):
+	return ['default'] + ['sensor%d' % i for i in range(1, count)]
+
+
+def _app(database, options):
+	return create_benchmark_app(database, SENSORS=dict((s, dict(bus=1, address=0x40)) for s in _sensors(options.sensors)))
+
+
+def _populate(database, options):
+	app = _app(database, options)
+	with app.app_context():
+		db.create_all()
+		started = time.time()
+		rows = populate(generate(options.days, options.step, _sensors(options.sensors)))
+		return dict(suite='setup', name='populate', rows=rows, seconds=time.time() - started, peak_rss_kb=peak_memory())
+
+
+def _run_suite(name, database, options):
+	app = _app(database, options)
+	with app.app_context():
+		results = dict(SUITES)[name].run(options)
+		db.session.remove()
+	rss = peak_memory()
+	for result in results:
+		result['peak_rss_kb'] = rss
+	return results
+
+
+def _in_process(f, *args):
+	"""
+	Call `f` in a new process, so each suite's peak memory is its own.
+	"""
+	pool = multiprocessing.Pool(1)
+	try:
+		return pool.apply(f, args)
+	finally:
+		pool.close()
+		pool.join()
+
+
+def _revision():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=open(os.devnull, 'w')).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def _format(result):
+	values = ' '.join(
+		'%s=%s' % (k, ('%.3fms' % (v * 1000)) if k == 'seconds' else ('%.0f' % v if isinstance(v, float) else v))
+		for k, v in sorted(result.iteritems()) if k not in ('suite', 'name')
+	)
+	return '%-12s %-32s %s' % (result['suite'], result['name'], values)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the ingestion and query paths on synthetic measurements")
+	parser.add_argument('--days', type=int, default=90, help="Days of synthetic measurements")
+	parser.add_argument('--step', type=int, default=60, help="Seconds between two synthetic measurements")
+	parser.add_argument('--sensors', type=int, default=1)
+	parser.add_argument('--repeat', type=int, default=3, help="Runs of each timing, the best one is kept")
+	parser.add_argument('--samples', type=int, default=200, help="Samples taken by the ingestion suite")
+	parser.add_argument('--bulk-rows', dest='bulk_rows', type=int, default=20000, help="Rows bulk inserted by the ingestion suite")
+	parser.add_argument('--only', nargs='+', choices=[name for name, _ in SUITES], help="Suites to run, all by default")
+	parser.add_argument('--json', dest='output', help="Write the results to this JSON file")
+	options = parser.parse_args()
+
+	tmp = tempfile.mkdtemp()
+	database = os.path.join(tmp, 'benchmark.db')
+	try:
+		results = [_in_process(_populate, database, options)]
+		print(_format(results[0]))
+		for name, _ in SUITES:
+			if options.only and name not in options.only:
+				continue
+			for result in _in_process(_run_suite, name, database, options):
+				print(_format(result))
+				results.append(result)
+	finally:
+		shutil.rmtree(tmp)
+
+	if options.output:
+		with open(options.output, 'w') as f:
+			json.dump(dict(
+				meta=dict(
+					date=datetime.utcnow().isoformat(),
+					revision=_revision(),
+					python=platform.python_version(),
+					options=vars(options),
+				),
+				results=results,
+			), f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,53 @@
+# -*- coding: UTF-8 -*-
+"""
+The per_interval aggregation paths over the whole synthetic measurements: the rollups, the raw measurements grouped
+in SQL, the NumPy engine (when installed) and the binary log storage, the measurements being exported to a temporary
+log first.
+"""
+
+__author__ = 'quentingerome'
+
+from datetime import timedelta
+import shutil
+import tempfile
+
+from coolnhot.extensions import db
+from coolnhot.models import Measurement
+from coolnhot.models.binlog import MeasurementLog
+from coolnhot.models.storage import export_to_log
+from coolnhot import aggregation
+from . import best_of
+from .data import START
+
+INTERVALS = (15, 45, 300, 3600)
+
+
+def run(options):
+	end_at = START + timedelta(days=options.days)
+	tmp = tempfile.mkdtemp()
+	try:
+		log = MeasurementLog(tmp)
+		with db.engine.connect() as connection:
+			export_to_log(connection, log, batch_size=10000)
+
+		paths = [
+			('sql', lambda interval: db.session.execute(Measurement.query.per_interval(interval, START, end_at)).fetchall()),
+			('sql raw', lambda interval: db.session.execute(
+				Measurement.query.raw_per_interval(interval, START, end_at)).fetchall()),
+		]
+		if 'numpy' in aggregation.ENGINES:
+			paths.append(('numpy', lambda interval: aggregation.per_interval(interval, START, end_at)))
+		paths.append(('log', lambda interval: log.per_interval(interval, START, end_at)))
+
+		results = []
+		for interval in INTERVALS:
+			for name, path in paths:
+				results.append(dict(
+					suite='aggregation',
+					name='%s %ds' % (name, interval),
+					buckets=len(path(interval)),
+					seconds=best_of(options.repeat, lambda: path(interval)),
+				))
+		return results
+	finally:
+		shutil.rmtree(tmp)
@@ -0,0 +1,38 @@
+# -*- coding: UTF-8 -*-
+"""
+End-to-end latency and payload size of `GET /measurements` for growing ranges, in every format, with the default 5
+minutes buckets and with `max_points=1000`. The response cache is cleared before each request.
+"""
+
+__author__ = 'quentingerome'
+
+import flask
+from coolnhot.extensions import response_cache
+from . import best_of
+from .data import ranges
+
+FORMATS = ('json', 'columnar', 'binary')
+
+
+def run(options):
+	client = flask.current_app.test_client()
+	results = []
+	for label, start_at, end_at in ranges(options.days):
+		variants = [(fmt, dict(format=fmt)) for fmt in FORMATS] + [('json max_points=1000', dict(max_points=1000))]
+		for name, params in variants:
+			params.update(start_at=start_at.isoformat(), end_at=end_at.isoformat())
+			sizes = []
+
+			def get():
+				response_cache.clear()
+				r = client.get('/measurements', query_string=params)
+				assert r.status_code == 200, r.status_code
+				sizes.append(len(r.data))
+
+			results.append(dict(
+				suite='api',
+				name='%s %s' % (name, label),
+				seconds=best_of(options.repeat, get),
+				bytes=sizes[-1],
+			))
+	return results
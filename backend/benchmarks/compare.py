@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+"""
+Compare two result files of `python -m benchmarks --json`:
+
+	python -m benchmarks.compare before.json after.json [--threshold 0.1]
+
+Prints the time ratio of every benchmark found in both, flagging the ones slower by more than `threshold`, and exits
+with status 1 if any is.
+"""
+
+__author__ = 'quentingerome'
+
+import argparse
+import json
+import sys
+
+
+def _load(path):
+	with open(path) as f:
+		return dict(((r['suite'], r['name']), r) for r in json.load(f)['results'])
+
+
+def compare(before, after, threshold=0.1):
+	"""
+	Return `(suite, name, before seconds, after seconds, regressed)` for the benchmarks of both result dicts.
+	"""
+	rows = []
+	for key in sorted(set(before) & set(after)):
+		b, a = before[key]['seconds'], after[key]['seconds']
+		rows.append(key + (b, a, b > 0 and a / b > 1 + threshold))
+	return rows
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+	parser.add_argument('before')
+	parser.add_argument('after')
+	parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown ratio reported as a regression")
+	args = parser.parse_args()
+
+	rows = compare(_load(args.before), _load(args.after), args.threshold)
+	for suite, name, b, a, regressed in rows:
+		print('%-12s %-32s %10.1fms %10.1fms %+7.1f%%%s' % (
+			suite, name, b * 1000, a * 1000, (a / b - 1) * 100 if b else 0, '  REGRESSION' if regressed else ''))
+	sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+	main()
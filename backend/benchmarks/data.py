@@ -0,0 +1,66 @@
+# -*- coding: UTF-8 -*-
+"""
+Synthetic measurements: a daily and a yearly temperature cycle with some noise, the relative humidity moving the
+other way.
+"""
+
+__author__ = 'quentingerome'
+
+from datetime import datetime, timedelta
+from coolnhot.extensions import db
+from coolnhot.models import Measurement, rebuild_rollups, to_epoch
+import math
+import random
+
+#: The first synthetic measurement
+START = datetime(2015, 1, 1)
+
+DAY = 86400
+YEAR = 365 * DAY
+
+
+def generate(days, step=60, sensor_ids=('default',), start=START, seed=0):
+	"""
+	Yield `(created_at, temperature, humidity, sensor_id)` tuples every `step` seconds for `days` days, for each sensor.
+	"""
+	rng = random.Random(seed)
+	for offset in xrange(0, days * DAY, step):
+		created_at = start + timedelta(seconds=offset)
+		cycle = math.sin(2 * math.pi * offset / DAY) * 3 + math.sin(2 * math.pi * offset / YEAR) * 8
+		for i, sensor_id in enumerate(sensor_ids):
+			temperature = 15 + i + cycle + rng.gauss(0, 0.3)
+			humidity = 55 - cycle * 1.5 + rng.gauss(0, 1)
+			yield created_at, round(temperature, 2), round(humidity, 2), sensor_id
+
+
+def populate(rows, batch_size=10000):
+	"""
+	Insert the `rows` in the measurements table with one executemany per batch, then build the rollups from them:
+	much faster than folding every batch into the rollups. Returns the number of rows inserted.
+	"""
+	count = 0
+	batch = []
+	with db.engine.begin() as connection:
+		for created_at, temperature, humidity, sensor_id in rows:
+			batch.append(dict(created_at=created_at, epoch=to_epoch(created_at), temperature=temperature,
+				humidity=humidity, sensor_id=sensor_id))
+			if len(batch) == batch_size:
+				connection.execute(Measurement.__table__.insert(), batch)
+				count, batch = count + len(batch), []
+		if batch:
+			connection.execute(Measurement.__table__.insert(), batch)
+			count += len(batch)
+		rebuild_rollups(connection)
+	return count
+
+
+#: The query ranges the benchmarks time, ending with the synthetic measurements
+RANGES = (('1h', 3600), ('1d', DAY), ('7d', 7 * DAY), ('30d', 30 * DAY), ('365d', YEAR))
+
+
+def ranges(days, start=START):
+	"""
+	The `(label, start_at, end_at)` of the :data:`RANGES` fitting in `days` days of measurements.
+	"""
+	end_at = start + timedelta(days=days)
+	return [(label, end_at - timedelta(seconds=seconds), end_at) for label, seconds in RANGES if seconds <= days * DAY]
@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+"""
+Ingestion throughput, in measurements written per second: `manage.py measure` (one read of every sensor and one
+commit per run), the sampler loop with its write buffer, and bulk inserts like the buffer flushes. The measurements
+are written after the synthetic ones, this suite runs last.
+"""
+
+__author__ = 'quentingerome'
+
+from datetime import timedelta
+from flask import current_app
+from coolnhot.extensions import db, sensor
+from coolnhot.manage import MeasureCommand, measure
+from coolnhot.models import insert_measurements
+from coolnhot.models.buffer import MeasurementBuffer
+from .data import START, generate
+from itertools import islice
+import time
+
+BULK_BATCH_SIZE = 1000
+
+
+def _throughput(name, rows, seconds):
+	return dict(suite='ingestion', name=name, rows=rows, seconds=seconds, rows_per_second=rows / seconds)
+
+
+def run(options):
+	samples = options.samples
+	sensors = len(sensor.ids)
+	results = []
+
+	started = time.time()
+	for _ in xrange(samples):
+		MeasureCommand().run()
+	results.append(_throughput('measure command', samples * sensors, time.time() - started))
+
+	buffer = MeasurementBuffer(current_app.config['MEASUREMENT_BUFFER_ROWS'], 3600)
+	started = time.time()
+	for _ in xrange(samples):
+		measure(buffer)
+	buffer.close()
+	results.append(_throughput('sampler buffered', samples * sensors, time.time() - started))
+
+	rows = list(islice(generate(options.bulk_rows // 86400 + 1, 1, start=START + timedelta(days=options.days + 1)),
+		options.bulk_rows))
+	started = time.time()
+	for i in xrange(0, len(rows), BULK_BATCH_SIZE):
+		insert_measurements(db.session.connection(), rows[i:i + BULK_BATCH_SIZE])
+		db.session.commit()
+	results.append(_throughput('bulk insert', len(rows), time.time() - started))
+	return results
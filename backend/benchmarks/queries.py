@@ -0,0 +1,32 @@
+# -*- coding: UTF-8 -*-
+"""
+Latency of the measurement queries for growing ranges: `per_interval` with the interval `GET /measurements` picks for
+`max_points=1000` (served from the rollups when one fits), the same grouping of the raw measurements, and `avg`.
+"""
+
+__author__ = 'quentingerome'
+
+from coolnhot.extensions import db
+from coolnhot.models import Measurement, auto_interval
+from . import best_of
+from .data import ranges
+
+
+def run(options):
+	results = []
+	for label, start_at, end_at in ranges(options.days):
+		interval = auto_interval(start_at, end_at, 1000)
+		queries = [
+			('per_interval', lambda: db.session.execute(Measurement.query.per_interval(interval, start_at, end_at)).fetchall()),
+			('raw_per_interval', lambda: db.session.execute(
+				Measurement.query.raw_per_interval(interval, start_at, end_at)).fetchall()),
+			('avg', lambda: Measurement.query.avg(start_at, end_at)),
+		]
+		for name, query in queries:
+			results.append(dict(
+				suite='queries',
+				name='%s %s' % (name, label),
+				interval=interval,
+				seconds=best_of(options.repeat, query),
+			))
+	return results
@@ -0,0 +1,20 @@
+# Settings of the app the benchmarks run, the database is set by each benchmark
+DEBUG = False
+SENSOR_DEBUG = True
+SAMPLE_CACHE_PATH = None
+MEASUREMENT_BUFFER_SPILL = None
+# Only warnings, the ingestion suite would log every measurement
+LOGGING_CONFIG = {
+	'version': 1,
+	'handlers': {
+		'default': {
+			'class': 'logging.StreamHandler',
+		},
+	},
+	'loggers': {
+		'': {
+			'level': 'WARNING',
+			'handlers': ['default']
+		},
+	},
+}
@@ -0,0 +1,48 @@
+# -*- coding: UTF-8 -*-
+"""
+Per request cost of validating the `GET /measurements` parameters: merging the request sources into a MultiDict then
+running :meth:`Schema.validate` (how the `validate` decorator used to work) against the compiled schema it uses now.
+"""
+
+__author__ = 'quentingerome'
+
+import timeit
+
+import flask
+from coolnhot.api.measurements import get_measurements
+
+QUERIES = (
+	('no parameters', ''),
+	('dates', 'start_at=2015-01-01T00:00:00&end_at=2015-02-01T00:00:00'),
+	('all parameters', 'start_at=2015-01-01T00:00:00&end_at=2015-02-01T00:00:00&format=columnar&delta=1&max_points=500'
+		'&downsample=lttb&sensor=default&engine=sql&stats=min,max,p95'),
+)
+
+#: Calls timed per measurement
+NUMBER = 2000
+
+
+def merged(request, schema):
+	args = request.args.copy()
+	args.update(request.form)
+	if request.get_json(silent=True):
+		args.update(request.json)
+	args.update(request.files)
+	return schema.validate(args)
+
+
+def run(options):
+	compiled = get_measurements.schema
+	paths = (
+		('merged', lambda request: merged(request, compiled.schema)),
+		('compiled', lambda request: compiled.validate(compiled.sources(request))),
+	)
+	results = []
+	for label, query in QUERIES:
+		for name, path in paths:
+			with flask.current_app.test_request_context('/measurements?' + query):
+				request = flask.request._get_current_object()
+				assert not path(request)[1]
+				seconds = min(timeit.repeat(lambda: path(request), number=NUMBER, repeat=options.repeat)) / NUMBER
+			results.append(dict(suite='validation', name='%s %s' % (name, label), seconds=seconds))
+	return results
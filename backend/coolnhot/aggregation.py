@@ -0,0 +1,111 @@
+# -*- coding: UTF-8 -*-
+"""
+Vectorized aggregation of raw measurements with NumPy, an alternative to grouping them in SQL.
+
+The raw `(epoch, temperature, humidity)` columns of the range are fetched in bulk, then every statistic of every bucket
+is computed at once with `reduceat` over the buckets boundaries: buckets of any size cost the same, and extra
+statistics (min, max, standard deviation) only cost one more pass over the arrays. Percentiles are exact, from the
+values sorted within each bucket.
+"""
+
+__author__ = 'quentingerome'
+__all__ = ['aggregate', 'per_interval', 'ENGINES', 'STATS']
+
+from datetime import datetime
+from itertools import chain
+from .models import Measurement
+from .models.binlog import row_type
+from .extensions import db
+from .statistics import PERCENTILE
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#: Aggregation engines of GET /measurements, the NumPy one only when NumPy is installed
+ENGINES = ('sql', 'numpy') if numpy is not None else ('sql',)
+
+#: Statistics :func:`aggregate` computes, besides percentiles given as `p<0-100>`
+STATS = ('count', 'mean', 'min', 'max', 'stddev')
+
+
+def _percentile(values, starts, counts, q):
+	"""
+	The `q` percentile of each bucket of sorted `values`, interpolated linearly like `numpy.percentile`.
+	"""
+	position = (counts - 1) * (q / 100.0)
+	below = numpy.floor(position).astype(numpy.int64)
+	above = numpy.minimum(below + 1, counts - 1)
+	fraction = position - below
+	return values[starts + below] * (1 - fraction) + values[starts + above] * fraction
+
+
+def aggregate(epochs, columns, interval, stats=('mean',)):
+	"""
+	Group the time ordered `epochs` per `interval` seconds and compute `stats` for each array of the `columns` dict.
+
+	Returns the bucket start epochs and a dict mapping `(column, stat)` to the arrays of the statistics.
+	"""
+	epochs = numpy.asarray(epochs, dtype=numpy.int64)
+	if not len(epochs):
+		return epochs, dict(((c, s), numpy.empty(0)) for c in columns for s in stats)
+
+	keys = epochs // interval
+	starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(keys)) + 1))
+	counts = numpy.diff(numpy.append(starts, len(keys)))
+	percentiles = [s for s in stats if PERCENTILE.match(s)]
+	if percentiles:
+		groups = numpy.repeat(numpy.arange(len(starts)), counts)
+
+	results = {}
+	for name, values in columns.iteritems():
+		values = numpy.asarray(values, dtype=numpy.float64)
+		if percentiles:
+			# Sort the values within each bucket, buckets are already in order
+			ordered = values[numpy.lexsort((values, groups))]
+		for stat in stats:
+			if stat == 'count':
+				result = counts
+			elif stat == 'mean':
+				result = numpy.add.reduceat(values, starts) / counts
+			elif stat == 'stddev':
+				mean = numpy.add.reduceat(values, starts) / counts
+				result = numpy.sqrt(numpy.add.reduceat((values - numpy.repeat(mean, counts)) ** 2, starts) / counts)
+			elif stat == 'min':
+				result = numpy.minimum.reduceat(values, starts)
+			elif stat == 'max':
+				result = numpy.maximum.reduceat(values, starts)
+			elif stat in percentiles:
+				result = _percentile(ordered, starts, counts, int(stat[1:]))
+			else:
+				raise ValueError("Unknown statistic: %r" % stat)
+			results[name, stat] = result
+	return keys[starts] * interval, results
+
+
+def per_interval(interval=300, start_at=None, end_at=None, sensor_id=None, stats=()):
+	"""
+	:meth:`MeasurementQuery.raw_per_interval` computed with NumPy, returning the rows rather than a statement.
+	"""
+	q = Measurement.query.raw(start_at, end_at, sensor_id)
+	# The DB-API cursor returns plain tuples, skipping the result rows overhead
+	result = db.session.execute(q)
+	data = result.cursor.fetchall()
+	result.close()
+	if not data:
+		return []
+
+	data = numpy.fromiter(chain.from_iterable(data), numpy.float64, len(data) * 3).reshape(-1, 3)
+	buckets, results = aggregate(data[:, 0], dict(temperature=data[:, 1], humidity=data[:, 2]), interval,
+		('mean',) + tuple(stats))
+	columns = [results['temperature', 'mean'], results['humidity', 'mean']]
+	for stat in stats:
+		columns.extend([results['temperature', 'count']] if stat == 'count' else
+			[results['temperature', stat], results['humidity', stat]])
+	cls = row_type(stats)
+	return [
+		cls(datetime.utcfromtimestamp(bucket).strftime('%Y-%m-%d %H:%M:%S'), values[0], values[1], int(bucket),
+			*values[2:])
+		for bucket, values in zip(buckets, zip(*[c.tolist() for c in columns]))
+	]
@@ -6,4 +6,5 @@ import flask
 blueprint = flask.Blueprint('api', __name__)
 
 
-import measurements
\ No newline at end of file
+import measurements
+import events
\ No newline at end of file
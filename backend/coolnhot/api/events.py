@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+from datetime import datetime
+import threading
+import time
+
+__author__ = 'quentingerome'
+
+import flask
+from . import blueprint
+from .measurements import _sample_item
+from ..extensions import sample_cache
+from .. import validators
+from .. import helpers
+
+
+def _event(event, data, id=None):
+	lines = ['event: %s' % event, 'data: %s' % flask.json.dumps(data, separators=(',', ':'))]
+	if id is not None:
+		lines.insert(0, 'id: %d' % id)
+	return '\n'.join(lines) + '\n\n'
+
+
+class BucketAverager(object):
+	"""
+	Average the samples per `interval` seconds, like :meth:`MeasurementQuery.per_interval`, returning a bucket once a
+	sample of a later bucket comes.
+	"""
+	def __init__(self, interval):
+		self.interval = interval
+		self.bucket = None
+		self.count = 0
+		self.temperature = self.humidity = 0.0
+
+	def add(self, sample):
+		epoch = int(sample.epoch)
+		bucket = epoch - epoch % self.interval
+		closed = None
+		if bucket != self.bucket:
+			if self.count:
+				closed = dict(
+					created_at=datetime.utcfromtimestamp(self.bucket).strftime('%Y-%m-%d %H:%M:%S'),
+					temperature=self.temperature / self.count,
+					humidity=self.humidity / self.count,
+					epoch=self.bucket,
+				)
+			self.bucket, self.count, self.temperature, self.humidity = bucket, 0, 0.0, 0.0
+		self.count += 1
+		self.temperature += sample.temperature
+		self.humidity += sample.humidity
+		return closed
+
+
+class StreamSlots(object):
+	"""
+	Count the event streams of this process, each of which holds a server thread for as long as it lasts.
+	"""
+	def __init__(self):
+		self.count = 0
+		self._lock = threading.Lock()
+
+	def acquire(self, limit):
+		with self._lock:
+			if limit and self.count >= limit:
+				return False
+			self.count += 1
+			return True
+
+	def release(self):
+		with self._lock:
+			self.count -= 1
+
+
+slots = StreamSlots()
+
+
+def events(cursor, sensor_id=None, interval=None, heartbeat=15, poll_interval=1, max_age=None, retry=None,
+           clock=time.time, sleep=time.sleep):
+	"""
+	Yield the server-sent events of the samples written to the sample cache from the `cursor` sequence number on, or
+	of the `interval` buckets they close, with a comment line after `heartbeat` idle seconds. The stream ends after
+	`max_age` seconds, the client reconnecting `retry` milliseconds later from its last event id.
+
+	Each subscriber reads the shared ring at its own pace: when a slow client lets the writer lap it, the oldest
+	samples are dropped and a `gap` event tells how many.
+	"""
+	averager = BucketAverager(interval) if interval else None
+	started = last_sent = clock()
+	if retry is not None:
+		yield 'retry: %d\n\n' % retry
+	while not max_age or clock() - started < max_age:
+		cursor, samples, dropped = sample_cache.since(cursor)
+		if dropped:
+			yield _event('gap', dict(dropped=dropped))
+			last_sent = clock()
+		for sample in samples:
+			if sensor_id and sample.sensor_id != sensor_id:
+				continue
+			if averager is None:
+				yield _event('sample', _sample_item(sample), sample.sequence)
+			else:
+				closed = averager.add(sample)
+				if closed is None:
+					continue
+				yield _event('bucket', closed, sample.sequence)
+			last_sent = clock()
+		if clock() - last_sent >= heartbeat:
+			yield ': heartbeat\n\n'
+			last_sent = clock()
+		sleep(poll_interval)
+
+
+@blueprint.route('/measurements/events', methods=['GET'])
+@validators.validate(
+	sensor_id=validators.Validator(validators.String(), field='sensor'),
+	interval=validators.Int() | validators.Assert(lambda v: v > 0),
+)
+@helpers.crossdomain('*', create_request=False)
+def get_measurement_events(sensor_id=None, interval=None):
+	"""
+	Server-sent events stream of the new samples, or of the averages of each `interval` seconds bucket once closed.
+	Reconnecting clients resume after their `Last-Event-ID`.
+
+	Every stream holds a server thread: past `EVENTS_MAX_STREAMS` streams in this process the request is refused with
+	a 503, and streams end after `EVENTS_MAX_AGE` seconds so the threads go round the clients.
+	"""
+	config = flask.current_app.config
+	if not slots.acquire(config['EVENTS_MAX_STREAMS']):
+		response = flask.Response(status=503)
+		response.retry_after = config['EVENTS_RETRY'] // 1000 or 1
+		return response
+
+	last_id = flask.request.headers.get('Last-Event-ID', '')
+	cursor = int(last_id) + 1 if last_id.isdigit() else sample_cache.sequence
+	response = flask.Response(
+		events(cursor, sensor_id, interval, config['EVENTS_HEARTBEAT'], config['EVENTS_POLL_INTERVAL'],
+			config['EVENTS_MAX_AGE'], config['EVENTS_RETRY']),
+		mimetype='text/event-stream',
+	)
+	response.call_on_close(slots.release)
+	response.cache_control.no_cache = True
+	# Keep reverse proxies from buffering the stream
+	response.headers['X-Accel-Buffering'] = 'no'
+	return response
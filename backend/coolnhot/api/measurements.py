@@ -1,29 +1,258 @@
 # -*- coding: UTF-8 -*-
-from datetime import timedelta
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from sqlalchemy import sql, cast
+import struct
+import hashlib
+import time
 
 __author__ = 'quentingerome'
 
 import flask
 from . import blueprint
-from ..models import Measurement, db
+from ..models import db, auto_interval, rollup_resolution, to_epoch
+from ..models.storage import storage
+from ..extensions import response_cache, sample_cache
+from ..downsampling import DOWNSAMPLERS
+from .. import aggregation
+from ..statistics import is_stat, percentiles, stat_columns
 from .. import validators
 from .. import helpers
 import arrow
 
 
+#: Response formats and the mimetype each one is served as / negotiated from
+FORMATS = {
+	'json': 'application/json',
+	'columnar': 'application/vnd.coolnhot.columnar+json',
+	'binary': 'application/octet-stream',
+}
+
+#: How many more buckets than `max_points` are fetched for the downsamplers to pick from
+OVERSAMPLING = 4
+
+
+def _negotiate_format():
+	mimetype = flask.request.accept_mimetypes.best_match([FORMATS['json'], FORMATS['columnar'], FORMATS['binary']])
+	for fmt, m in FORMATS.iteritems():
+		if m == mimetype:
+			return fmt
+	return 'json'
+
+
+def _columns(results, delta, columns=()):
+	epochs, temperatures, humidities = [], [], []
+	extra = [[] for _ in columns]
+	for x in results:
+		epochs.append(x.epoch)
+		temperatures.append(x.temperature)
+		humidities.append(x.humidity)
+		for values, c in zip(extra, columns):
+			values.append(x[c])
+	if delta:
+		epochs = epochs[:1] + [b - a for a, b in zip(epochs, epochs[1:])]
+	return epochs, temperatures, humidities, extra
+
+
+def _pack_columns(epochs, temperatures, humidities, extra=()):
+	"""
+	Little-endian binary layout: the uint32 point count, then the uint32 epochs, float32 temperatures and float32
+	humidities arrays, followed by a float32 array per statistics column, in the order of the `stats` parameter.
+	"""
+	n = len(epochs)
+	values = epochs + temperatures + humidities
+	for column in extra:
+		values += [v if v is not None else float('nan') for v in column]
+	return struct.pack('<I%dI%df' % (n, n * (2 + len(extra))), n, *values)
+
+
+def _item(row, columns=()):
+	item = dict(created_at=row[0], temperature=row[1], humidity=row[2])
+	for c in columns:
+		item[c] = row[c]
+	return item
+
+
+def _sample_item(sample):
+	return dict(
+		created_at=datetime.utcfromtimestamp(int(sample.epoch)).strftime('%Y-%m-%d %H:%M:%S'),
+		temperature=sample.temperature,
+		humidity=sample.humidity,
+		sensor=sample.sensor_id,
+	)
+
+
+def _stream_items(q, fetch_size, columns=()):
+	"""
+	Yield the JSON document of `q`'s rows piece by piece, fetching `fetch_size` rows from the cursor at a time.
+	"""
+	results = db.session.connection().execution_options(stream_results=True).execute(q)
+	try:
+		yield '{"success": true, "items": ['
+		separator = ''
+		while True:
+			rows = results.fetchmany(fetch_size)
+			if not rows:
+				break
+			yield separator + ','.join(flask.json.dumps(_item(x, columns)) for x in rows)
+			separator = ','
+		yield ']}'
+	finally:
+		results.close()
+
+
+def _render(q, rows, fmt, stream, delta, columns=()):
+	if fmt == 'json' and stream and rows is None:
+		items = _stream_items(q, flask.current_app.config['MEASUREMENTS_FETCH_SIZE'], columns)
+		return flask.Response(flask.stream_with_context(items), mimetype=FORMATS[fmt])
+
+	if rows is None:
+		rows = db.session.execute(q)
+	if fmt == 'json':
+		return flask.jsonify(**dict(
+			success=True,
+			items=[_item(x, columns) for x in rows],
+		))
+
+	epochs, temperatures, humidities, extra = _columns(rows, delta, columns)
+	if fmt == 'binary':
+		body = _pack_columns(epochs, temperatures, humidities, extra)
+	else:
+		data = dict(
+			success=True,
+			delta=delta,
+			epoch=epochs,
+			temperature=temperatures,
+			humidity=humidities,
+		)
+		data.update(zip(columns, extra))
+		body = flask.json.dumps(data, separators=(',', ':'))
+	return flask.Response(body, mimetype=FORMATS[fmt])
+
+
+def _is_closed(end, interval):
+	"""
+	Whether the window ending at the `end` epoch should no longer receive new measurements, i.e. its last bucket ended
+	more than `RESPONSE_CACHE_GRACE` seconds ago, plus the time buffered measurements may wait before being written.
+	"""
+	config = flask.current_app.config
+	last_bucket_end = end + (-end % interval)
+	grace = config['RESPONSE_CACHE_GRACE'] + config['MEASUREMENT_BUFFER_INTERVAL']
+	return last_bucket_end + grace <= to_epoch(arrow.utcnow())
+
+
 @blueprint.route('/measurements', methods=['GET'])
 @validators.validate(
 	start_at=validators.Arrow(),
 	end_at=validators.Arrow(),
+	stream=validators.Bool(),
+	fmt=validators.Validator(validators.String(lower=True) | validators.Assert(FORMATS.has_key), field='format'),
+	delta=validators.Bool(),
+	max_points=validators.Int() | validators.Assert(lambda v: v > 0),
+	downsample=validators.String(lower=True) | validators.Assert(DOWNSAMPLERS.has_key),
+	sensor_id=validators.Validator(validators.String(), field='sensor'),
+	engine=validators.String(lower=True) | validators.Assert(lambda v: v in aggregation.ENGINES),
+	stats=validators.Validator(validators.Split() | validators.String(lower=True) | validators.Assert(is_stat),
+		aslist=True),
 )
 @helpers.crossdomain('*', create_request=False)
-def get_measurements(start_at=None, end_at=None):
+def get_measurements(start_at=None, end_at=None, stream=False, fmt=None, delta=False, max_points=None, downsample=None,
+                     sensor_id=None, engine=None, stats=()):
+	"""
+	The measurements averaged per bucket, with the `stats` (e.g. `stats=min,max,p95`) of each bucket as extra
+	`count` and `<temperature|humidity>_<stat>` fields.
+
+	Percentiles are exact with the NumPy engine, which sorts the values of each bucket, but P² estimates when SQL or
+	the binary logs group the measurements in a single pass: the `X-Percentiles` header says which, `exact` or
+	`estimated`, when percentiles are requested.
+	"""
 	if not start_at:
 		start_at = arrow.utcnow().replace(days=-1).datetime
-	q = Measurement.query.per_interval(start_at=start_at, end_at=end_at)
-	results = db.session.execute(q)
-	return flask.jsonify(**dict(
-		success=True,
-		items=[dict(created_at=x[0], temperature=x[1], humidity=x[2]) for x in results],
-	))
+	fmt = fmt or _negotiate_format()
+	engine = engine or flask.current_app.config['AGGREGATION_ENGINE']
+	stats = tuple(OrderedDict.fromkeys(stats))
+	columns = stat_columns(stats)
+
+	interval = 300
+	if max_points:
+		interval = auto_interval(start_at, end_at or arrow.utcnow(), max_points * (OVERSAMPLING if downsample else 1))
+	# The binary logs and the NumPy engine compute the rows rather than return a statement: they are only called once
+	# the conditional request and the response cache missed. The rollups are cheaper still when they fit, but have no
+	# percentiles.
+	q = compute = None
+	if engine == 'numpy' and storage.log is None and (rollup_resolution(interval) is None or percentiles(stats)):
+		compute = aggregation.per_interval
+	elif storage.log is not None:
+		compute = storage.log.per_interval
+	else:
+		q = storage.query.per_interval(interval, start_at=start_at, end_at=end_at, sensor_id=sensor_id, stats=stats)
+
+	# Closed windows only depend on the request and on the data version, which late or compacted measurements and
+	# rebuilt rollups change, open ones also change with every new measurement
+	key = (to_epoch(start_at), end_at and to_epoch(end_at), interval, fmt, delta, max_points, downsample, sensor_id, engine,
+		stats, storage.version())
+	closed = end_at is not None and _is_closed(key[1], interval)
+	if closed:
+		last_modified = end_at.datetime
+		etag = hashlib.md5(repr(key)).hexdigest()
+	else:
+		newest = storage.query.newest()
+		last_modified = newest and newest.created_at
+		etag = hashlib.md5(repr((last_modified,) + key)).hexdigest()
+
+	r = flask.request
+	# The Last-Modified of a closed window is its end, which says nothing of late writes: only its ETag is trusted
+	if r.if_none_match.contains(etag) or (
+		not closed and not r.if_none_match and last_modified and r.if_modified_since and
+		last_modified.replace(microsecond=0, tzinfo=None) <= r.if_modified_since.replace(tzinfo=None)
+	):
+		response = flask.Response(status=304)
+	else:
+		cached = closed and not stream and response_cache.get(key)
+		if cached:
+			response = flask.Response(cached[0], mimetype=cached[1])
+		else:
+			rows = compute and compute(interval, start_at=start_at, end_at=end_at, sensor_id=sensor_id, stats=stats)
+			if max_points and downsample:
+				rows = DOWNSAMPLERS[downsample](rows if rows is not None else db.session.execute(q).fetchall(), max_points,
+					('temperature', 'humidity'))
+			response = _render(q, rows, fmt, stream, delta, columns)
+			if closed and not response.is_streamed:
+				response_cache.set(key, response.get_data(), response.mimetype)
+
+	response.set_etag(etag)
+	if last_modified:
+		response.last_modified = last_modified
+	response.vary.add('Accept')
+	if percentiles(stats):
+		response.headers['X-Percentiles'] = 'exact' if compute is aggregation.per_interval else 'estimated'
+	return response
+
+
+@blueprint.route('/measurements/latest', methods=['GET'])
+@validators.validate(
+	sensor_id=validators.Validator(validators.String(), field='sensor'),
+)
+@helpers.crossdomain('*', create_request=False)
+def get_latest_measurement(sensor_id=None):
+	"""
+	The last sample taken, from the sample cache unless it is older than `LATEST_MAX_AGE` seconds, in which case the
+	newest measurement of the database is returned.
+	"""
+	sample = sample_cache.latest(sensor_id)
+	if sample and time.time() - sample.epoch <= flask.current_app.config['LATEST_MAX_AGE']:
+		item = _sample_item(sample)
+	else:
+		newest = storage.query.newest(sensor_id)
+		if newest is None:
+			flask.abort(404)
+		item = dict(
+			created_at=newest.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+			temperature=newest.temperature,
+			humidity=newest.humidity,
+			sensor=newest.sensor_id,
+		)
+
+	response = flask.jsonify(success=True, item=item)
+	response.cache_control.no_cache = True
+	return response
@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+"""
+Shape preserving downsamplers for time ordered rows.
+
+Each downsampler takes a list of rows in time order (as `per_interval` returns them), the maximum number of rows to
+keep and the names of the value columns, and returns a subset of the rows (in order) that keeps the peaks visible
+instead of averaging them away.
+"""
+
+__author__ = 'quentingerome'
+__all__ = ['lttb', 'minmax', 'DOWNSAMPLERS']
+
+
+def _scales(rows, columns):
+	scales = []
+	for c in columns:
+		values = [r[c] for r in rows]
+		scales.append(1.0 / ((max(values) - min(values)) or 1.0))
+	return scales
+
+
+def lttb(rows, threshold, columns, x='epoch'):
+	"""
+	Largest-Triangle-Three-Buckets. The triangle areas of every value column are normalized by the column range and
+	summed, so a single row is picked per bucket for all the columns.
+	"""
+	n = len(rows)
+	if threshold >= n or threshold < 3:
+		return rows
+
+	scales = _scales(rows, columns)
+	every = (n - 2) / float(threshold - 2)
+	sampled = [rows[0]]
+	a = rows[0]
+	for i in range(threshold - 2):
+		next_start = int((i + 1) * every) + 1
+		next_end = min(int((i + 2) * every) + 1, n)
+		following = rows[next_start:next_end]
+		avg_x = sum(r[x] for r in following) / float(len(following))
+		avg_ys = [sum(r[c] for r in following) / float(len(following)) for c in columns]
+
+		best, best_area = None, -1
+		for r in rows[int(i * every) + 1:next_start]:
+			area = 0
+			for c, avg_y, scale in zip(columns, avg_ys, scales):
+				area += abs((a[x] - avg_x) * (r[c] - a[c]) - (a[x] - r[x]) * (avg_y - a[c])) * scale
+			if area > best_area:
+				best, best_area = r, area
+		sampled.append(best)
+		a = best
+	sampled.append(rows[-1])
+	return sampled
+
+
+def minmax(rows, threshold, columns):
+	"""
+	Split the rows in equal groups and keep, for each group, the rows holding the minimum and maximum of every value
+	column.
+	"""
+	n = len(rows)
+	if threshold >= n:
+		return rows
+
+	groups = max(1, threshold // (2 * len(columns)))
+	every = n / float(groups)
+	sampled = []
+	for i in range(groups):
+		start, end = int(i * every), int((i + 1) * every)
+		indexes = set()
+		for c in columns:
+			values = [r[c] for r in rows[start:end]]
+			indexes.add(start + values.index(min(values)))
+			indexes.add(start + values.index(max(values)))
+		sampled.extend(rows[j] for j in sorted(indexes))
+	return sampled
+
+
+DOWNSAMPLERS = {
+	'lttb': lttb,
+	'minmax': minmax,
+}
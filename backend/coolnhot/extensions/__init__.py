@@ -1,6 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from sensor import Sensor
+from cache import ResponseCache
+from samples import SampleCache
 
 
 db = SQLAlchemy()
-sensor = Sensor()
\ No newline at end of file
+sensor = Sensor()
+response_cache = ResponseCache()
+sample_cache = SampleCache()
\ No newline at end of file
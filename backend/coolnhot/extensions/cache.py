@@ -0,0 +1,50 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['ResponseCache']
+from collections import OrderedDict
+import threading
+
+
+class ResponseCache(object):
+	"""
+	In-process LRU of serialized responses, evicting the least recently used entries once the cached bodies exceed
+	`RESPONSE_CACHE_SIZE` bytes.
+	"""
+	def __init__(self, app=None):
+		super(ResponseCache, self).__init__()
+		self.max_size = 0
+		self.size = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.max_size = app.config.get('RESPONSE_CACHE_SIZE', 0)
+		self.clear()
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.size = 0
+
+	def get(self, key):
+		with self._lock:
+			value = self._entries.pop(key, None)
+			if value is not None:
+				self._entries[key] = value
+			return value
+
+	def set(self, key, body, mimetype):
+		if len(body) > self.max_size:
+			return
+		with self._lock:
+			previous = self._entries.pop(key, None)
+			if previous is not None:
+				self.size -= len(previous[0])
+			self._entries[key] = body, mimetype
+			self.size += len(body)
+			while self.size > self.max_size:
+				_, (evicted, _) = self._entries.popitem(last=False)
+				self.size -= len(evicted)
@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['SampleCache', 'Sample']
+from collections import namedtuple
+import mmap
+import os
+import struct
+import threading
+
+Sample = namedtuple('Sample', ['sequence', 'epoch', 'temperature', 'humidity', 'sensor_id'])
+
+#: Header: the number of samples ever written and the capacity of the ring
+HEADER = struct.Struct('<QI')
+#: Record: epoch (seconds, with the fraction), temperature, relative humidity and NUL padded sensor id
+RECORD = struct.Struct('<dff32s')
+
+
+class SampleCache(object):
+	"""
+	Ring buffer of the last `SAMPLE_CACHE_CAPACITY` samples, fixed size records packed with :mod:`struct`.
+
+	With `SAMPLE_CACHE_PATH` the ring lives in a memory mapped file, so the samples written by the sampler process
+	are visible to every API process mapping the same file, otherwise it is an in-process `bytearray`.
+
+	There is a single writer: a record is written before the header count is bumped, so readers never see a new sample
+	half written. The slot of the oldest sample is the one the next sample overwrites, so only the newer
+	`SAMPLE_CACHE_CAPACITY - 1` samples are read, and readers lapped by the writer detect it by reading the count again.
+	"""
+	def __init__(self, app=None):
+		super(SampleCache, self).__init__()
+		self.capacity = 0
+		self._buffer = None
+		self._lock = threading.Lock()
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		capacity = app.config.get('SAMPLE_CACHE_CAPACITY', 1024)
+		path = app.config.get('SAMPLE_CACHE_PATH')
+		size = HEADER.size + capacity * RECORD.size
+		if path:
+			fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+			try:
+				resize = os.fstat(fd).st_size != size
+				if resize:
+					os.ftruncate(fd, size)
+				buf = mmap.mmap(fd, size)
+			finally:
+				os.close(fd)
+			if resize:
+				HEADER.pack_into(buf, 0, 0, capacity)
+		else:
+			buf = bytearray(size)
+			HEADER.pack_into(buf, 0, 0, capacity)
+		self.close()
+		self.capacity = capacity
+		self._buffer = buf
+
+	def close(self):
+		if isinstance(self._buffer, mmap.mmap):
+			self._buffer.close()
+		self._buffer = None
+
+	@property
+	def sequence(self):
+		"""
+		Number of samples ever written, i.e. the sequence number the next sample gets.
+		"""
+		if self._buffer is None:
+			return 0
+		return HEADER.unpack_from(self._buffer, 0)[0]
+
+	def append(self, epoch, temperature, humidity, sensor_id):
+		with self._lock:
+			sequence = self.sequence
+			RECORD.pack_into(self._buffer, self._offset(sequence), epoch, temperature, humidity, sensor_id.encode('utf-8'))
+			HEADER.pack_into(self._buffer, 0, sequence + 1, self.capacity)
+		return sequence
+
+	def _oldest(self):
+		return self.sequence - self.capacity + 1
+
+	def _offset(self, sequence):
+		return HEADER.size + (sequence % self.capacity) * RECORD.size
+
+	def _read(self, sequence):
+		epoch, temperature, humidity, sensor_id = RECORD.unpack_from(self._buffer, self._offset(sequence))
+		return Sample(sequence, epoch, temperature, humidity, sensor_id.rstrip('\0').decode('utf-8'))
+
+	def since(self, cursor):
+		"""
+		Return `(next cursor, samples, dropped)`: the samples written since the `cursor` sequence number, and how many
+		of them were already overwritten.
+		"""
+		if self._buffer is None:
+			return cursor, [], 0
+		end = self.sequence
+		start = max(cursor, end - self.capacity + 1)
+		samples = [self._read(s) for s in xrange(start, end)]
+		# Drop what the writer overwrote while we were reading
+		lapped = self._oldest()
+		if lapped > start:
+			samples = samples[lapped - start:]
+		dropped = (samples[0].sequence if samples else end) - cursor
+		return end, samples, max(dropped, 0)
+
+	def latest(self, sensor_id=None):
+		"""
+		The newest sample of `sensor_id`, or of any sensor, still in the ring.
+		"""
+		if self._buffer is None:
+			return None
+		end = self.sequence
+		for s in xrange(end - 1, max(end - self.capacity + 1, 0) - 1, -1):
+			sample = self._read(s)
+			if self._oldest() > s:
+				return None
+			if sensor_id is None or sample.sensor_id == sensor_id:
+				return sample
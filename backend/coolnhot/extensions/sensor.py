@@ -2,12 +2,19 @@
 
 __author__ = 'quentingerome'
 __all__ = ['Sensor']
+from collections import OrderedDict
+import logging
 import random
+import threading
+import time
+
+log = logging.getLogger(__name__)
 
 
 class FakeSensor(object):
-	def __init__(self, random=False):
+	def __init__(self, random=False, bus=None):
 		self.random = random
+		self.bus = bus
 		super(FakeSensor, self).__init__()
 
 	def get_temp(self):
@@ -16,29 +23,154 @@ class FakeSensor(object):
 	def get_rel_humidity(self):
 		return random.random() * 60 if self.random else 0
 
+	def read(self):
+		return self.get_temp(), self.get_rel_humidity()
+
+	def start_read(self):
+		return FakePendingRead(self.read())
+
+
+class FakePendingRead(object):
+	def __init__(self, value):
+		self.done = True
+		self.ready_at = time.time()
+		self._value = value
+
+	def poll(self):
+		return True
+
+	def result(self):
+		return self._value
+
+
+def wait(pending, sleep=time.sleep, clock=time.time):
+	"""
+	Drive pending reads (as returned by `start_read()`) from the calling thread until all of them are done, sleeping
+	only while every chip is still converting. Reads are polled when their `ready_at` time is reached, so the
+	conversions of every sensor overlap whatever bus they are on.
+	"""
+	pending = [p for p in pending if not p.done]
+	while pending:
+		now = clock()
+		for p in pending:
+			if p.ready_at <= now:
+				p.poll()
+		pending = [p for p in pending if not p.done]
+		if pending:
+			delay = min(p.ready_at for p in pending) - clock()
+			if delay > 0:
+				sleep(delay)
+
 
 class Sensor(object):
+	"""
+	Registry of the sensors configured in the `SENSORS` setting, mapping sensor ids to the I2C `bus`, `address` and
+	calibration offsets of each one. The single value methods read the first sensor.
+
+	The sensors are only opened on first use, so processes that never read them (the web app, most `manage.py`
+	commands) neither import the driver nor open the I2C buses.
+	"""
 	def __init__(self, app=None):
 		super(Sensor, self).__init__()
-		self._impl = None
+		self._sensors = None
+		self._debug = False
+		self._opened = None
+		self._lock = threading.Lock()
 		if app is not None:
 			self.init_app(app)
 
 	def init_app(self, app):
-		if app.config.get('SENSOR_DEBUG'):
-			self._impl = FakeSensor(random=True)
-		else:
-			from .. import si7020
-			self._impl = si7020.Si7020()
+		with self._lock:
+			self._sensors = sorted(app.config['SENSORS'].iteritems())
+			self._debug = app.config.get('SENSOR_DEBUG')
+			self._opened = None
 
-	def get_temp(self):
-		if not self._impl:
+	def _open(self):
+		if self._debug:
+			return OrderedDict((sensor_id, FakeSensor(random=True, bus=cfg.get('bus'))) for sensor_id, cfg in self._sensors)
+
+		from .. import si7020
+		buses = {}
+		impls = OrderedDict()
+		for sensor_id, cfg in self._sensors:
+			cfg = dict(cfg)
+			# Sensors sharing a bus share its SMBus instance
+			bus = cfg.pop('bus', 1)
+			impl = impls[sensor_id] = si7020.Si7020(bus=buses.get(bus, bus), **cfg)
+			buses.setdefault(bus, impl.bus)
+		return impls
+
+	@property
+	def _impls(self):
+		if self._opened is None:
+			with self._lock:
+				if self._opened is None and self._sensors:
+					self._opened = self._open()
+		return self._opened
+
+	@property
+	def _impl(self):
+		if not self._impls:
 			raise Exception("App not initialized")
 
+		return next(self._impls.itervalues())
+
+	@property
+	def opened(self):
+		"""
+		Whether the sensors have been opened yet.
+		"""
+		return self._opened is not None
+
+	@property
+	def ids(self):
+		return [sensor_id for sensor_id, cfg in self._sensors]
+
+	def get_temp(self):
 		return self._impl.get_temp()
 
 	def get_rel_humidity(self):
-		if not self._impl:
+		return self._impl.get_rel_humidity()
+
+	def read(self):
+		return self._impl.read()
+
+	def start_read(self, sensor_id=None):
+		"""
+		Start reading a sensor (the first one by default) and return the pending read, see :func:`wait`.
+		"""
+		if not self._impls:
+			raise Exception("App not initialized")
+
+		return (self._impls[sensor_id] if sensor_id else self._impl).start_read()
+
+	def start_read_all(self):
+		"""
+		Start reading every sensor and return an ordered dict mapping sensor ids to pending reads, see :func:`wait`.
+		"""
+		if not self._impls:
 			raise Exception("App not initialized")
 
-		return self._impl.get_rel_humidity()
\ No newline at end of file
+		pending = OrderedDict()
+		for sensor_id, impl in self._impls.iteritems():
+			try:
+				pending[sensor_id] = impl.start_read()
+			except IOError:
+				log.exception("Reading sensor %s failed", sensor_id)
+		return pending
+
+	def read_all(self):
+		"""
+		Read every sensor and return a dict mapping sensor ids to `(temperature, relative humidity)` tuples.
+
+		The conversions of all the sensors overlap and are driven from the calling thread.
+		"""
+		pending = self.start_read_all()
+		wait(pending.itervalues())
+		results = OrderedDict()
+		for sensor_id, p in pending.iteritems():
+			try:
+				results[sensor_id] = p.result()
+			except IOError:
+				log.exception("Reading sensor %s failed", sensor_id)
+		return results
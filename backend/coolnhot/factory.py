@@ -1,14 +1,71 @@
 from flask import Flask
-from extensions import db, sensor
+from sqlalchemy import event
+from extensions import db, sensor, response_cache, sample_cache
+from models import partitions
+from models.storage import storage
+from statistics import register_sqlite_functions
+import aggregation
 import settings
 import logging
 import logging.config
+import os
+import time
+
+#: Settings naming files or directories, relative ones are taken relative to the app root (where its settings.py is)
+#: rather than to the working directory of the process
+PATH_SETTINGS = ('MEASUREMENT_BUFFER_SPILL', 'MEASUREMENT_LOG_PATH', 'SAMPLE_CACHE_PATH')
 
 
 class CoolnHotApp(Flask):
 	pass
 
 
+def configure_sqlite(app):
+	"""
+	Apply the `SQLITE_*` settings and define the statistics aggregates on every new SQLite connection and, every
+	`SQLITE_CHECKPOINT_INTERVAL` seconds, run a passive WAL checkpoint when a connection is returned to the pool.
+	"""
+	engine = db.get_engine(app)
+	if engine.dialect.name != 'sqlite':
+		return
+
+	config = app.config
+	pragmas = [
+		# Only applies to new databases, existing ones switch on their next full VACUUM
+		'PRAGMA auto_vacuum = %s' % config['SQLITE_AUTO_VACUUM'],
+		'PRAGMA journal_mode = %s' % config['SQLITE_JOURNAL_MODE'],
+		'PRAGMA synchronous = %s' % config['SQLITE_SYNCHRONOUS'],
+		'PRAGMA mmap_size = %d' % config['SQLITE_MMAP_SIZE'],
+		'PRAGMA cache_size = %d' % config['SQLITE_CACHE_SIZE'],
+		'PRAGMA busy_timeout = %d' % config['SQLITE_BUSY_TIMEOUT'],
+		'PRAGMA wal_autocheckpoint = %d' % config['SQLITE_WAL_AUTOCHECKPOINT'],
+	]
+	checkpoint_interval = config['SQLITE_CHECKPOINT_INTERVAL']
+	last_checkpoint = [time.time()]
+
+	@event.listens_for(engine, 'connect')
+	def set_pragmas(dbapi_connection, connection_record):
+		cursor = dbapi_connection.cursor()
+		for pragma in pragmas:
+			cursor.execute(pragma)
+		cursor.close()
+		register_sqlite_functions(dbapi_connection)
+
+	@event.listens_for(engine, 'checkin')
+	def checkpoint(dbapi_connection, connection_record):
+		if dbapi_connection is None or not checkpoint_interval or time.time() - last_checkpoint[0] < checkpoint_interval:
+			return
+		last_checkpoint[0] = time.time()
+		dbapi_connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+
+def resolve_paths(app):
+	for name in PATH_SETTINGS:
+		path = app.config.get(name)
+		if path:
+			app.config[name] = os.path.join(app.root_path, path)
+
+
 def create_app(name, config=None):
 	app = CoolnHotApp(name)
 	app.config.from_object(settings)
@@ -17,9 +74,18 @@ def create_app(name, config=None):
 	app.config.from_pyfile("./settings.py")
 	app.config.from_envvar('APPLICATION_SETTINGS', silent=True)
 	logging.config.dictConfig(app.config.get('LOGGING_CONFIG'))
+	resolve_paths(app)
+	if app.config['AGGREGATION_ENGINE'] not in aggregation.ENGINES:
+		raise ValueError("Unavailable AGGREGATION_ENGINE: %r, the engines are %s (NumPy ones need NumPy installed)" % (
+			app.config['AGGREGATION_ENGINE'], ', '.join(aggregation.ENGINES)))
 
 	db.init_app(app)
+	configure_sqlite(app)
 	sensor.init_app(app)
+	response_cache.init_app(app)
+	sample_cache.init_app(app)
+	partitions.init_app(app)
+	storage.init_app(app)
 
 	# Blueprints
 	from api import blueprint
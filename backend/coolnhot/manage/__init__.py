@@ -1,18 +1,104 @@
 # -*- coding: UTF-8 -*-
 
-from flask.ext.script import Command
-from ..extensions import sensor, db
-from ..models import Measurement
+from datetime import datetime
+from flask import current_app
+from flask.ext.script import Command, Option
+from ..extensions import sensor, sample_cache, db
+from ..models import to_epoch
+from ..models.buffer import MeasurementBuffer
+from ..models.retention import compact_from_config
 import logging
+import signal
+import threading
+import time
 
 log = logging.getLogger(__name__)
 
 
+def measure(buffer):
+	created_at = datetime.utcnow()
+	epoch = to_epoch(created_at) + created_at.microsecond / 1e6
+	measurements = []
+	for sensor_id, (temp, rel_humidity) in sensor.read_all().iteritems():
+		sample_cache.append(epoch, temp, rel_humidity, sensor_id)
+		measurements.append(buffer.add(temp, rel_humidity, created_at=created_at, sensor_id=sensor_id))
+	return measurements
+
+
+def fixed_rate(interval, stop, clock=time.time):
+	"""
+	Yield the scheduled time of each tick, every `interval` seconds aligned on multiples of `interval`, until `stop`
+	is set. Ticks are computed from the schedule rather than from the previous wake up so delays don't accumulate,
+	and ticks missed while the caller overran are skipped.
+	"""
+	now = clock()
+	next_at = now - now % interval + interval
+	while not stop.wait(next_at - now):
+		yield next_at
+		next_at += interval
+		now = clock()
+		if now > next_at:
+			missed = int((now - next_at) // interval) + 1
+			log.warning("Sampler overran, skipping %d tick(s)", missed)
+			next_at += missed * interval
+
+
 class MeasureCommand(Command):
 	def run(self):
 		log.info("Measuring temperature & relative humidity from sensor...")
-		temp, rel_humidity = sensor.get_temp(), sensor.get_rel_humidity()
-		measurement = Measurement(temp, rel_humidity)
-		db.session.add(measurement)
-		db.session.commit()
-		log.info("Measurement done: %r", measurement)
\ No newline at end of file
+		buffer = MeasurementBuffer.from_config(current_app.config)
+		measurement = measure(buffer)
+		# Without a spill file nothing would remember the pending measurements
+		buffer.close(flush=not buffer.spill_path)
+		log.info("Measurement done: %r", measurement)
+
+
+class SamplerCommand(Command):
+	"Samples the sensor at a fixed rate until stopped"
+
+	option_list = (
+		Option('--interval', '-i', dest='interval', type=float, default=None, help="Seconds between samples"),
+	)
+
+	def __init__(self):
+		super(SamplerCommand, self).__init__()
+		self.stop = threading.Event()
+
+	@staticmethod
+	def compact_database(engine, config):
+		"Compacts the database out of the sampling loop, batches of deletes would otherwise delay the next samples"
+		try:
+			compact_from_config(engine, config)
+		except Exception:
+			log.exception("Compaction failed")
+
+	def run(self, interval=None):
+		interval = interval or current_app.config['SAMPLER_INTERVAL']
+		handlers = dict((signum, signal.signal(signum, lambda *args: self.stop.set())) for signum in (signal.SIGTERM, signal.SIGINT))
+
+		log.info("Sampling temperature & relative humidity every %ss...", interval)
+		config = current_app.config
+		buffer = MeasurementBuffer.from_config(config)
+		# The first compaction waits a whole interval, so restarting the sampler doesn't delay its first samples
+		compacted_at, compactor = time.time(), None
+		try:
+			for tick in fixed_rate(interval, self.stop):
+				try:
+					measurement = measure(buffer)
+					log.debug("Measurement done (%.3fs late): %r", time.time() - tick, measurement)
+				except Exception:
+					log.exception("Measurement failed")
+					db.session.rollback()
+
+				if config['COMPACT_INTERVAL'] and tick - compacted_at >= config['COMPACT_INTERVAL'] and \
+						not (compactor and compactor.is_alive()):
+					compacted_at = tick
+					compactor = threading.Thread(target=self.compact_database, args=(db.engine, config), name='compactor')
+					compactor.start()
+		finally:
+			for signum, handler in handlers.iteritems():
+				signal.signal(signum, handler)
+			buffer.close()
+			if compactor:
+				compactor.join()
+		log.info("Sampler stopped")
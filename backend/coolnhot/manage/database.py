@@ -2,8 +2,17 @@
 
 __author__ = 'quentingerome'
 
+from flask import current_app
 from flask.ext.script import Manager, prompt_bool
+from sqlalchemy import inspect
 from ..extensions import db
+from ..models import MeasurementRollup, rebuild_rollups
+from ..models.retention import compact_from_config
+from ..models.binlog import MeasurementLog
+from ..models.storage import export_to_log, import_from_log
+import logging
+
+log = logging.getLogger(__name__)
 
 
 manager = Manager(usage="Perform database operations")
@@ -26,3 +35,61 @@ def recreate(default_data=True, sample_data=False):
 	"Recreates database tables (same as issuing 'drop' and then 'create')"
 	drop()
 	create(default_data, sample_data)
+
+
+@manager.command
+def rollup():
+	"Rebuilds the rollup tables from the raw measurements"
+	with db.engine.begin() as connection:
+		rebuild_rollups(connection)
+
+
+def _add_column(connection, table, name, ddl):
+	if name in [c['name'] for c in inspect(connection).get_columns(table)]:
+		return False
+	connection.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, name, ddl))
+	return True
+
+
+@manager.command
+def upgrade():
+	"Brings an existing database up to date with the models, backfilling new columns"
+	tables = inspect(db.engine).get_table_names()
+	# The sensor is part of the rollups primary key, which SQLite can't alter: recreate the table
+	rebuild = 'measurement_rollups' not in tables or \
+		'sensor_id' not in [c['name'] for c in inspect(db.engine).get_columns('measurement_rollups')]
+	if rebuild and 'measurement_rollups' in tables:
+		MeasurementRollup.__table__.drop(db.engine)
+	db.create_all()
+
+	with db.engine.begin() as connection:
+		_add_column(connection, 'measurements', 'epoch', 'INTEGER')
+		connection.execute("UPDATE measurements SET epoch = CAST(strftime('%s', created_at) AS INTEGER) WHERE epoch IS NULL")
+		connection.execute('CREATE INDEX IF NOT EXISTS ix_measurements_epoch ON measurements (epoch)')
+		_add_column(connection, 'measurements', 'sensor_id', "VARCHAR(32) NOT NULL DEFAULT 'default'")
+		# The sums of squares are only known from the raw measurements
+		for column in ('temperature_sumsq', 'humidity_sumsq'):
+			rebuild = _add_column(connection, 'measurement_rollups', column, 'FLOAT NOT NULL DEFAULT 0') or rebuild
+		if rebuild:
+			rebuild_rollups(connection)
+
+
+@manager.option('--full', dest='full', action='store_true', default=False, help="Rewrite the database with a full VACUUM")
+def compact(full=False):
+	"Deletes the measurements and rollups older than their retention window and shrinks the database file"
+	compact_from_config(db.engine, current_app.config, full=full)
+
+
+@manager.command
+def export_log():
+	"Appends the measurements of the database to the binary logs of MEASUREMENT_LOG_PATH"
+	with db.engine.connect() as connection:
+		written = export_to_log(connection, MeasurementLog(current_app.config['MEASUREMENT_LOG_PATH']))
+	log.info("Exported %d measurement(s)", written)
+
+
+@manager.command
+def import_log():
+	"Inserts the measurements of the binary logs of MEASUREMENT_LOG_PATH into the database"
+	written = import_from_log(db.engine, MeasurementLog(current_app.config['MEASUREMENT_LOG_PATH']))
+	log.info("Imported %d measurement(s)", written)
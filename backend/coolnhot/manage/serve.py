@@ -0,0 +1,87 @@
+# -*- coding: UTF-8 -*-
+"""
+`manage.py serve`: the app behind gunicorn, a pre-fork server of `SERVE_WORKERS` processes running `SERVE_THREADS`
+threads each, so a slow query only holds up one thread. Without gunicorn installed it falls back to a threaded
+werkzeug server. Event streams hold their thread for as long as they last, up to `EVENTS_MAX_STREAMS` per worker for
+`EVENTS_MAX_AGE` seconds each, so they never take every thread of a worker.
+
+The app is created by the master before the workers are forked: every worker disposes the database connections it
+inherited so none is shared between processes. `SIGHUP` forks new workers and gracefully stops the old ones, `SIGTERM`
+lets the workers finish their requests for up to `SERVE_GRACEFUL_TIMEOUT` seconds.
+"""
+
+__author__ = 'quentingerome'
+
+from flask.ext.script import Command, Option
+from ..extensions import db
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def gunicorn_options(app, host=None, port=None, workers=None, threads=None):
+	"""
+	The gunicorn settings from the `SERVE_*` settings of `app`, overridden by the arguments that are not `None`.
+	"""
+	config = app.config
+	threads = threads or config['SERVE_THREADS']
+
+	def post_fork(server, worker):
+		db.get_engine(app).dispose()
+
+	return dict(
+		bind='%s:%d' % (host or config['SERVE_HOST'], port or config['SERVE_PORT']),
+		workers=workers or config['SERVE_WORKERS'],
+		threads=threads,
+		# The sync worker neither keeps connections alive nor runs threads
+		worker_class='gunicorn.workers.gthread.ThreadWorker' if threads > 1 else 'sync',
+		keepalive=config['SERVE_KEEPALIVE'],
+		timeout=config['SERVE_TIMEOUT'],
+		graceful_timeout=config['SERVE_GRACEFUL_TIMEOUT'],
+		post_fork=post_fork,
+	)
+
+
+def gunicorn_application(app, options):
+	"""
+	A gunicorn application serving the already created `app` with the `options` settings.
+	"""
+	from gunicorn.app.base import BaseApplication
+
+	class Application(BaseApplication):
+		def load_config(self):
+			for name, value in options.iteritems():
+				self.cfg.set(name, value)
+
+		def load(self):
+			return app
+
+	return Application()
+
+
+class ServeCommand(Command):
+	"Serves the app with gunicorn, several worker processes and threads"
+
+	option_list = (
+		Option('--host', '-h', dest='host', default=None),
+		Option('--port', '-p', dest='port', type=int, default=None),
+		Option('--workers', '-w', dest='workers', type=int, default=None, help="Worker processes"),
+		Option('--threads', '-t', dest='threads', type=int, default=None, help="Threads per worker"),
+	)
+
+	def __call__(self, app=None, **kwargs):
+		# Like runserver, serve outside of the request context Command pushes
+		return self.run(app, **kwargs)
+
+	def run(self, app, host=None, port=None, workers=None, threads=None):
+		options = gunicorn_options(app, host, port, workers, threads)
+		try:
+			application = gunicorn_application(app, options)
+		except ImportError:
+			host, port = options['bind'].rsplit(':', 1)
+			log.warning("gunicorn is not installed, serving with the threaded werkzeug server in a single process")
+			from werkzeug.serving import run_simple
+			run_simple(host, int(port), app, threaded=True)
+		else:
+			log.info("Serving on %s with %d workers of %d threads", options['bind'], options['workers'], options['threads'])
+			application.run()
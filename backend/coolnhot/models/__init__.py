@@ -1,30 +1,210 @@
 from dateutil.relativedelta import relativedelta
 from flask.ext.sqlalchemy import BaseQuery
 
-from sqlalchemy import sql
+from sqlalchemy import sql, event
+from sqlalchemy.orm.attributes import get_history
 from datetime import datetime
 from ..extensions import db
+from .partitions import MeasurementPartitions
+from ..statistics import percentiles
+import calendar
 import math
 
+#: The sensor id of measurements that don't specify one
+DEFAULT_SENSOR_ID = 'default'
+
+#: Bucket sizes (in seconds) of the maintained rollups, finest first.
+ROLLUP_RESOLUTIONS = (60, 300, 3600, 86400)
+
+#: Bucket sizes (in seconds) :func:`auto_interval` picks from, past a day whole days are used.
+INTERVALS = (1, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+
+
+def to_epoch(dt):
+	return calendar.timegm(dt.utctimetuple())
+
+
+def rollup_resolution(interval):
+	"""
+	Return the coarsest rollup resolution that evenly divides `interval`, or `None` if the raw measurements must be
+	used instead.
+	"""
+	for resolution in reversed(ROLLUP_RESOLUTIONS):
+		if interval % resolution == 0:
+			return resolution
+
+
+def auto_interval(start_at, end_at, max_points):
+	"""
+	Return the smallest interval of :data:`INTERVALS` splitting `start_at` - `end_at` in at most `max_points` buckets.
+	"""
+	target = (to_epoch(end_at) - to_epoch(start_at)) / float(max_points)
+	for interval in INTERVALS:
+		if interval >= target:
+			return interval
+	return int(math.ceil(target / 86400)) * 86400
+
+
+def _raw_measurements(start=None, end=None, sensor_id=None, end_inclusive=False):
+	"""
+	Return `(source, clauses)`: the raw measurements with the `epoch`, `temperature` and `humidity` columns, and the
+	clauses filtering them to the `start` - `end` epochs and `sensor_id`. The source is the measurements table or,
+	when partitions overlap the range, the union of the filtered measurements of every table.
+	"""
+	def clauses(t):
+		where = []
+		if start is not None:
+			where.append(t.c.epoch >= start)
+		if end is not None:
+			where.append(t.c.epoch <= end if end_inclusive else t.c.epoch < end)
+		if sensor_id:
+			where.append(t.c.sensor_id == sensor_id)
+		return where
+
+	tables = partitions.tables(db.session.connection(), start, end)
+	if len(tables) == 1:
+		return tables[0], clauses(tables[0])
+	return sql.union_all(*[
+		sql.select([t.c.epoch, t.c.temperature, t.c.humidity]).where(sql.and_(*clauses(t)))
+		for t in tables
+	]).alias('m'), []
+
+
+def _raw_stats(m, stats):
+	"""
+	The columns of `stats` (see :func:`coolnhot.statistics.stat_columns`) over the raw measurements `m`.
+	"""
+	columns = []
+	for stat in stats:
+		if stat == 'count':
+			columns.append(sql.func.count().label('count'))
+			continue
+		for name in ('temperature', 'humidity'):
+			c = m.c[name]
+			if stat == 'min':
+				column = sql.func.min(c)
+			elif stat == 'max':
+				column = sql.func.max(c)
+			elif stat == 'stddev':
+				column = sql.func.stddev(c)
+			else:
+				column = sql.func.percentile(c, int(stat[1:]) / 100.0)
+			columns.append(column.label('%s_%s' % (name, stat)))
+	return columns
+
+
+def _rollup_stats(r, stats):
+	"""
+	The columns of `stats`, but percentiles, merged from the rollups `r`.
+	"""
+	count = sql.func.sum(r.c.count)
+	columns = []
+	for stat in stats:
+		if stat == 'count':
+			columns.append(count.label('count'))
+			continue
+		for name in ('temperature', 'humidity'):
+			if stat == 'min':
+				column = sql.func.min(r.c[name + '_min'])
+			elif stat == 'max':
+				column = sql.func.max(r.c[name + '_max'])
+			else:
+				# Population variance from the merged sums: E[x^2] - E[x]^2, which cancellation can turn slightly negative
+				mean = sql.func.sum(r.c[name + '_sum']) / count
+				variance = sql.func.sum(r.c[name + '_sumsq']) / count - mean * mean
+				column = sql.case([(variance > 0, sql.func.sqrt(variance))], else_=0.0)
+			columns.append(column.label('%s_%s' % (name, stat)))
+	return columns
+
 
 class MeasurementQuery(BaseQuery):
-	def avg(self, start_at=None, end_at=None):
+	def avg(self, start_at=None, end_at=None, sensor_id=None):
 		if not end_at: end_at = datetime.utcnow()
 		if not start_at: start_at = end_at - relativedelta(minutes=30)
 
-		avg = db.session.query(sql.func.avg(Measurement.temperature), sql.func.avg(Measurement.humidity)).filter(Measurement.created_at.between(start_at, end_at)).first()
+		m, where = _raw_measurements(to_epoch(start_at), to_epoch(end_at), sensor_id, end_inclusive=True)
+		avg = db.session.query(sql.func.avg(m.c.temperature), sql.func.avg(m.c.humidity)).filter(*where).first()
 		if avg[0] and avg[1]:
 			return dict(temperature=0.5 * math.floor(2.0 * avg[0]), humidity=0.5 * math.floor(2.0 * avg[1]))
 
-	def per_interval(self, interval=300, start_at=None, end_at=None):
-		col = sql.func.datetime((sql.func.strftime('%s', Measurement.created_at) / interval) * interval, 'unixepoch')
-		q = sql.select([col, sql.func.avg(Measurement.temperature), sql.func.avg(Measurement.humidity)]).group_by(col)
+	def per_interval(self, interval=300, start_at=None, end_at=None, sensor_id=None, stats=()):
+		"""
+		Average temperature & humidity per `interval` seconds, as `(created_at, temperature, humidity, epoch)` rows in
+		time order where `epoch` is the bucket start, followed by the :func:`~coolnhot.statistics.stat_columns` of `stats`. Without
+		`sensor_id` the measurements of all the sensors are aggregated together.
+
+		When a rollup resolution divides `interval` the buckets are computed from the coarsest such rollup, in which
+		case `start_at` and `end_at` select every rollup bucket overlapping the range. Otherwise, or when percentiles
+		are requested as they can't be merged from the rollups, the raw measurements are grouped.
+		"""
+		resolution = rollup_resolution(interval)
+		if resolution is None or percentiles(stats):
+			return self.raw_per_interval(interval, start_at=start_at, end_at=end_at, sensor_id=sensor_id, stats=stats)
+
+		r = MeasurementRollup.__table__.c
+		bucket = (r.bucket / interval) * interval
+		col = sql.func.datetime(bucket, 'unixepoch')
+		count = sql.func.sum(r.count)
+		q = sql.select([
+			col.label('created_at'),
+			(sql.func.sum(r.temperature_sum) / count).label('temperature'),
+			(sql.func.sum(r.humidity_sum) / count).label('humidity'),
+			bucket.label('epoch'),
+		] + _rollup_stats(MeasurementRollup.__table__, stats)).where(r.resolution == resolution)
+		q = q.group_by(bucket).order_by(bucket)
 		if start_at:
-			q = q.where(Measurement.created_at >= start_at)
+			start = to_epoch(start_at)
+			q = q.where(r.bucket >= start - start % resolution)
 		if end_at:
-			q = q.where(Measurement.created_at < end_at)
+			q = q.where(r.bucket < to_epoch(end_at))
+		if sensor_id:
+			q = q.where(r.sensor_id == sensor_id)
+		return q
+
+	def raw_per_interval(self, interval=300, start_at=None, end_at=None, sensor_id=None, stats=()):
+		m, where = _raw_measurements(start_at and to_epoch(start_at), end_at and to_epoch(end_at), sensor_id)
+		bucket = (m.c.epoch / interval) * interval
+		col = sql.func.datetime(bucket, 'unixepoch')
+		q = sql.select([
+			col.label('created_at'),
+			sql.func.avg(m.c.temperature).label('temperature'),
+			sql.func.avg(m.c.humidity).label('humidity'),
+			bucket.label('epoch'),
+		] + _raw_stats(m, stats)).group_by(bucket).order_by(bucket)
+		for clause in where:
+			q = q.where(clause)
 		return q
 
+	def raw(self, start_at=None, end_at=None, sensor_id=None):
+		"""
+		The `(epoch, temperature, humidity)` raw measurements in `[start_at, end_at)`, in time order.
+		"""
+		m, where = _raw_measurements(start_at and to_epoch(start_at), end_at and to_epoch(end_at), sensor_id)
+		q = sql.select([m.c.epoch, m.c.temperature, m.c.humidity]).order_by(m.c.epoch)
+		for clause in where:
+			q = q.where(clause)
+		return q
+
+	def newest(self, sensor_id=None):
+		"""
+		The newest raw measurement, as a `(created_at, temperature, humidity, sensor_id, epoch)` row, or `None`.
+		"""
+		connection = db.session.connection()
+		tables = partitions.tables(connection)
+		rows = []
+		# The unpartitioned table, then the partitions from the newest one until one has a measurement
+		for t in tables[:1] + tables[:0:-1]:
+			q = sql.select([t.c.created_at, t.c.temperature, t.c.humidity, t.c.sensor_id, t.c.epoch]).order_by(
+				t.c.epoch.desc()).limit(1)
+			if sensor_id:
+				q = q.where(t.c.sensor_id == sensor_id)
+			row = connection.execute(q).first()
+			if row is not None:
+				rows.append(row)
+				if t is not tables[0]:
+					break
+		return max(rows, key=lambda row: row.created_at) if rows else None
+
 
 class Measurement(db.Model):
 	__tablename__ = "measurements"
@@ -35,6 +215,9 @@ class Measurement(db.Model):
 	temperature = db.Column(db.Float(), nullable=False)
 	humidity = db.Column(db.Float(), nullable=False)
 	created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+	#: `created_at` as seconds since the epoch, the indexed column every time range query goes through
+	epoch = db.Column(db.Integer, index=True, nullable=False)
+	sensor_id = db.Column(db.String(32), default=DEFAULT_SENSOR_ID, nullable=False)
 
 	def __init__(self, temperature, humidity, *args, **kwargs):
 		self.temperature = temperature
@@ -42,4 +225,226 @@ class Measurement(db.Model):
 		super(Measurement, self).__init__(*args, **kwargs)
 
 	def __repr__(self):
-		return "<Measurement(id={self.id}, temperature={self.temperature}, humidity={self.humidity})>".format(self=self)
+		return "<Measurement(id={self.id}, sensor_id={self.sensor_id}, temperature={self.temperature}, humidity={self.humidity})>".format(self=self)
+
+
+#: Monthly partitions of the measurements table, see `MEASUREMENT_PARTITIONS`
+partitions = MeasurementPartitions(Measurement.__table__)
+
+
+class MeasurementRollup(db.Model):
+	"""
+	Pre-aggregated measurements: one row per (`resolution`, `bucket`, `sensor_id`) where `bucket` is the epoch of the
+	bucket start.
+	"""
+	__tablename__ = "measurement_rollups"
+
+	resolution = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	sensor_id = db.Column(db.String(32), primary_key=True)
+	count = db.Column(db.Integer, nullable=False)
+	temperature_sum = db.Column(db.Float(), nullable=False)
+	temperature_sumsq = db.Column(db.Float(), nullable=False)
+	temperature_min = db.Column(db.Float(), nullable=False)
+	temperature_max = db.Column(db.Float(), nullable=False)
+	humidity_sum = db.Column(db.Float(), nullable=False)
+	humidity_sumsq = db.Column(db.Float(), nullable=False)
+	humidity_min = db.Column(db.Float(), nullable=False)
+	humidity_max = db.Column(db.Float(), nullable=False)
+
+	def __repr__(self):
+		return "<MeasurementRollup(resolution={self.resolution}, bucket={self.bucket}, sensor_id={self.sensor_id}, count={self.count})>".format(self=self)
+
+
+class MeasurementVersion(db.Model):
+	"""
+	A single row counting the writes to the measurements and rollups, so responses cached by any process can tell
+	whether the data they were computed from changed since.
+	"""
+	__tablename__ = "measurement_versions"
+
+	id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	version = db.Column(db.Integer, nullable=False)
+
+
+def bump_version(connection):
+	"""
+	Count a write to the measurements or rollups, in the transaction of `connection`.
+	"""
+	t = MeasurementVersion.__table__
+	if not connection.execute(t.update().where(t.c.id == 1).values(version=t.c.version + 1)).rowcount:
+		connection.execute(t.insert().values(id=1, version=1))
+
+
+def data_version(connection):
+	"""
+	The number of writes counted by :func:`bump_version`.
+	"""
+	t = MeasurementVersion.__table__
+	return connection.execute(sql.select([t.c.version]).where(t.c.id == 1)).scalar() or 0
+
+
+def update_rollups(connection, rows):
+	"""
+	Fold an iterable of `(created_at, temperature, humidity, sensor_id)` tuples into every rollup resolution, using
+	`connection` so the update shares the transaction of the insert.
+	"""
+	bump_version(connection)
+	buckets = {}
+	for created_at, temperature, humidity, sensor_id in rows:
+		epoch = to_epoch(created_at)
+		for resolution in ROLLUP_RESOLUTIONS:
+			key = resolution, epoch - epoch % resolution, sensor_id
+			b = buckets.get(key)
+			if b is None:
+				buckets[key] = [
+					1, temperature, temperature ** 2, temperature, temperature,
+					humidity, humidity ** 2, humidity, humidity,
+				]
+			else:
+				b[0] += 1
+				b[1] += temperature
+				b[2] += temperature ** 2
+				b[3] = min(b[3], temperature)
+				b[4] = max(b[4], temperature)
+				b[5] += humidity
+				b[6] += humidity ** 2
+				b[7] = min(b[7], humidity)
+				b[8] = max(b[8], humidity)
+
+	t = MeasurementRollup.__table__
+	for (resolution, bucket, sensor_id), (count, t_sum, t_sumsq, t_min, t_max, h_sum, h_sumsq, h_min, h_max) in buckets.iteritems():
+		result = connection.execute(
+			t.update().where(sql.and_(t.c.resolution == resolution, t.c.bucket == bucket, t.c.sensor_id == sensor_id)).values(
+				count=t.c.count + count,
+				temperature_sum=t.c.temperature_sum + t_sum,
+				temperature_sumsq=t.c.temperature_sumsq + t_sumsq,
+				temperature_min=sql.func.min(t.c.temperature_min, t_min),
+				temperature_max=sql.func.max(t.c.temperature_max, t_max),
+				humidity_sum=t.c.humidity_sum + h_sum,
+				humidity_sumsq=t.c.humidity_sumsq + h_sumsq,
+				humidity_min=sql.func.min(t.c.humidity_min, h_min),
+				humidity_max=sql.func.max(t.c.humidity_max, h_max),
+			)
+		)
+		if not result.rowcount:
+			connection.execute(t.insert().values(
+				resolution=resolution, bucket=bucket, sensor_id=sensor_id, count=count,
+				temperature_sum=t_sum, temperature_sumsq=t_sumsq, temperature_min=t_min, temperature_max=t_max,
+				humidity_sum=h_sum, humidity_sumsq=h_sumsq, humidity_min=h_min, humidity_max=h_max,
+			))
+
+
+def insert_measurements(connection, rows):
+	"""
+	Insert an iterable of `(created_at, temperature, humidity, sensor_id)` tuples with a single executemany (per
+	monthly partition when partitioning is enabled) and fold them into the rollups.
+	"""
+	rows = list(rows)
+	if not rows:
+		return
+	groups = {}
+	for row in rows:
+		groups.setdefault(partitions.name(to_epoch(row[0])) if partitions.enabled else None, []).append(row)
+	for name, group in sorted(groups.iteritems()):
+		table = Measurement.__table__ if name is None else partitions.create(connection, name)
+		connection.execute(table.insert(), [
+			dict(created_at=created_at, epoch=to_epoch(created_at), temperature=temperature, humidity=humidity, sensor_id=sensor_id)
+			for created_at, temperature, humidity, sensor_id in group
+		])
+	update_rollups(connection, rows)
+
+
+_ROLLUP_COLUMNS = [
+	'resolution', 'bucket', 'sensor_id', 'count',
+	'temperature_sum', 'temperature_sumsq', 'temperature_min', 'temperature_max',
+	'humidity_sum', 'humidity_sumsq', 'humidity_min', 'humidity_max',
+]
+
+
+def _rollup_source(tables):
+	"""
+	The columns of the raw measurements of `tables`, the union of the partitions when there are several.
+	"""
+	if len(tables) == 1:
+		return tables[0].c
+	return sql.union_all(*[sql.select([p.c.epoch, p.c.sensor_id, p.c.temperature, p.c.humidity]) for p in tables]).alias('m').c
+
+
+def _rollup_select(m, resolution):
+	"""
+	The rollup rows of `resolution` grouped from the raw measurements columns `m`, in :data:`_ROLLUP_COLUMNS` order.
+	"""
+	bucket = (m.epoch / resolution) * resolution
+	return sql.select([
+		sql.literal(resolution), bucket, m.sensor_id, sql.func.count(),
+		sql.func.sum(m.temperature), sql.func.sum(m.temperature * m.temperature),
+		sql.func.min(m.temperature), sql.func.max(m.temperature),
+		sql.func.sum(m.humidity), sql.func.sum(m.humidity * m.humidity),
+		sql.func.min(m.humidity), sql.func.max(m.humidity),
+	]).group_by(bucket, m.sensor_id)
+
+
+def rebuild_rollups(connection):
+	"""
+	Recompute every rollup from the raw measurements.
+	"""
+	t = MeasurementRollup.__table__
+	m = _rollup_source(partitions.tables(connection))
+	connection.execute(t.delete())
+	for resolution in ROLLUP_RESOLUTIONS:
+		connection.execute(t.insert().from_select(_ROLLUP_COLUMNS, _rollup_select(m, resolution)))
+	bump_version(connection)
+
+
+def refresh_rollups(connection, keys):
+	"""
+	Recompute from the raw measurements the buckets of every rollup resolution holding the `(epoch, sensor_id)` keys,
+	after measurements were updated or deleted: unlike sums, the extremes can't be taken back out of a bucket.
+	"""
+	t = MeasurementRollup.__table__
+	bump_version(connection)
+	for resolution in ROLLUP_RESOLUTIONS:
+		for bucket, sensor_id in set((epoch - epoch % resolution, sensor_id) for epoch, sensor_id in keys):
+			connection.execute(t.delete().where(sql.and_(
+				t.c.resolution == resolution, t.c.bucket == bucket, t.c.sensor_id == sensor_id
+			)))
+			m = _rollup_source(partitions.tables(connection, bucket, bucket + resolution))
+			q = _rollup_select(m, resolution).where(sql.and_(
+				m.epoch >= bucket, m.epoch < bucket + resolution, m.sensor_id == sensor_id
+			))
+			connection.execute(t.insert().from_select(_ROLLUP_COLUMNS, q))
+
+
+@event.listens_for(Measurement, 'before_insert')
+def _set_measurement_epoch(mapper, connection, target):
+	if target.created_at is None:
+		target.created_at = datetime.utcnow()
+	if target.sensor_id is None:
+		target.sensor_id = DEFAULT_SENSOR_ID
+	target.epoch = to_epoch(target.created_at)
+
+
+@event.listens_for(Measurement, 'before_update')
+def _update_measurement_epoch(mapper, connection, target):
+	target.epoch = to_epoch(target.created_at)
+
+
+@event.listens_for(Measurement, 'after_insert')
+def _rollup_measurement(mapper, connection, target):
+	update_rollups(connection, [(target.created_at, target.temperature, target.humidity, target.sensor_id)])
+
+
+@event.listens_for(Measurement, 'after_update')
+def _rollup_updated_measurement(mapper, connection, target):
+	# The buckets the measurement left, if it moved, and the ones it is in now
+	created_at = get_history(target, 'created_at').deleted or [target.created_at]
+	sensor_id = get_history(target, 'sensor_id').deleted or [target.sensor_id]
+	keys = [(to_epoch(target.created_at), target.sensor_id)]
+	keys.extend((to_epoch(c), s) for c in created_at for s in sensor_id)
+	refresh_rollups(connection, keys)
+
+
+@event.listens_for(Measurement, 'after_delete')
+def _rollup_deleted_measurement(mapper, connection, target):
+	refresh_rollups(connection, [(target.epoch, target.sensor_id)])
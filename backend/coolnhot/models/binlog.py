@@ -0,0 +1,311 @@
+# -*- coding: UTF-8 -*-
+"""
+Append-only binary measurement log, for sampling rates the SQL tables can't keep up with.
+
+Each sensor has its own file of fixed size little-endian records: the epoch as a double (with the fraction of the
+second), then the temperature and relative humidity as float32. Records are appended in time order, so ranges are
+found by bisecting the memory mapped file, with the help of a sparse in-memory index of one timestamp every
+:data:`INDEX_EVERY` records. Aggregations use NumPy when it is installed.
+"""
+
+__author__ = 'quentingerome'
+__all__ = ['MeasurementLog', 'RECORD']
+
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
+import calendar
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+from ..statistics import Summary, percentiles, stat_columns
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+log = logging.getLogger(__name__)
+
+RECORD = struct.Struct('<dff')
+TIMESTAMP = struct.Struct('<d')
+#: Records between two entries of the sparse index
+INDEX_EVERY = 1024
+SENSOR_ID = re.compile(r'^[\w.-]+$')
+
+if numpy is not None:
+	DTYPE = numpy.dtype([('epoch', '<f8'), ('temperature', '<f4'), ('humidity', '<f4')])
+
+LogMeasurement = namedtuple('LogMeasurement', ['created_at', 'temperature', 'humidity', 'sensor_id', 'epoch'])
+
+
+_row_types = {}
+
+
+def row_type(stats=()):
+	"""
+	The type of the `per_interval` rows with the columns of `stats`, indexable by position and by column name like
+	the SQL rows.
+	"""
+	stats = tuple(stats)
+	cls = _row_types.get(stats)
+	if cls is None:
+		def __getitem__(self, key):
+			if isinstance(key, basestring):
+				return getattr(self, key)
+			return tuple.__getitem__(self, key)
+
+		base = namedtuple('Row', ('created_at', 'temperature', 'humidity', 'epoch') + stat_columns(stats))
+		cls = _row_types[stats] = type('Row', (base,), dict(__slots__=(), __getitem__=__getitem__))
+	return cls
+
+
+Row = row_type()
+
+
+def _epoch(dt):
+	return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+class SensorLog(object):
+	def __init__(self, path):
+		super(SensorLog, self).__init__()
+		self.path = path
+		self._index = []
+		self._last = None
+
+	def __len__(self):
+		try:
+			return os.path.getsize(self.path) // RECORD.size
+		except OSError:
+			return 0
+
+	def last(self):
+		"""
+		The newest record, as an `(epoch, temperature, humidity)` tuple, or `None`.
+		"""
+		n = len(self)
+		if not n:
+			return None
+		with open(self.path, 'rb') as f:
+			f.seek((n - 1) * RECORD.size)
+			return RECORD.unpack(f.read(RECORD.size))
+
+	def append(self, records):
+		"""
+		Append `(epoch, temperature, humidity)` records, dropping the ones not newer than the last record.
+		"""
+		if self._last is None:
+			last = self.last()
+			self._last = last[0] if last else float('-inf')
+		data = []
+		dropped = 0
+		for record in records:
+			if record[0] <= self._last:
+				dropped += 1
+				continue
+			data.append(RECORD.pack(*record))
+			self._last = record[0]
+		if dropped:
+			log.warning("Dropped %d measurement(s) not newer than the last one of %s", dropped, self.path)
+		if data:
+			with open(self.path, 'ab') as f:
+				f.write(''.join(data))
+		return len(data)
+
+	def _map(self):
+		n = len(self)
+		if not n:
+			return None, 0
+		with open(self.path, 'rb') as f:
+			return mmap.mmap(f.fileno(), n * RECORD.size, access=mmap.ACCESS_READ), n
+
+	def _timestamp(self, buf, i):
+		return TIMESTAMP.unpack_from(buf, i * RECORD.size)[0]
+
+	def _seek(self, buf, n, epoch):
+		"""
+		Index of the first of the `n` records not older than `epoch`.
+		"""
+		if epoch is None:
+			return 0
+		# Index the records appended since the last seek
+		for i in xrange(len(self._index) * INDEX_EVERY, n, INDEX_EVERY):
+			self._index.append(self._timestamp(buf, i))
+		block = max(bisect_left(self._index, epoch) - 1, 0)
+		lo, hi = block * INDEX_EVERY, min((block + 1) * INDEX_EVERY + 1, n)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self._timestamp(buf, mid) < epoch:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def buckets(self, interval, start=None, end=None):
+		"""
+		Return `{bucket epoch: (count, temperature sum, humidity sum)}` for the records in `[start, end)`.
+		"""
+		buf, n = self._map()
+		if buf is None:
+			return {}
+		try:
+			lo, hi = self._seek(buf, n, start), self._seek(buf, n, end) if end is not None else n
+			if lo >= hi:
+				return {}
+			if numpy is not None:
+				records = numpy.frombuffer(buf, DTYPE, hi - lo, lo * RECORD.size)
+				keys, inverse = numpy.unique((records['epoch'] // interval).astype(numpy.int64), return_inverse=True)
+				counts = numpy.bincount(inverse)
+				temperatures = numpy.bincount(inverse, weights=records['temperature'])
+				humidities = numpy.bincount(inverse, weights=records['humidity'])
+				del records
+				return dict(
+					(int(k) * interval, (int(c), float(t), float(h)))
+					for k, c, t, h in zip(keys, counts, temperatures, humidities)
+				)
+
+			records = (RECORD.unpack_from(buf, i * RECORD.size) for i in xrange(lo, hi))
+			buckets = {}
+			for key, group in groupby(records, lambda r: int(r[0] // interval) * interval):
+				count, temperature, humidity = 0, 0.0, 0.0
+				for _, t, h in group:
+					count += 1
+					temperature += t
+					humidity += h
+				buckets[key] = count, temperature, humidity
+			return buckets
+		finally:
+			buf.close()
+
+	def records(self, start=None, end=None):
+		"""
+		Iterate over the `(epoch, temperature, humidity)` records in `[start, end)`, every one by default.
+		"""
+		buf, n = self._map()
+		if buf is None:
+			return
+		try:
+			for i in xrange(self._seek(buf, n, start), self._seek(buf, n, end) if end is not None else n):
+				yield RECORD.unpack_from(buf, i * RECORD.size)
+		finally:
+			buf.close()
+
+
+class MeasurementLog(object):
+	"""
+	The logs of every sensor, as `<sensor id>.log` files in the `path` directory. Provides the `per_interval`, `avg`
+	and `newest` queries of :class:`MeasurementQuery`.
+	"""
+	def __init__(self, path):
+		super(MeasurementLog, self).__init__()
+		self.path = path
+		self._sensors = {}
+		if not os.path.isdir(path):
+			os.makedirs(path)
+
+	def sensor(self, sensor_id):
+		if not SENSOR_ID.match(sensor_id):
+			raise ValueError("Invalid sensor id: %r" % sensor_id)
+		sensor = self._sensors.get(sensor_id)
+		if sensor is None:
+			sensor = self._sensors[sensor_id] = SensorLog(os.path.join(self.path, sensor_id + '.log'))
+		return sensor
+
+	@property
+	def sensor_ids(self):
+		return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith('.log'))
+
+	def _sensor_ids(self, sensor_id=None):
+		return [s for s in self.sensor_ids if not sensor_id or s == sensor_id]
+
+	def version(self):
+		"""
+		Changes whenever a measurement is appended: the number of records of every sensor.
+		"""
+		return tuple((sensor_id, len(self.sensor(sensor_id))) for sensor_id in self.sensor_ids)
+
+	def append(self, rows):
+		"""
+		Append an iterable of `(created_at, temperature, humidity, sensor_id)` tuples, returning how many were written.
+		"""
+		by_sensor = {}
+		for created_at, temperature, humidity, sensor_id in rows:
+			by_sensor.setdefault(sensor_id, []).append((_epoch(created_at), temperature, humidity))
+		return sum(self.sensor(sensor_id).append(records) for sensor_id, records in by_sensor.iteritems())
+
+	def _buckets(self, interval, start_at, end_at, sensor_id):
+		start = start_at and _epoch(start_at)
+		end = end_at and _epoch(end_at)
+		merged = {}
+		for s in self._sensor_ids(sensor_id):
+			for bucket, (count, temperature, humidity) in self.sensor(s).buckets(interval, start, end).iteritems():
+				m = merged.get(bucket)
+				merged[bucket] = (count, temperature, humidity) if m is None else \
+					(m[0] + count, m[1] + temperature, m[2] + humidity)
+		return merged
+
+	def _summaries(self, interval, start_at, end_at, sensor_id, stats):
+		"""
+		Return `{bucket epoch: (temperature summary, humidity summary)}`, a :class:`~coolnhot.statistics.Summary` of the
+		records of each bucket.
+		"""
+		start = start_at and _epoch(start_at)
+		end = end_at and _epoch(end_at)
+		quantiles = percentiles(stats)
+		summaries = {}
+		for s in self._sensor_ids(sensor_id):
+			for epoch, temperature, humidity in self.sensor(s).records(start, end):
+				bucket = int(epoch // interval) * interval
+				pair = summaries.get(bucket)
+				if pair is None:
+					pair = summaries[bucket] = Summary(quantiles), Summary(quantiles)
+				pair[0].add(temperature)
+				pair[1].add(humidity)
+		return summaries
+
+	def per_interval(self, interval=300, start_at=None, end_at=None, sensor_id=None, stats=()):
+		"""
+		Average temperature & humidity per `interval` seconds, as a list of `(created_at, temperature, humidity, epoch)`
+		rows followed by the columns of `stats`, like :meth:`MeasurementQuery.per_interval`.
+		"""
+		if stats:
+			cls = row_type(stats)
+			rows = []
+			for bucket, (t, h) in sorted(self._summaries(interval, start_at, end_at, sensor_id, stats).iteritems()):
+				values = []
+				for stat in stats:
+					values.extend((t.count,) if stat == 'count' else (t.get(stat), h.get(stat)))
+				rows.append(cls(datetime.utcfromtimestamp(bucket).strftime('%Y-%m-%d %H:%M:%S'), t.mean, h.mean, bucket,
+					*values))
+			return rows
+
+		return [
+			Row(datetime.utcfromtimestamp(bucket).strftime('%Y-%m-%d %H:%M:%S'), t / count, h / count, bucket)
+			for bucket, (count, t, h) in sorted(self._buckets(interval, start_at, end_at, sensor_id).iteritems())
+		]
+
+	def avg(self, start_at=None, end_at=None, sensor_id=None):
+		if not end_at: end_at = datetime.utcnow()
+		if not start_at: start_at = datetime.utcfromtimestamp(_epoch(end_at) - 1800)
+
+		# A single bucket spanning the whole range
+		buckets = self._buckets(2 ** 40, start_at, end_at, sensor_id).values()
+		count = sum(b[0] for b in buckets)
+		if count:
+			return dict(
+				temperature=0.5 * math.floor(2.0 * sum(b[1] for b in buckets) / count),
+				humidity=0.5 * math.floor(2.0 * sum(b[2] for b in buckets) / count),
+			)
+
+	def newest(self, sensor_id=None):
+		newest = None
+		for s in self._sensor_ids(sensor_id):
+			last = self.sensor(s).last()
+			if last is not None and (newest is None or last[0] > newest.epoch):
+				newest = LogMeasurement(datetime.utcfromtimestamp(last[0]), last[1], last[2], s, last[0])
+		return newest
@@ -0,0 +1,97 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['MeasurementBuffer']
+
+from datetime import datetime
+from . import DEFAULT_SENSOR_ID
+from .storage import storage
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+SPILL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class MeasurementBuffer(object):
+	"""
+	Accumulate measurements and write them with one bulk insert and one commit once `max_rows` are pending or the
+	oldest pending one is `max_age` seconds old.
+
+	When `spill_path` is given every pending measurement is also appended to that file, which is replayed by the
+	next buffer opened on it: a crashed process, or one-shot processes like `manage.py measure`, don't lose the
+	measurements they did not flush. The spill file is flushed to the OS after each sample, which survives a process
+	crash without costing a disk sync per sample, and fsynced when the buffer is closed with measurements pending, so
+	those of one-shot processes also survive a power loss.
+	"""
+	def __init__(self, max_rows=1, max_age=0, spill_path=None):
+		super(MeasurementBuffer, self).__init__()
+		self.max_rows = max_rows
+		self.max_age = max_age
+		self.spill_path = spill_path
+		self.rows = []
+		self._spill = None
+		self._recovered = False
+		if spill_path and os.path.exists(spill_path):
+			self._recover()
+
+	@classmethod
+	def from_config(cls, config):
+		return cls(
+			config['MEASUREMENT_BUFFER_ROWS'],
+			config['MEASUREMENT_BUFFER_INTERVAL'],
+			config['MEASUREMENT_BUFFER_SPILL'],
+		)
+
+	def _recover(self):
+		with open(self.spill_path) as f:
+			for line in f:
+				try:
+					created_at, temperature, humidity, sensor_id = json.loads(line)
+					self.rows.append((datetime.strptime(created_at, SPILL_DATE_FORMAT), temperature, humidity, sensor_id))
+				except ValueError:
+					# Torn write of the last line
+					log.warning("Skipping invalid spilled measurement: %r", line)
+		self._recovered = bool(self.rows)
+		log.info("Recovered %d spilled measurement(s)", len(self.rows))
+
+	def add(self, temperature, humidity, created_at=None, sensor_id=DEFAULT_SENSOR_ID):
+		row = created_at or datetime.utcnow(), temperature, humidity, sensor_id
+		self.rows.append(row)
+		if self.spill_path:
+			if self._spill is None:
+				self._spill = open(self.spill_path, 'a')
+			self._spill.write(json.dumps([row[0].strftime(SPILL_DATE_FORMAT), temperature, humidity, sensor_id]) + '\n')
+			self._spill.flush()
+		if self.due():
+			self.flush()
+		return row
+
+	def due(self, now=None):
+		if not self.rows:
+			return False
+		now = now or datetime.utcnow()
+		return len(self.rows) >= self.max_rows or (now - self.rows[0][0]).total_seconds() >= self.max_age
+
+	def flush(self):
+		# The process may have died between the write and the spill truncation
+		written = storage.write(self.rows, skip_existing=self._recovered)
+		log.debug("Flushed %d measurement(s)", written)
+
+		self.rows = []
+		self._recovered = False
+		if self.spill_path:
+			if self._spill is None:
+				self._spill = open(self.spill_path, 'a')
+			self._spill.truncate(0)
+
+	def close(self, flush=True):
+		if flush and self.rows:
+			self.flush()
+		if self._spill is not None:
+			if self.rows:
+				os.fsync(self._spill.fileno())
+			self._spill.close()
+			self._spill = None
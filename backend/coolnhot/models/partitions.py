@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['MeasurementPartitions']
+
+from datetime import datetime
+from sqlalchemy import MetaData, Table, inspect
+import calendar
+import re
+
+PARTITION_NAME = re.compile(r'^measurements_(\d{4})(\d{2})$')
+
+
+def _month_start(year, month):
+	return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def _schema_version(connection):
+	"""
+	The SQLite schema version, which any process creating or dropping a table increments, None on other databases.
+	"""
+	if connection.dialect.name == 'sqlite':
+		return connection.execute('PRAGMA schema_version').scalar()
+
+
+class MeasurementPartitions(object):
+	"""
+	Monthly partitions of the raw measurements: with `MEASUREMENT_PARTITIONS` the measurements written in bulk go to
+	one `measurements_YYYYMM` table per month, created on demand with the columns and indexes of `table`, and the raw
+	queries fan out over the partitions overlapping the queried range. The `table` itself keeps the measurements
+	written before partitioning was enabled, and those inserted through the ORM.
+
+	Old months are dropped as a whole, which costs no per-row index maintenance, instead of being deleted row by row.
+
+	The partition names are cached on SQLite, until this process creates or drops a partition or the schema version
+	shows another one did.
+	"""
+	def __init__(self, table, app=None):
+		super(MeasurementPartitions, self).__init__()
+		self.table = table
+		self.enabled = False
+		self._metadata = MetaData()
+		self._names = None
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.enabled = bool(app.config.get('MEASUREMENT_PARTITIONS'))
+		self._names = None
+
+	@staticmethod
+	def name(epoch):
+		dt = datetime.utcfromtimestamp(epoch)
+		return 'measurements_%04d%02d' % (dt.year, dt.month)
+
+	@staticmethod
+	def bounds(name):
+		"""
+		The `[start, end)` epochs of the month of the partition `name`.
+		"""
+		year, month = map(int, PARTITION_NAME.match(name).groups())
+		return _month_start(year, month), _month_start(year + month // 12, month % 12 + 1)
+
+	def partition(self, name):
+		table = self._metadata.tables.get(name)
+		if table is None:
+			table = Table(name, self._metadata, *[c.copy() for c in self.table.columns])
+		return table
+
+	def names(self, connection):
+		"""
+		The names of the existing partitions, oldest first.
+		"""
+		key = _schema_version(connection)
+		if key is not None:
+			key = str(connection.engine.url), key
+			if self._names and self._names[0] == key:
+				return list(self._names[1])
+		names = sorted(name for name in inspect(connection).get_table_names() if PARTITION_NAME.match(name))
+		self._names = None if key is None else (key, names)
+		return list(names)
+
+	def tables(self, connection, start=None, end=None):
+		"""
+		The unpartitioned table followed by the partitions overlapping the `start` - `end` epochs.
+		"""
+		tables = [self.table]
+		if self.enabled:
+			for name in self.names(connection):
+				month_start, month_end = self.bounds(name)
+				if (start is None or month_end > start) and (end is None or month_start <= end):
+					tables.append(self.partition(name))
+		return tables
+
+	def create(self, connection, name):
+		table = self.partition(name)
+		if name not in self.names(connection):
+			table.create(connection, checkfirst=True)
+			self._names = None
+		return table
+
+	def drop_before(self, connection, epoch):
+		"""
+		Drop the partitions whose whole month is before `epoch`, returning their names.
+		"""
+		dropped = []
+		for name in self.names(connection):
+			if self.bounds(name)[1] <= epoch:
+				self.partition(name).drop(connection)
+				dropped.append(name)
+		if dropped:
+			self._names = None
+		return dropped
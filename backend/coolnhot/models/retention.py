@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['compact', 'compact_from_config', 'vacuum', 'RetentionError']
+
+from sqlalchemy import sql
+from . import MeasurementRollup, ROLLUP_RESOLUTIONS, _rollup_source, bump_version, partitions
+from ..exceptions import CoolnHotException
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class RetentionError(CoolnHotException):
+	pass
+
+
+def _check_rollups(connection, cutoff):
+	"""
+	Refuse to delete raw measurements the coarsest rollups don't account for (e.g. a database whose rollups were never
+	built): they would be lost for good. Buckets are compared one by one, the rollups also count the measurements
+	earlier compactions deleted.
+	"""
+	resolution = ROLLUP_RESOLUTIONS[-1]
+	r = MeasurementRollup.__table__.c
+	m = _rollup_source(partitions.tables(connection, end=cutoff))
+	bucket = (m.epoch / resolution) * resolution
+	raw = connection.execute(
+		sql.select([bucket, m.sensor_id, sql.func.count()]).where(m.epoch < cutoff).group_by(bucket, m.sensor_id)
+	).fetchall()
+	rolled = dict(((b, sensor_id), count) for b, sensor_id, count in connection.execute(
+		sql.select([r.bucket, r.sensor_id, r.count]).where(sql.and_(r.resolution == resolution, r.bucket < cutoff))
+	))
+	missing = sum(max(0, count - rolled.get((b, sensor_id), 0)) for b, sensor_id, count in raw)
+	if missing:
+		raise RetentionError("%d measurements older than the retention window aren't rolled up, run `db rollup`" % missing)
+
+
+def _delete_in_batches(engine, delete, batch_size, pause):
+	"""
+	Run `delete(connection, batch_size)` in its own transaction until it deletes less than `batch_size` rows, so the
+	write lock is never held for long.
+	"""
+	total = 0
+	while True:
+		with engine.begin() as connection:
+			deleted = delete(connection, batch_size)
+			if deleted:
+				bump_version(connection)
+		total += deleted
+		if deleted < batch_size:
+			return total
+		if pause:
+			time.sleep(pause)
+
+
+def compact(engine, raw_retention, rollup_retention=None, batch_size=1000, pause=0, now=None):
+	"""
+	Delete the raw measurements older than `raw_retention` seconds and, for each resolution of the `rollup_retention`
+	dict, the rollups older than the given number of seconds, `batch_size` rows per transaction with `pause` seconds
+	between transactions. The coarser rollups keep the history of the deleted rows, the coarsest ones are never deleted.
+	Monthly partitions entirely older than the cutoff are dropped rather than deleted row by row.
+
+	Returns the number of deleted rows, and dropped partitions, by table.
+	"""
+	now = int(now or time.time())
+	# Whole days, so no hourly or daily rollup bucket loses part of its raw measurements
+	cutoff = now - raw_retention
+	cutoff -= cutoff % 86400
+	r = MeasurementRollup.__table__
+
+	with engine.begin() as connection:
+		_check_rollups(connection, cutoff)
+		dropped = partitions.drop_before(connection, cutoff) if partitions.enabled else []
+		if dropped:
+			bump_version(connection)
+		tables = partitions.tables(connection, end=cutoff)
+
+	deleted = dict(measurements=0, measurement_rollups=0, partitions=len(dropped))
+	for m in tables:
+		def delete_raw(connection, limit):
+			ids = sql.select([m.c.id]).where(m.c.epoch < cutoff).order_by(m.c.epoch).limit(limit)
+			return connection.execute(m.delete().where(m.c.id.in_(ids))).rowcount
+
+		deleted['measurements'] += _delete_in_batches(engine, delete_raw, batch_size, pause)
+
+	for resolution, retention in sorted((rollup_retention or {}).iteritems()):
+		if resolution not in ROLLUP_RESOLUTIONS[:-1]:
+			continue
+		bucket_cutoff = now - retention
+
+		def delete_rollups(connection, limit):
+			where = sql.and_(r.c.resolution == resolution, r.c.bucket < bucket_cutoff)
+			# Without DELETE ... LIMIT, delete up to the bucket found `limit` rows in along the primary key
+			last = connection.execute(
+				sql.select([r.c.bucket]).where(where).order_by(r.c.bucket).offset(limit - 1).limit(1)
+			).scalar()
+			if last is not None:
+				where = sql.and_(where, r.c.bucket <= last)
+			return connection.execute(r.delete().where(where)).rowcount
+
+		deleted['measurement_rollups'] += _delete_in_batches(engine, delete_rollups, batch_size, pause)
+
+	log.info("Compacted %(measurements)d measurement(s), %(partitions)d partition(s) and %(measurement_rollups)d rollup(s)",
+		deleted)
+	return deleted
+
+
+def vacuum(engine, full=False, pages=0):
+	"""
+	Give the free pages of an SQLite database back to the file system. With `auto_vacuum = INCREMENTAL` the free pages
+	are released (`pages` at most, all of them with 0) without rewriting the database, otherwise only a `full` VACUUM
+	shrinks the file, which rewrites it and also applies a new `auto_vacuum` mode.
+	"""
+	if engine.dialect.name != 'sqlite':
+		return
+	with engine.connect() as connection:
+		freelist = connection.execute('PRAGMA freelist_count').scalar()
+		if full:
+			connection.execute('VACUUM')
+		elif connection.execute('PRAGMA auto_vacuum').scalar() == 2:
+			# Each step of the statement frees a page, which only fetching steps through
+			cursor = connection.connection.cursor()
+			cursor.execute('PRAGMA incremental_vacuum(%d)' % pages).fetchall()
+			cursor.close()
+		else:
+			log.info("%d free page(s) left, auto_vacuum is not INCREMENTAL", freelist)
+			return
+		if connection.execute('PRAGMA journal_mode').scalar() == 'wal':
+			# The pages are only given back once the WAL is written back to the database
+			connection.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+		log.info("Vacuumed %d free page(s)", freelist - connection.execute('PRAGMA freelist_count').scalar())
+
+
+def compact_from_config(engine, config, full=False):
+	"""
+	:func:`compact` with the `RETENTION_*` and `COMPACT_*` settings of `config`, then :func:`vacuum`.
+	"""
+	deleted = compact(engine, config['RETENTION_RAW'], config['RETENTION_ROLLUPS'], config['COMPACT_BATCH_SIZE'],
+		config['COMPACT_PAUSE'])
+	vacuum(engine, full=full)
+	return deleted
@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+
+__author__ = 'quentingerome'
+__all__ = ['MeasurementStorage', 'storage', 'export_to_log', 'import_from_log']
+
+from datetime import datetime
+from sqlalchemy import sql
+from . import Measurement, data_version, insert_measurements, partitions, to_epoch
+from .binlog import MeasurementLog
+from ..extensions import db
+
+
+class MeasurementStorage(object):
+	"""
+	Where measurements are written and read from, chosen with `MEASUREMENT_STORAGE`: `sql` for the measurements
+	tables, `log` for the append-only binary logs of the `MEASUREMENT_LOG_PATH` directory.
+
+	:attr:`query` provides `per_interval`, `avg` and `newest`. The SQL `per_interval` returns a statement to execute
+	while the log one returns the rows themselves.
+	"""
+	def __init__(self, app=None):
+		super(MeasurementStorage, self).__init__()
+		self.log = None
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		backend = app.config.get('MEASUREMENT_STORAGE', 'sql')
+		if backend not in ('sql', 'log'):
+			raise ValueError("Unknown MEASUREMENT_STORAGE: %r" % backend)
+		self.log = MeasurementLog(app.config['MEASUREMENT_LOG_PATH']) if backend == 'log' else None
+
+	@property
+	def query(self):
+		return self.log if self.log is not None else Measurement.query
+
+	def version(self):
+		"""
+		A value changing with every write to the measurements, whichever process made it.
+		"""
+		if self.log is not None:
+			return self.log.version()
+		return data_version(db.session.connection())
+
+	def write(self, rows, skip_existing=False):
+		"""
+		Write `(created_at, temperature, humidity, sensor_id)` tuples. With `skip_existing` the rows already written
+		(e.g. replayed after a crash) are skipped, which the logs always do as they only take newer measurements.
+		"""
+		if self.log is not None:
+			return self.log.append(rows)
+
+		if skip_existing and rows:
+			connection = db.session.connection()
+			start, end = to_epoch(min(row[0] for row in rows)), to_epoch(max(row[0] for row in rows))
+			existing = set()
+			for t in partitions.tables(connection, start, end):
+				existing.update(tuple(r) for r in connection.execute(sql.select([t.c.created_at, t.c.sensor_id]).where(sql.and_(
+					t.c.epoch.between(start, end), t.c.created_at.in_([row[0] for row in rows])
+				))))
+			rows = [row for row in rows if (row[0], row[3]) not in existing]
+		insert_measurements(db.session.connection(), rows)
+		db.session.commit()
+		return len(rows)
+
+
+def export_to_log(connection, log, batch_size=1000):
+	"""
+	Append the measurements of the database, across partitions, to the binary `log`. Measurements not newer than the
+	last one logged for their sensor are skipped, so exporting again only appends the new ones.
+	"""
+	tables = partitions.tables(connection)
+	q = sql.union_all(*[
+		sql.select([t.c.created_at, t.c.temperature, t.c.humidity, t.c.sensor_id, t.c.epoch]) for t in tables
+	]).alias('m')
+	results = connection.execution_options(stream_results=True).execute(
+		sql.select([q.c.created_at, q.c.temperature, q.c.humidity, q.c.sensor_id]).order_by(q.c.epoch, q.c.created_at)
+	)
+	written = 0
+	while True:
+		rows = results.fetchmany(batch_size)
+		if not rows:
+			return written
+		written += log.append(tuple(row) for row in rows)
+
+
+def import_from_log(engine, log, batch_size=1000):
+	"""
+	Insert the measurements of the binary `log` newer than the newest one of their sensor in the database, folding them
+	into the rollups, `batch_size` per transaction.
+	"""
+	written = 0
+	for sensor_id in log.sensor_ids:
+		newest = Measurement.query.newest(sensor_id)
+		db.session.rollback()
+		after = newest and to_epoch(newest.created_at) + newest.created_at.microsecond / 1e6
+		rows = []
+		for epoch, temperature, humidity in log.sensor(sensor_id).records():
+			if after is not None and epoch <= after:
+				continue
+			rows.append((datetime.utcfromtimestamp(epoch), temperature, humidity, sensor_id))
+			if len(rows) == batch_size:
+				with engine.begin() as connection:
+					insert_measurements(connection, rows)
+				written, rows = written + len(rows), []
+		if rows:
+			with engine.begin() as connection:
+				insert_measurements(connection, rows)
+			written += len(rows)
+	return written
+
+
+storage = MeasurementStorage()
@@ -1,7 +1,97 @@
 # DEBUG = True
 SQLALCHEMY_DATABASE_URI = ""
+# Connection setup for SQLite databases, WAL lets the API read while the sampler writes
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+# Negative values are in KiB
+SQLITE_CACHE_SIZE = -8 * 1024
+# Milliseconds to wait on a locked database before failing
+SQLITE_BUSY_TIMEOUT = 5000
+# Pages in the WAL triggering an automatic checkpoint on commit
+SQLITE_WAL_AUTOCHECKPOINT = 1000
+# Seconds between passive checkpoints run when connections are returned to the pool, 0 to disable
+SQLITE_CHECKPOINT_INTERVAL = 300
+# INCREMENTAL lets `manage.py db compact` give the space it frees back to the file system without rewriting the file
+SQLITE_AUTO_VACUUM = 'INCREMENTAL'
 SECRET_KEY = "CHANGEME"
 SENSOR_DEBUG = False
+# Sensors to sample, by sensor id: the I2C `bus` number, `address` and any other Si7020 argument (offsets, ...)
+SENSORS = {
+	'default': dict(bus=1, address=0x40),
+}
+
+# Seconds between two samples taken by `manage.py sampler`
+SAMPLER_INTERVAL = 60
+
+# Where measurements are stored: 'sql' for the database, 'log' for append-only binary files (one per sensor, in the
+# MEASUREMENT_LOG_PATH directory, relative to this file) suited to sampling more than once per second
+MEASUREMENT_STORAGE = 'sql'
+MEASUREMENT_LOG_PATH = 'measurements.log.d'
+
+# Write the measurements to one table per month, so old months are dropped as a whole
+MEASUREMENT_PARTITIONS = False
+
+# Measurements are written in bulk once that many are pending or the oldest pending one is that many seconds old
+MEASUREMENT_BUFFER_ROWS = 10
+MEASUREMENT_BUFFER_INTERVAL = 300
+# File pending measurements are appended to so they survive a crash (relative to the directory of settings.py), None to
+# disable
+MEASUREMENT_BUFFER_SPILL = 'measurements.spill'
+
+# File mapped by every process to share the last samples taken (GET /measurements/latest), relative to the directory of
+# settings.py, None to keep them in the process taking them
+SAMPLE_CACHE_PATH = 'samples.ring'
+# Number of samples kept
+SAMPLE_CACHE_CAPACITY = 1024
+# Seconds after which the cached sample is too old for GET /measurements/latest, which then reads the database
+LATEST_MAX_AGE = 180
+# GET /measurements/events: seconds between two checks for new samples, and idle seconds before a heartbeat comment
+EVENTS_POLL_INTERVAL = 1
+EVENTS_HEARTBEAT = 15
+# Streams per worker process beyond which clients get a 503, seconds after which a stream ends and its client
+# reconnects (resuming after its last event), and milliseconds clients wait before reconnecting
+EVENTS_MAX_STREAMS = 4
+EVENTS_MAX_AGE = 300
+EVENTS_RETRY = 3000
+
+# Seconds raw measurements are kept, the rollups keep their history once they are deleted
+RETENTION_RAW = 90 * 86400
+# Seconds rollups are kept, by resolution; the coarsest rollups are kept forever
+RETENTION_ROLLUPS = {
+	60: 180 * 86400,
+	300: 2 * 365 * 86400,
+}
+# Rows deleted per transaction by compactions, and seconds to pause between two transactions
+COMPACT_BATCH_SIZE = 1000
+COMPACT_PAUSE = 0.1
+# Seconds between two compactions run in the background by `manage.py sampler`, 0 to only compact with
+# `manage.py db compact`
+COMPACT_INTERVAL = 86400
+
+# How GET /measurements groups raw measurements when no rollup fits: 'sql', or 'numpy' (requires NumPy) to fetch them
+# and group them with NumPy, requests override it with ?engine=
+AGGREGATION_ENGINE = 'sql'
+
+# Rows fetched from the cursor at a time when streaming GET /measurements?stream=1
+MEASUREMENTS_FETCH_SIZE = 500
+
+# Bytes of serialized GET /measurements responses kept for windows that can no longer change
+RESPONSE_CACHE_SIZE = 8 * 1024 * 1024
+# Seconds after its last bucket ends (on top of MEASUREMENT_BUFFER_INTERVAL) before a window is considered closed
+RESPONSE_CACHE_GRACE = 60
+
+# `manage.py serve`: address, worker processes and threads per worker. Every GET /measurements/events stream holds a
+# thread, keep `EVENTS_MAX_STREAMS` below `SERVE_THREADS`.
+SERVE_HOST = '0.0.0.0'
+SERVE_PORT = 5000
+SERVE_WORKERS = 2
+SERVE_THREADS = 8
+# Seconds an idle keep-alive connection stays open, a silent worker is restarted, and the workers get to finish their
+# requests on reload or stop
+SERVE_KEEPALIVE = 5
+SERVE_TIMEOUT = 60
+SERVE_GRACEFUL_TIMEOUT = 30
 
 LOGGING_CONFIG = {
 	'version': 1,
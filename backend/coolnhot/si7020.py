@@ -1,5 +1,28 @@
+from collections import Counter
+import logging
 import time
-import smbus
+
+log = logging.getLogger(__name__)
+
+
+class Si7020Error(IOError):
+	pass
+
+
+class Si7020CRCError(Si7020Error):
+	pass
+
+
+def crc8(data):
+	"""
+	CRC-8 of the Si7020 checksum byte: polynomial x^8 + x^5 + x^4 + 1 (0x31), initialized to 0.
+	"""
+	crc = 0
+	for byte in data:
+		crc ^= byte
+		for _ in range(8):
+			crc = ((crc << 1) ^ 0x31) & 0xff if crc & 0x80 else (crc << 1) & 0xff
+	return crc
 
 
 class Si7020(object):
@@ -7,36 +30,238 @@ class Si7020(object):
 	CMD_READ_HUM_HOLD = 0xe5
 	CMD_READ_TEMP_NOHOLD = 0xf3
 	CMD_READ_HUM_NOHOLD = 0xf5
+	CMD_READ_TEMP_PREV = 0xe0
 	CMD_WRITE_USER_REG = 0xe6
 	CMD_READ_USER_REG = 0xe7
 	CMD_SOFT_RESET= 0xfe
 
-	def __init__(self, address=0x40, bus=1, offset_temp=0, offset_humid=0):
-		self.bus = smbus.SMBus(bus)
+	#: Seconds a relative humidity conversion, and the temperature conversion that comes with it, usually take
+	CONVERSION_TIME = .02
+	#: Seconds between two attempts at reading a no hold master conversion result
+	POLL_INTERVAL = .001
+	#: Seconds after which a conversion is considered lost (the datasheet max is 12 ms for RH)
+	CONVERSION_TIMEOUT = .05
+	#: Seconds the chip takes to come back from a soft reset
+	RESET_TIME = .02
+
+	def __init__(self, address=0x40, bus=1, offset_temp=0, offset_humid=0, hold_master=True, retries=3, backoff=.01,
+	             reset_after=3):
+		"""
+		`bus` is either the number of the I2C bus or an object with the `smbus.SMBus` interface.
+
+		With `hold_master` the chip stretches the clock until the conversion is done so each value is read with a
+		single block read, otherwise the conversion is started and its result polled for.
+
+		Reads failing with an I/O error, a timeout or a checksum mismatch are retried `retries` times, waiting
+		`backoff` seconds doubled at each attempt, and the chip is reset after `reset_after` consecutive failures.
+		Failures are counted by kind in :attr:`errors`.
+		"""
+		if isinstance(bus, int):
+			import smbus
+			bus = smbus.SMBus(bus)
+		self.bus = bus
 		self.address = address
 		self.offset_temp = offset_temp
 		self.offset_humid = offset_humid
+		self.hold_master = hold_master
+		self.retries = retries
+		self.backoff = backoff
+		self.reset_after = reset_after
+		self.errors = Counter()
+		self._failures = 0
 
 	def reset(self):
 		self.bus.write_byte(self.address, self.CMD_SOFT_RESET)
-		time.sleep(.02)
+		time.sleep(self.RESET_TIME)
 
-	def get_temp(self):
-		self.bus.write_byte(self.address, self.CMD_READ_TEMP_NOHOLD)
-		time.sleep(.02)
-		raw_temp = (self.bus.read_byte(self.address) << 8) + self.bus.read_byte(self.address)
-		self.bus.read_byte(self.address)  # CRC
+	def _check(self, msb, lsb, crc):
+		if crc8([msb, lsb]) != crc:
+			raise Si7020CRCError("Checksum mismatch")
+		return (msb << 8) + lsb
+
+	def _count_error(self, error):
+		kind = 'crc' if isinstance(error, Si7020CRCError) else 'timeout' if isinstance(error, Si7020Error) else 'io'
+		self.errors[kind] += 1
+		return kind
+
+	def _failed(self, error, attempt):
+		"""
+		Count the failure of the `attempt`-th try (from 0) and soft reset the chip, without waiting for it, after
+		`reset_after` consecutive failures. Returns the seconds to wait before talking to the chip again: the reset
+		time if it was reset, plus the backoff when attempts are left.
+		"""
+		kind = self._count_error(error)
+		log.warning("Si7020 read failed (%s), attempt %d/%d", kind, attempt + 1, self.retries + 1)
+		delay = 0
+		self._failures += 1
+		if self._failures >= self.reset_after:
+			self._failures = 0
+			self.errors['reset'] += 1
+			try:
+				self.bus.write_byte(self.address, self.CMD_SOFT_RESET)
+				delay += self.RESET_TIME
+			except IOError as e:
+				log.warning("Si7020 reset failed: %s", e)
+		if attempt < self.retries:
+			delay += self.backoff * 2 ** attempt
+		return delay
+
+	def _retry(self, read):
+		for attempt in range(self.retries + 1):
+			try:
+				value = read()
+				self._failures = 0
+				return value
+			except IOError as e:
+				error = e
+				delay = self._failed(e, attempt)
+				if delay:
+					time.sleep(delay)
+		raise error
+
+	def _to_temp(self, raw_temp):
 		return -46.85 + self.offset_temp + (175.72 * (raw_temp / float(2 ** 16)))
 
-	def get_rel_humidity(self):
-		self.bus.write_byte(self.address, self.CMD_READ_HUM_NOHOLD)
-		time.sleep(.02)
-		raw_hum = (self.bus.read_byte(self.address) << 8) + self.bus.read_byte(self.address)
-		self.bus.read_byte(self.address)  # CRC
+	def _to_rel_humidity(self, raw_hum):
 		return -6 + self.offset_humid + (125 * (raw_hum / float(2 ** 16)))
 
+	def start_temp(self):
+		self.bus.write_byte(self.address, self.CMD_READ_TEMP_NOHOLD)
+
+	def start_rel_humidity(self):
+		self.bus.write_byte(self.address, self.CMD_READ_HUM_NOHOLD)
+
+	def try_read_result(self):
+		"""
+		Try once to read the result of the conversion started by :meth:`start_temp` or :meth:`start_rel_humidity`,
+		returning `None` while the chip is converting: it doesn't acknowledge reads until the conversion is done.
+		"""
+		try:
+			msb = self.bus.read_byte(self.address)
+		except IOError:
+			return None
+		lsb = self.bus.read_byte(self.address)
+		return self._check(msb, lsb, self.bus.read_byte(self.address))
+
+	def read_result(self):
+		"""
+		Poll for the result of the conversion started by :meth:`start_temp` or :meth:`start_rel_humidity`.
+		"""
+		deadline = time.time() + self.CONVERSION_TIMEOUT
+		while True:
+			raw = self.try_read_result()
+			if raw is not None:
+				return raw
+			if time.time() > deadline:
+				raise Si7020Error("Conversion timed out")
+			time.sleep(self.POLL_INTERVAL)
+
+	def _measure(self, cmd_hold, start):
+		if self.hold_master:
+			return self._check(*self.bus.read_i2c_block_data(self.address, cmd_hold, 3))
+		start()
+		return self.read_result()
+
+	def get_temp(self):
+		return self._to_temp(self._retry(lambda: self._measure(self.CMD_READ_TEMP_HOLD, self.start_temp)))
+
+	def get_rel_humidity(self):
+		return self._to_rel_humidity(self._retry(lambda: self._measure(self.CMD_READ_HUM_HOLD, self.start_rel_humidity)))
+
+	def get_temp_from_previous(self):
+		"""
+		The temperature measured during the last relative humidity conversion, which costs no conversion time. The chip
+		sends no checksum for it.
+		"""
+		return self._to_temp(self._retry(self.read_temp_previous))
+
+	def read_temp_previous(self):
+		"""
+		Read once the raw temperature of the last relative humidity conversion.
+		"""
+		msb, lsb = self.bus.read_i2c_block_data(self.address, self.CMD_READ_TEMP_PREV, 2)
+		return (msb << 8) + lsb
+
+	def read(self):
+		"""
+		Return `(temperature, relative humidity)` from a single conversion.
+		"""
+		rel_humidity = self.get_rel_humidity()
+		return self.get_temp_from_previous(), rel_humidity
+
+	def start_read(self):
+		"""
+		Start a conversion and return its :class:`PendingRead` without waiting for it.
+		"""
+		return PendingRead(self)
+
+
+class PendingRead(object):
+	"""
+	A `(temperature, relative humidity)` read in progress. :meth:`poll` must be called once `ready_at` is reached,
+	until it returns `True`, after which :meth:`result` returns the values or raises the error of the read.
+
+	Nothing blocks while the chip converts so a single thread can drive the reads of many chips. A failed conversion is
+	started again once the backoff of the chip elapsed, up to its `retries` times, and the chip is reset (without
+	waiting either) after `reset_after` consecutive failures, so a failing chip never holds up the others.
+	"""
+	def __init__(self, chip):
+		self.chip = chip
+		self.done = False
+		self._value = self._error = None
+		self._attempt = 0
+		self._restart = False
+		self._start()
+
+	def _start(self):
+		now = time.time()
+		self.ready_at = now + self.chip.CONVERSION_TIME
+		self.deadline = now + self.chip.CONVERSION_TIMEOUT
+		try:
+			self.chip.start_rel_humidity()
+		except IOError as e:
+			self._failed(e)
+
+	def _failed(self, error):
+		delay = self.chip._failed(error, self._attempt)
+		if self._attempt >= self.chip.retries:
+			self._error = error
+			self.done = True
+			return
+		self._attempt += 1
+		self._restart = True
+		self.ready_at = time.time() + delay
+
+	def poll(self):
+		if self.done:
+			return True
+		if self._restart:
+			self._restart = False
+			self._start()
+			return self.done
+		try:
+			raw = self.chip.try_read_result()
+			if raw is None:
+				if time.time() <= self.deadline:
+					self.ready_at = time.time() + self.chip.POLL_INTERVAL
+					return False
+				raise Si7020Error("Conversion timed out")
+			self._value = self.chip._to_temp(self.chip.read_temp_previous()), self.chip._to_rel_humidity(raw)
+			self.chip._failures = 0
+			self.done = True
+		except IOError as e:
+			self._failed(e)
+		return self.done
+
+	def result(self):
+		if not self.done:
+			raise Si7020Error("Read still in progress")
+		if self._error is not None:
+			raise self._error
+		return self._value
+
 
 if __name__ == '__main__':
 	sensor = Si7020()
 	sensor.reset()
-	print(time.time(), sensor.get_temp(), sensor.get_rel_humidity())
\ No newline at end of file
+	print(time.time(), sensor.read())
@@ -0,0 +1,202 @@
+# -*- coding: UTF-8 -*-
+"""
+Single pass statistics of measurement buckets.
+
+Besides the mean always returned, `per_interval` computes the statistics of :data:`STATS` and percentiles given as
+`p<0-100>`, without keeping or sorting the values of a bucket: the standard deviation with Welford's online algorithm
+and the percentiles with the P² estimator of Jain & Chlamtac, which tracks five markers per percentile. P² percentiles
+are estimates, exact up to five values per bucket. The rollups only keep sums and sums of squares, so the standard
+deviations merged from them use the naive `E[x^2] - E[x]^2` formula instead, its negative variances clamped at 0.
+
+:func:`register_sqlite_functions` exposes them to SQLite as the `stddev(x)` and `percentile(x, q)` aggregates, so the
+raw measurements are grouped in a single scan.
+"""
+
+__author__ = 'quentingerome'
+__all__ = [
+	'STATS', 'RunningStats', 'P2Quantile', 'Summary', 'is_stat', 'percentiles', 'stat_columns',
+	'register_sqlite_functions',
+]
+
+from bisect import bisect_right, insort
+import math
+import re
+
+#: Statistics `per_interval` computes besides the mean, on top of the `p<0-100>` percentiles
+STATS = ('count', 'min', 'max', 'stddev')
+PERCENTILE = re.compile(r'^p([1-9]?\d|100)$')
+
+
+def is_stat(stat):
+	return stat in STATS or PERCENTILE.match(stat) is not None
+
+
+def percentiles(stats):
+	"""
+	The percentiles of `stats`, as numbers between 0 and 100.
+	"""
+	return [int(s[1:]) for s in stats if PERCENTILE.match(s)]
+
+
+def stat_columns(stats):
+	"""
+	The names of the columns `stats` add to the `per_interval` rows: `count`, then `temperature_<stat>` and
+	`humidity_<stat>` for the others.
+	"""
+	columns = []
+	for stat in stats:
+		if stat == 'count':
+			columns.append('count')
+		else:
+			columns.extend(('temperature_' + stat, 'humidity_' + stat))
+	return tuple(columns)
+
+
+class RunningStats(object):
+	"""
+	Count, mean, extremes and population standard deviation of a stream of values, with Welford's algorithm.
+	"""
+	def __init__(self):
+		super(RunningStats, self).__init__()
+		self.count = 0
+		self.mean = 0.0
+		self.min = None
+		self.max = None
+		self._m2 = 0.0
+
+	def add(self, value):
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self._m2 += delta * (value - self.mean)
+		if self.min is None or value < self.min:
+			self.min = value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	@property
+	def stddev(self):
+		if self.count:
+			return math.sqrt(self._m2 / self.count)
+
+
+class P2Quantile(object):
+	"""
+	Streaming estimate of the `q` quantile (between 0 and 1) with the P² algorithm, in constant memory.
+	"""
+	def __init__(self, q):
+		super(P2Quantile, self).__init__()
+		self.q = q
+		self.count = 0
+		#: Marker heights, the first five values sorted until the markers are set
+		self._heights = []
+		self._positions = [1, 2, 3, 4, 5]
+		self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+		self._increments = [0, q / 2.0, q, (1 + q) / 2.0, 1]
+
+	def add(self, value):
+		self.count += 1
+		h, n = self._heights, self._positions
+		if self.count <= 5:
+			insort(h, value)
+			return
+
+		if value < h[0]:
+			h[0] = value
+			k = 0
+		elif value >= h[4]:
+			h[4] = value
+			k = 3
+		else:
+			k = bisect_right(h, value) - 1
+		for i in xrange(k + 1, 5):
+			n[i] += 1
+		for i in xrange(5):
+			self._desired[i] += self._increments[i]
+
+		# Move the middle markers towards their desired positions
+		for i in xrange(1, 4):
+			d = self._desired[i] - n[i]
+			if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+				d = 1 if d > 0 else -1
+				height = self._parabolic(i, d)
+				if not h[i - 1] < height < h[i + 1]:
+					height = h[i] + d * (h[i + d] - h[i]) / float(n[i + d] - n[i])
+				h[i] = height
+				n[i] += d
+
+	def _parabolic(self, i, d):
+		h, n = self._heights, self._positions
+		return h[i] + d / float(n[i + 1] - n[i - 1]) * (
+			(n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / float(n[i + 1] - n[i]) +
+			(n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / float(n[i] - n[i - 1])
+		)
+
+	def value(self):
+		h = self._heights
+		if not h:
+			return None
+		if self.count > 5:
+			# The outer markers are the extremes themselves
+			return h[0] if self.q == 0 else h[4] if self.q == 1 else h[2]
+		# Exact, interpolated like numpy.percentile
+		position = (len(h) - 1) * self.q
+		below = int(math.floor(position))
+		above = min(below + 1, len(h) - 1)
+		return h[below] + (h[above] - h[below]) * (position - below)
+
+
+class Summary(RunningStats):
+	"""
+	:class:`RunningStats` along with P² estimates of `percentiles` (between 0 and 100).
+	"""
+	def __init__(self, percentiles=()):
+		super(Summary, self).__init__()
+		self.quantiles = dict((p, P2Quantile(p / 100.0)) for p in percentiles)
+
+	def add(self, value):
+		super(Summary, self).add(value)
+		for quantile in self.quantiles.itervalues():
+			quantile.add(value)
+
+	def get(self, stat):
+		if PERCENTILE.match(stat):
+			return self.quantiles[int(stat[1:])].value()
+		return getattr(self, stat)
+
+
+class _StddevAggregate(RunningStats):
+	def step(self, value):
+		if value is not None:
+			self.add(value)
+
+	def finalize(self):
+		return self.stddev
+
+
+class _PercentileAggregate(object):
+	def __init__(self):
+		self.quantile = None
+
+	def step(self, value, q):
+		if self.quantile is None:
+			self.quantile = P2Quantile(q)
+		if value is not None:
+			self.quantile.add(value)
+
+	def finalize(self):
+		return self.quantile and self.quantile.value()
+
+
+def _sqrt(value):
+	if value is not None:
+		return math.sqrt(value) if value > 0 else 0.0
+
+
+def register_sqlite_functions(dbapi_connection):
+	"""
+	Define the `stddev(x)` and `percentile(x, q)` aggregates and the `sqrt(x)` function on a sqlite3 connection.
+	"""
+	dbapi_connection.create_aggregate('stddev', 1, _StddevAggregate)
+	dbapi_connection.create_aggregate('percentile', 2, _PercentileAggregate)
+	dbapi_connection.create_function('sqrt', 1, _sqrt)
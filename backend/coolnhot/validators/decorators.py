@@ -36,20 +36,14 @@ def validate(validators={}, post=[], api=False, jsonp=None, force_text=False, ad
 			validators[name] = validator
 
 	schema = Schema(validators=validators, post_validators=post)
+	# Compiled once, each request is then validated straight from the request sources
+	compiled = schema.compile()
 
 	def decorator(f):
 		@wraps(f)
 		def decorate(*base_args, **view_kwargs):
-			# Gather all args we have into a single multidict
-			args = request.args.copy()
-			args.update(request.form)
-			if request.get_json(silent=True):
-				args.update(request.json)
-			args.update(request.files)
-			args.update(view_kwargs)
-
-			new_args, error_args, extra_args = schema.validate(args)
-			log.debug('Validate: %r -> %r / %r / %r', args, new_args, error_args, extra_args)
+			new_args, error_args, extra_args = compiled.validate(compiled.sources(request, view_kwargs))
+			log.debug('Validate: %r / %r / %r', new_args, error_args, extra_args)
 			g.validate_args, g.validate_error_args, g.validate_extra_args = new_args, error_args, extra_args
 			if error_args:
 				return invalid(error_args, api=api, force_text=force_text)
@@ -67,5 +61,6 @@ def validate(validators={}, post=[], api=False, jsonp=None, force_text=False, ad
 				else:
 					error_values[e.field] = e
 				return invalid(errors=error_values, api=api, force_text=force_text)
+		decorate.schema = compiled
 		return decorate
 	return decorator
@@ -3,6 +3,9 @@ Validation Filters
 ==================
 """
 import logging
+from collections import OrderedDict
+from datetime import datetime
+from dateutil import tz
 from dateutil.parser import parse
 from flask import g
 
@@ -11,6 +14,7 @@ log = logging.getLogger(__name__)
 import werkzeug
 import json
 import re
+import threading
 import arrow
 
 
@@ -59,11 +63,84 @@ HREF_OR_MAIL_FIND_RE = re.compile('(?:(?P<href>%s)|(?P<mail>%s))' % (_re_href, _
 from .errors import Invalid
 
 __all__ = [
-	'Filter', 'Strip', 'StripEmpty', 'Default', 'Required', 'String', 'Int', 'Bool', 'Date', 'Arrow',
+	'Filter', 'Strip', 'StripEmpty', 'Default', 'Required', 'Split', 'String', 'Int', 'Bool', 'Date', 'Arrow',
 	'Json', 'Url', 'Email', 'File', 'Regex',
 	'Id', 'Query', 'UniqueQuery', 'Assert', 'G',
 ]
 
+#: Number of recently parsed date strings the date filters remember
+DATE_CACHE_SIZE = 256
+
+_ISO_DATETIME = re.compile(
+	r'^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?(Z|[+-]\d{2}(?::?\d{2})?)?)?$'
+)
+_EPOCH = re.compile(r'^\d{1,10}(?:\.\d{1,6})?$')
+
+
+def memoize(size):
+	"""
+	Cache the results of a single argument function for the `size` most recently used arguments. Exceptions are not
+	cached.
+	"""
+	def decorator(f):
+		entries = OrderedDict()
+		lock = threading.Lock()
+		missing = object()
+
+		def memoized(v):
+			with lock:
+				result = entries.pop(v, missing)
+				if result is not missing:
+					entries[v] = result
+					return result
+			result = f(v)
+			with lock:
+				entries[v] = result
+				if len(entries) > size:
+					entries.popitem(last=False)
+			return result
+		memoized.cache = entries
+		return memoized
+	return decorator
+
+
+@memoize(DATE_CACHE_SIZE)
+def parse_iso_datetime(v):
+	"""
+	Parse the common ISO 8601 forms (`YYYY-MM-DD`, optionally followed by `[T ]HH:MM[:SS[.ffffff]]` and a `Z` or
+	`+HH:MM` offset) without the generic parsers, returning `None` for anything else, including invalid dates.
+	"""
+	m = _ISO_DATETIME.match(v)
+	if m is None:
+		return None
+	year, month, day, hour, minute, second, fraction, offset = m.groups()
+	tzinfo = None
+	if offset == 'Z':
+		tzinfo = tz.tzutc()
+	elif offset:
+		minutes = int(offset[1:3]) * 60 + int(offset[-2:] if len(offset) > 3 else 0)
+		tzinfo = tz.tzoffset(None, (-1 if offset[0] == '-' else 1) * minutes * 60)
+	try:
+		return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+			int(fraction.ljust(6, '0')) if fraction else 0, tzinfo)
+	except ValueError:
+		return None
+
+
+@memoize(DATE_CACHE_SIZE)
+def parse_arrow(v):
+	"""
+	`arrow.get(v)` for a string, with fast paths for epoch timestamps and ISO 8601 dates. Arrow objects are immutable,
+	the cached ones are shared.
+	"""
+	if _EPOCH.match(v):
+		return arrow.Arrow.utcfromtimestamp(float(v))
+	dt = parse_iso_datetime(v)
+	if dt is not None:
+		return arrow.Arrow.fromdatetime(dt)
+	return arrow.get(v)
+
+
 class Filter(object):
 	"""
 	The base class for all filters. If you need to define your own filter you must inherit from this class and define the :meth:`filter` method.
@@ -161,6 +238,18 @@ class Required(Filter):
 		else:
 			raise Invalid(value=values, msgid="missing-value", msg=self.msg)
 
+class Split(Filter):
+	"""
+	Split every input string on `separator`, so a list can be given as `a,b` as well as repeated parameters. Empty items
+	are dropped.
+
+	:param separator: The separator of the items
+	:type separator: string
+	"""
+	separator = ','
+	def filter(self, values):
+		return [item.strip() for v in values for item in v.split(self.separator) if item.strip()]
+
 class File(Filter):
 	"""
 	Ensures that the given input value is an instance of a werkzeug file wrapper.
@@ -220,26 +309,27 @@ class Date(Filter):
 	"""
 	Convert a string representation of a date to a python `datetime`.
 
-	The recognized format is `%Y-%m-%d`.
+	The recognized format is `%Y-%m-%d`. ISO 8601 dates are parsed by :func:`parse_iso_datetime`, anything else by
+	dateutil, whose results are not cached as they may depend on the current date.
 
 	:raise: :exc:`~framework.validators.errors.Invalid`
 	"""
 	def filter_value(self, v):
 		try:
-			return v and parse(v) or None
+			return v and (isinstance(v, basestring) and parse_iso_datetime(v) or parse(v)) or None
 		except ValueError:
 			raise Invalid(value=v, msgid="invalid-date", msg=self.msg)
 
 class Arrow(Filter):
 	"""
-	Convert a string representation of a date to a python `datetime`.
+	Convert a string representation of a date to an :class:`arrow.Arrow`, see :func:`parse_arrow`.
 
 	:raise: :exc:`~framework.validators.errors.Invalid`
 	"""
 	def filter_value(self, v):
 		try:
-			return arrow.get(v)
-		except ValueError:
+			return parse_arrow(v) if isinstance(v, basestring) else arrow.get(v)
+		except (ValueError, arrow.parser.ParserError):
 			raise Invalid(value=v, msgid="invalid-date", msg=self.msg)
 
 class Json(Filter):
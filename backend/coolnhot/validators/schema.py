@@ -5,6 +5,9 @@ Validation Schema and Validators
 .. autoclass:: Schema
    :members:
 
+.. autoclass:: CompiledSchema
+   :members:
+
 .. autoclass:: Validator
    :members:
 
@@ -16,13 +19,19 @@ import logging
 log = logging.getLogger(__name__)
 
 from werkzeug import MultiDict
+from werkzeug.datastructures import ImmutableMultiDict, iter_multi_items
 
 from .errors import Invalid
-from .filters import StripEmpty, Strip, Default, File, Bool
+from .filters import Filter, StripEmpty, Strip, Default, File, Bool
 
-__all__ = ['Schema', 'Validator', 'FileValidator', 'CheckboxValidator']
+__all__ = ['Schema', 'CompiledSchema', 'Validator', 'FileValidator', 'CheckboxValidator']
 
 NO_VALUE = object()
+UNKNOWN = object()
+NO_EXTRA_VALUES = ImmutableMultiDict()
+
+#: The mimetypes of the request bodies werkzeug parses into `request.form` (and `request.files`)
+FORM_MIMETYPES = ('multipart/form-data', 'application/x-www-form-urlencoded', 'application/x-url-encoded')
 
 class Validator(object):
 	"""
@@ -165,6 +174,13 @@ class Schema(object):
 		# Whatever's left in the values dict will be returned as is
 		extra_values = values
 
+		self.post_validate(new_values, error_values)
+		return new_values, error_values, extra_values
+
+	def post_validate(self, new_values, error_values):
+		"""
+		Run the post validators on the validated values, adding their errors to `error_values`.
+		"""
 		for validator in self.post_validators:
 			try:
 				validator.validate(new_values)
@@ -175,4 +191,138 @@ class Schema(object):
 				else:
 					error_values[e.field] = e
 
+	def compile(self):
+		"""
+		Return the :class:`CompiledSchema` of this schema.
+		"""
+		return CompiledSchema(self)
+
+
+def _maps(f):
+	"""
+	Whether the filter `f` only maps its values one by one, so it has nothing to do on an empty list.
+	"""
+	return getattr(type(f).filter, '__func__', None) is Filter.filter.__func__
+
+
+class _FieldPlan(object):
+	"""
+	The validation of a single field: the leading :class:`Strip` and :class:`StripEmpty` filters and the trailing
+	:class:`Default` one the :class:`Validator` added are applied inline, and the filters that only map values are
+	skipped while there is no value.
+	"""
+	def __init__(self, name, validator):
+		self.name = name
+		self.field = validator.field or name
+		self.startswith = validator.startswith
+		self.aslist = validator.aslist
+		self.validator = validator
+		# Subclasses validating differently go through their own `validate`
+		self.custom = getattr(type(validator).validate, '__func__', None) is not Validator.validate.__func__
+
+		chain = list(validator.filters.chain)
+		self.strip = self.strip_empty = False
+		while chain and type(chain[0]) in (Strip, StripEmpty):
+			if type(chain.pop(0)) is Strip:
+				self.strip = True
+			else:
+				self.strip_empty = True
+		self.default = chain.pop().default if chain and type(chain[-1]) is Default else None
+		self.steps = [(f, _maps(f)) for f in chain]
+
+		#: The result when the field is missing, known in advance unless a filter may produce values from nothing
+		self.missing = UNKNOWN
+		if not self.custom and not self.aslist and all(maps for _, maps in self.steps):
+			self.missing = (self.default or [NO_VALUE])[0]
+
+	def validate(self, values):
+		if self.custom:
+			return self.validator.validate(values)
+
+		if self.strip:
+			values = [v.strip() if isinstance(v, basestring) else v for v in values]
+		if self.strip_empty:
+			values = [v for v in values if v is not None]
+		for f, maps in self.steps:
+			if values or not maps:
+				values = f.filter(values)
+		if not values and self.default is not None:
+			values = self.default
+		if self.aslist:
+			return values
+		return values[0]
+
+
+class CompiledSchema(object):
+	"""
+	A :class:`Schema` turned into a flat plan of per-field steps, for validating a request on every call of a view.
+
+	The values are read from the request sources (see :meth:`sources`) without copying them into a new MultiDict, and
+	validated with the same rules as :meth:`Schema.validate`.
+	"""
+	def __init__(self, schema):
+		self.schema = schema
+		self.fields = [_FieldPlan(name, validator) for name, validator in schema.validators.iteritems()]
+		self.consumed = frozenset(plan.field for plan in self.fields if not plan.startswith)
+
+	@staticmethod
+	def sources(request, view_kwargs=None):
+		"""
+		The mappings the parameters of `request` are read from, in order: the query string, the form, the JSON body,
+		the files and the view arguments. The body is only parsed when its mimetype can hold parameters.
+		"""
+		sources = [request.args]
+		mimetype = request.mimetype
+		if mimetype in FORM_MIMETYPES:
+			sources.append(request.form)
+		elif mimetype == 'application/json':
+			json = request.get_json(silent=True)
+			if json:
+				sources.append(json)
+		if mimetype == 'multipart/form-data':
+			sources.append(request.files)
+		if view_kwargs:
+			sources.append(view_kwargs)
+		return sources
+
+	def validate(self, sources):
+		"""
+		Validate the parameters of the `sources` mappings, the values of a field in all of them being taken in order
+		like a MultiDict updated with each one. Returns the same dicts as :meth:`Schema.validate`.
+		"""
+		if len(sources) == 1 and isinstance(sources[0], MultiDict):
+			# The value lists of a MultiDict are read in place
+			lists = sources[0]
+		else:
+			lists = {}
+			for source in sources:
+				for key, value in iter_multi_items(source):
+					lists.setdefault(key, []).append(value)
+
+		new_values = {}
+		error_values = {}
+		get = dict.get
+		for plan in self.fields:
+			if plan.startswith:
+				values = [(x, v[0]) for x, v in dict.iteritems(lists) if x.startswith(plan.startswith) and x not in self.consumed]
+			else:
+				values = get(lists, plan.field)
+				if not values and plan.missing is not UNKNOWN:
+					if plan.missing is not NO_VALUE:
+						new_values[plan.name] = plan.missing
+					continue
+				values = list(values) if values else []
+
+			try:
+				value = plan.validate(values)
+				if value is not NO_VALUE:
+					new_values[plan.name] = value
+			except Invalid, e:
+				error_values[e.field or plan.field] = e
+
+		# Whatever was not validated is returned as is
+		extra = [key for key in lists if key not in self.consumed]
+		extra_values = MultiDict((key, value) for key in extra for value in get(lists, key)) if extra else NO_EXTRA_VALUES
+
+		self.schema.post_validate(new_values, error_values)
 		return new_values, error_values, extra_values
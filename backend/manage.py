@@ -1,17 +1,21 @@
 from flask.ext.script import Manager
-from flask.ext.migrate import Migrate, MigrateCommand
 
 from coolnhot.factory import create_app
-from coolnhot.extensions import db
-from coolnhot.manage import MeasureCommand, database
+from coolnhot.manage import MeasureCommand, SamplerCommand, database
+from coolnhot.manage.serve import ServeCommand
 
-app = create_app(__name__)
-manager = Manager(app)
-migrate = Migrate(app, db)
 
-manager.add_command('db', MigrateCommand)
+def make_app():
+    return create_app(__name__)
+
+
+# The app is only created once the command line is parsed, so `--help` and usage errors don't build it
+manager = Manager(make_app)
+
 manager.add_command('measure', MeasureCommand)
+manager.add_command('sampler', SamplerCommand)
 manager.add_command('db', database.manager)
+manager.add_command('serve', ServeCommand)
 
 
 if __name__ == '__main__':
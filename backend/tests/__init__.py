@@ -5,6 +5,15 @@ from . import settings
 from .utils import FlaskTestCaseMixin
 
 
+class FakeApp(object):
+	"""
+	Just the `config` (and `root_path`) extensions read in `init_app`, for testing them without creating an app.
+	"""
+	def __init__(self, root_path=None, **config):
+		self.root_path = root_path
+		self.config = config
+
+
 class CoolnHotTestCase(TestCase):
 	pass
 
@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+import json
+from unittest import TestCase, SkipTest
+
+try:
+	import numpy
+except ImportError:
+	raise SkipTest("NumPy is not installed")
+
+__author__ = 'quentingerome'
+
+from .measurement_tests import BaseMeasurementTestCase
+from coolnhot import aggregation
+from coolnhot.aggregation import aggregate
+from coolnhot.factory import create_app
+from coolnhot.models import Measurement
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import random
+
+
+class AggregateTestCase(TestCase):
+	def test_statistics(self):
+		epochs = sorted(random.randint(0, 3600) for _ in range(1000))
+		values = [random.random() * 30 for _ in epochs]
+		buckets, results = aggregate(epochs, dict(temperature=values), 700,
+			('count', 'mean', 'min', 'max', 'stddev', 'p50', 'p95'))
+		self.assertEqual(list(buckets), sorted(set(e - e % 700 for e in epochs)))
+		for i, bucket in enumerate(buckets):
+			group = [v for e, v in zip(epochs, values) if bucket <= e < bucket + 700]
+			self.assertEqual(results['temperature', 'count'][i], len(group))
+			self.assertAlmostEqual(results['temperature', 'mean'][i], sum(group) / len(group))
+			self.assertEqual(results['temperature', 'min'][i], min(group))
+			self.assertEqual(results['temperature', 'max'][i], max(group))
+			self.assertAlmostEqual(results['temperature', 'stddev'][i], numpy.std(group))
+			self.assertAlmostEqual(results['temperature', 'p50'][i], numpy.percentile(group, 50))
+			self.assertAlmostEqual(results['temperature', 'p95'][i], numpy.percentile(group, 95))
+
+	def test_empty(self):
+		buckets, results = aggregate([], dict(temperature=[]), 60, ('mean',))
+		self.assertEqual(len(buckets), 0)
+		self.assertRaises(ValueError, aggregate, [1], dict(temperature=[1]), 60, ('median',))
+
+
+class NumpyEngineTestCase(BaseMeasurementTestCase):
+	start = datetime(2015, 10, 1, 12)
+
+	def _create_fixtures(self):
+		super(NumpyEngineTestCase, self)._create_fixtures()
+		for i in range(0, 3600, 7):
+			self.create_measurement(created_at=self.start + relativedelta(seconds=i))
+		self.session.commit()
+
+	def test_per_interval(self):
+		end = self.start + relativedelta(minutes=30)
+		expected = self.session.execute(Measurement.query.raw_per_interval(45, self.start, end)).fetchall()
+		rows = aggregation.per_interval(45, self.start, end)
+		self.assertEqual([r.epoch for r in rows], [r.epoch for r in expected])
+		for row, e in zip(rows, expected):
+			self.assertEqual(row.created_at, e.created_at)
+			self.assertAlmostEqual(row.temperature, e.temperature)
+
+	def test_stats(self):
+		end = self.start + relativedelta(minutes=30)
+		stats = ('count', 'max', 'stddev')
+		expected = self.session.execute(Measurement.query.raw_per_interval(45, self.start, end, stats=stats)).fetchall()
+		rows = aggregation.per_interval(45, self.start, end, stats=stats)
+		for row, e in zip(rows, expected):
+			self.assertEqual((row.count, row.temperature_max), (e['count'], e['temperature_max']))
+			self.assertAlmostEqual(row.humidity_stddev, e['humidity_stddev'])
+
+	def test_api(self):
+		params = dict(start_at=self.start.isoformat(), end_at=(self.start + relativedelta(minutes=10)).isoformat(),
+			max_points=40)
+		expected = json.loads(self.get('/measurements', query_string=params).data)['items']
+		items = json.loads(self.assertOkJson(self.get('/measurements', query_string=dict(params, engine='numpy'))).data)['items']
+		self.assertEqual(len(items), 40)
+		self.assertEqual([i['created_at'] for i in items], [i['created_at'] for i in expected])
+		self.assertBadRequest(self.get('/measurements', query_string=dict(params, engine='pandas')))
+
+	def test_api_percentiles(self):
+		params = dict(start_at=self.start.isoformat(), end_at=(self.start + relativedelta(hours=1)).isoformat(), stats='p50')
+		self.assertEqual(self.get('/measurements', query_string=params).headers['X-Percentiles'], 'estimated')
+		r = self.assertOkJson(self.get('/measurements', query_string=dict(params, engine='numpy')))
+		self.assertEqual(r.headers['X-Percentiles'], 'exact')
+		self.assertNotIn('X-Percentiles', self.get('/measurements', query_string=dict(params, stats='max')).headers)
+
+
+class UnavailableEngineTestCase(BaseMeasurementTestCase):
+	def setUp(self):
+		super(UnavailableEngineTestCase, self).setUp()
+		# As if NumPy couldn't be imported
+		self.engines, aggregation.ENGINES = aggregation.ENGINES, ('sql',)
+
+	def tearDown(self):
+		aggregation.ENGINES = self.engines
+		super(UnavailableEngineTestCase, self).tearDown()
+
+	def test_config(self):
+		class Settings(object):
+			AGGREGATION_ENGINE = 'numpy'
+		self.assertRaises(ValueError, create_app, 'tests', Settings)
+
+	def test_request(self):
+		self.assertBadRequest(self.get('/measurements', query_string=dict(engine='numpy')))
@@ -0,0 +1,163 @@
+# -*- coding: UTF-8 -*-
+import json
+import struct
+import time
+
+__author__ = 'quentingerome'
+
+from .measurement_tests import BaseMeasurementTestCase
+from coolnhot.extensions import response_cache, sample_cache
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+
+class MeasurementsApiTestCase(BaseMeasurementTestCase):
+	start = datetime(2015, 10, 1, 12, 0, 0)
+
+	def _create_fixtures(self):
+		super(MeasurementsApiTestCase, self)._create_fixtures()
+		for i in range(0, 3 * 3600, 120):
+			self.create_measurement(created_at=self.start + relativedelta(seconds=i))
+		self.session.commit()
+
+	def get_measurements(self, headers=None, **params):
+		params.setdefault('start_at', self.start.isoformat())
+		return self.get('/measurements', query_string=params, headers=headers)
+
+	def test_get(self):
+		r = self.assertOkJson(self.get_measurements())
+		items = json.loads(r.data)['items']
+		self.assertEqual(len(items), 36)
+		self.assertEqual(items[0]['created_at'], '2015-10-01 12:00:00')
+
+	def test_stream(self):
+		self.app.config['MEASUREMENTS_FETCH_SIZE'] = 7
+		expected = json.loads(self.get_measurements().data)
+		r = self.assertOkJson(self.get_measurements(stream=1))
+		self.assertEqual(json.loads(r.data), expected)
+
+	def test_columnar(self):
+		items = json.loads(self.get_measurements().data)['items']
+		r = self.assertOk(self.get_measurements(format='columnar'))
+		self.assertContentType(r, 'application/vnd.coolnhot.columnar+json')
+		data = json.loads(r.data)
+		self.assertEqual(data['temperature'], [x['temperature'] for x in items])
+		self.assertEqual(data['epoch'][:2], [1443700800, 1443701100])
+
+		r = self.assertOk(self.get_measurements(delta=1, headers={'Accept': 'application/vnd.coolnhot.columnar+json'}))
+		data = json.loads(r.data)
+		self.assertEqual(data['epoch'][:3], [1443700800, 300, 300])
+
+	def test_binary(self):
+		items = json.loads(self.get_measurements().data)['items']
+		r = self.assertOk(self.get_measurements(format='binary', delta=1))
+		self.assertContentType(r, 'application/octet-stream')
+		n, = struct.unpack_from('<I', r.data)
+		self.assertEqual(n, len(items))
+		values = struct.unpack_from('<%dI%df%df' % (n, n, n), r.data, 4)
+		self.assertEqual(values[:2], (1443700800, 300))
+		self.assertAlmostEqual(values[n], items[0]['temperature'], places=4)
+		self.assertAlmostEqual(values[-1], items[-1]['humidity'], places=4)
+
+	def test_stats(self):
+		end_at = (self.start + relativedelta(hours=1)).isoformat()
+		items = json.loads(self.assertOkJson(self.get_measurements(end_at=end_at, stats='min,max,count,p95')).data)['items']
+		self.assertEqual(len(items), 12)
+		self.assertEqual(items[0]['count'], 3)
+		self.assertLessEqual(items[0]['temperature_min'], items[0]['temperature_p95'])
+		self.assertLessEqual(items[0]['temperature_p95'], items[0]['temperature_max'])
+		self.assertNotIn('humidity_stddev', items[0])
+
+		r = self.assertOk(self.get_measurements(end_at=end_at, stats=['stddev', 'count'], format='binary'))
+		n, = struct.unpack_from('<I', r.data)
+		values = struct.unpack_from('<%dI%df' % (n, 5 * n), r.data, 4)
+		self.assertEqual(sum(values[-n:]), 30)
+
+		self.assertBadRequest(self.get_measurements(stats='median'))
+
+	def test_invalid_format(self):
+		self.assertBadRequest(self.get_measurements(format='xml'))
+
+	def test_max_points(self):
+		end_at = self.start.replace(hour=15).isoformat()
+		items = json.loads(self.get_measurements(max_points=10, end_at=end_at).data)['items']
+		self.assertEqual(len(items), 6)
+		self.assertEqual(items[1]['created_at'], '2015-10-01 12:30:00')
+
+		items = json.loads(self.get_measurements(max_points=10, end_at=end_at, downsample='lttb').data)['items']
+		self.assertEqual(len(items), 10)
+
+		self.assertBadRequest(self.get_measurements(max_points=0))
+		self.assertBadRequest(self.get_measurements(max_points=10, downsample='foo'))
+
+	def test_conditional_get(self):
+		r = self.assertOkJson(self.get_measurements())
+		etag = r.headers['ETag']
+		self.assertEqual(r.headers['Last-Modified'], 'Thu, 01 Oct 2015 14:58:00 GMT')
+		self.assertStatusCode(self.get_measurements(headers={'If-None-Match': etag}), 304)
+		self.assertStatusCode(self.get_measurements(headers={'If-Modified-Since': r.headers['Last-Modified']}), 304)
+
+		self.create_measurement(created_at=self.start + relativedelta(hours=4))
+		self.session.commit()
+		r = self.assertOkJson(self.get_measurements(headers={'If-None-Match': etag}))
+		self.assertNotEqual(r.headers['ETag'], etag)
+
+	def test_closed_window_cache(self):
+		end_at = (self.start + relativedelta(hours=1)).isoformat()
+		response_cache.clear()
+		r = self.assertOkJson(self.get_measurements(end_at=end_at))
+		self.assertEqual(response_cache.size, len(r.data))
+		self.assertEqual(r.headers['Last-Modified'], 'Thu, 01 Oct 2015 13:00:00 GMT')
+
+		# Closed windows are served from the cache without hitting the database again
+		cached = self.assertOkJson(self.get_measurements(end_at=end_at))
+		self.assertEqual(cached.data, r.data)
+		self.assertEqual(cached.headers['ETag'], r.headers['ETag'])
+
+		# Until a late measurement changes them
+		self.create_measurement(created_at=self.start, temperature=1000)
+		self.session.commit()
+		fresh = self.assertOkJson(self.get_measurements(end_at=end_at, headers={'If-None-Match': r.headers['ETag']}))
+		self.assertNotEqual(fresh.data, r.data)
+		self.assertNotEqual(fresh.headers['ETag'], r.headers['ETag'])
+		self.assertEqual(fresh.data, self.get_measurements(end_at=end_at).data)
+
+	def test_response_cache_eviction(self):
+		response_cache.clear()
+		response_cache.max_size = 10
+		response_cache.set('a', 'x' * 6, 'text/plain')
+		response_cache.set('b', 'x' * 4, 'text/plain')
+		response_cache.get('a')
+		response_cache.set('c', 'x' * 3, 'text/plain')
+		self.assertIsNone(response_cache.get('b'))
+		self.assertIsNotNone(response_cache.get('a'))
+		self.assertEqual(response_cache.size, 9)
+
+
+class LatestMeasurementApiTestCase(BaseMeasurementTestCase):
+	def setUp(self):
+		super(LatestMeasurementApiTestCase, self).setUp()
+		sample_cache.init_app(self.app)
+
+	def get_latest(self, **params):
+		return json.loads(self.assertOkJson(self.get('/measurements/latest', query_string=params)).data)['item']
+
+	def test_not_found(self):
+		self.assertNotFound(self.get('/measurements/latest'))
+
+	def test_from_cache(self):
+		now = time.time()
+		sample_cache.append(now - 10, 21.5, 40, 'kitchen')
+		sample_cache.append(now, 18, 55, 'cellar')
+		self.assertEqual(self.get_latest()['sensor'], 'cellar')
+		item = self.get_latest(sensor='kitchen')
+		self.assertEqual((item['temperature'], item['humidity']), (21.5, 40))
+
+	def test_stale_cache(self):
+		sample_cache.append(time.time() - self.app.config['LATEST_MAX_AGE'] - 1, 21.5, 40, 'default')
+		self.create_measurement(temperature=19, humidity=45, created_at=datetime(2015, 10, 1, 12))
+		self.create_measurement(temperature=20, humidity=45, created_at=datetime(2015, 10, 1, 13))
+		self.session.commit()
+		item = self.get_latest()
+		self.assertEqual(item['created_at'], '2015-10-01 13:00:00')
+		self.assertEqual(item['temperature'], 20)
@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+from argparse import Namespace
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+from benchmarks import queries
+from benchmarks.compare import compare
+from benchmarks.data import START, generate, populate, ranges
+from coolnhot.models import Measurement, MeasurementRollup
+
+
+class SyntheticDataTestCase(CoolnHotAppTestCase):
+	def test_populate(self):
+		rows = list(generate(2, 300, ('default', 'cellar')))
+		self.assertEqual(len(rows), 2 * 288 * 2)
+		self.assertEqual(rows[0][0], START)
+		self.assertEqual(rows, list(generate(2, 300, ('default', 'cellar'))))
+
+		self.assertEqual(populate(rows, batch_size=100), len(rows))
+		self.assertEqual(Measurement.query.count(), len(rows))
+		self.assertEqual(MeasurementRollup.query.filter_by(resolution=86400).count(), 4)
+		self.assertEqual([label for label, _, _ in ranges(2)], ['1h', '1d'])
+
+		results = queries.run(Namespace(days=2, repeat=1))
+		self.assertEqual([r['name'] for r in results[:3]], ['per_interval 1h', 'raw_per_interval 1h', 'avg 1h'])
+
+
+class CompareTestCase(TestCase):
+	def test_compare(self):
+		before = {('api', 'json 1d'): dict(seconds=0.1), ('api', 'binary 1d'): dict(seconds=0.1)}
+		after = {('api', 'json 1d'): dict(seconds=0.2), ('api', 'binary 1d'): dict(seconds=0.105), ('api', 'new'): dict(seconds=1)}
+		self.assertEqual(compare(before, after), [
+			('api', 'binary 1d', 0.1, 0.105, False),
+			('api', 'json 1d', 0.1, 0.2, True),
+		])
@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from .measurement_tests import BaseMeasurementTestCase
+from coolnhot.factory import resolve_paths
+from coolnhot.models import Measurement, insert_measurements
+from coolnhot.models import binlog
+from coolnhot.models.binlog import MeasurementLog
+from coolnhot.models.storage import storage, export_to_log, import_from_log
+from dateutil.relativedelta import relativedelta
+
+START = datetime(2015, 10, 1, 12)
+
+
+def rows(count, step=1, sensor_id='default'):
+	# The temperature is the minute of the hour, the humidity the second
+	return [
+		(START + relativedelta(seconds=i * step), float((i * step) // 60 % 60), float(i * step % 60), sensor_id)
+		for i in range(count)
+	]
+
+
+class MeasurementLogTestCase(TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self._index_every = binlog.INDEX_EVERY
+		binlog.INDEX_EVERY = 16
+		self.log = MeasurementLog(self.tmp)
+		self.log.append(rows(3600))
+
+	def tearDown(self):
+		binlog.INDEX_EVERY = self._index_every
+		shutil.rmtree(self.tmp)
+
+	def check_per_interval(self):
+		result = self.log.per_interval(60, START + relativedelta(seconds=90), START + relativedelta(minutes=5))
+		self.assertEqual([r.epoch - result[0].epoch for r in result], [0, 60, 120, 180])
+		self.assertEqual(result[0], ('2015-10-01 12:01:00', 1, 44.5, 1443700860))
+		self.assertEqual(result[0]['humidity'], 44.5)
+		self.assertEqual([r.temperature for r in result[1:]], [2, 3, 4])
+		self.assertEqual(len(self.log.per_interval(300)), 12)
+
+	def test_per_interval(self):
+		self.check_per_interval()
+
+	def test_per_interval_without_numpy(self):
+		numpy, binlog.numpy = binlog.numpy, None
+		try:
+			self.check_per_interval()
+		finally:
+			binlog.numpy = numpy
+
+	def test_stats(self):
+		result = self.log.per_interval(60, START + relativedelta(seconds=90), START + relativedelta(minutes=5),
+			stats=('count', 'min', 'max', 'stddev', 'p50'))
+		self.assertEqual(len(result), 4)
+		first = result[0]
+		self.assertEqual((first.count, first.humidity_min, first.humidity_max, first.temperature_stddev), (30, 30, 59, 0))
+		self.assertEqual(first['humidity'], 44.5)
+		self.assertAlmostEqual(first.humidity_p50, 44.5, delta=1)
+
+	def test_sensors(self):
+		self.log.append(rows(60, step=60, sensor_id='cellar'))
+		self.assertEqual(self.log.sensor_ids, ['cellar', 'default'])
+		self.assertEqual(self.log.per_interval(3600, sensor_id='cellar')[0].temperature, 29.5)
+		self.assertEqual(self.log.per_interval(3600)[0].temperature, 29.5)
+		self.assertEqual(self.log.newest('cellar').created_at, START + relativedelta(minutes=59))
+		self.assertEqual(self.log.newest().sensor_id, 'default')
+		self.assertEqual(self.log.per_interval(3600, sensor_id='attic'), [])
+		self.assertEqual(self.log.avg(START, START + relativedelta(minutes=1), 'default'), dict(temperature=0, humidity=29.5))
+
+	def test_append_only(self):
+		# Replayed measurements are dropped
+		version = self.log.version()
+		self.assertEqual(self.log.append(rows(3601)), 1)
+		self.assertEqual(len(self.log.sensor('default')), 3601)
+		self.assertNotEqual(self.log.version(), version)
+		self.log.append(rows(3601))
+		self.assertEqual(self.log.version(), (('default', 3601),))
+
+
+class LogStorageTestCase(BaseMeasurementTestCase):
+	def setUp(self):
+		super(LogStorageTestCase, self).setUp()
+		self.tmp = tempfile.mkdtemp()
+		self.app.config.update(MEASUREMENT_STORAGE='log', MEASUREMENT_LOG_PATH=self.tmp)
+		storage.init_app(self.app)
+
+	def tearDown(self):
+		storage.log = None
+		shutil.rmtree(self.tmp)
+		super(LogStorageTestCase, self).tearDown()
+
+	def test_path_relative_to_app(self):
+		# The sampler and the server write and read the same logs whatever their working directory
+		self.app.config['MEASUREMENT_LOG_PATH'] = 'measurements.log.d'
+		resolve_paths(self.app)
+		self.assertEqual(self.app.config['MEASUREMENT_LOG_PATH'], os.path.join(self.app.root_path, 'measurements.log.d'))
+
+	def test_api(self):
+		storage.write(rows(600, step=6))
+		r = self.assertOkJson(self.get('/measurements', query_string=dict(start_at=START.isoformat())))
+		items = json.loads(r.data)['items']
+		self.assertEqual([i['created_at'] for i in items[:2]], ['2015-10-01 12:00:00', '2015-10-01 12:05:00'])
+		self.assertEqual(items[1]['temperature'], 7)
+		self.assertEqual(Measurement.query.count(), 0)
+
+		r = self.assertOk(self.get('/measurements', query_string=dict(
+			start_at=START.isoformat(), end_at=(START + relativedelta(hours=1)).isoformat(), max_points=5, downsample='lttb',
+			format='columnar')))
+		self.assertEqual(len(json.loads(r.data)['epoch']), 5)
+
+	def test_conditional_get_skips_aggregation(self):
+		storage.write(rows(600, step=6))
+		calls = []
+		per_interval = storage.log.per_interval
+		storage.log.per_interval = lambda *args, **kwargs: calls.append(args) or per_interval(*args, **kwargs)
+		params = dict(start_at=START.isoformat(), end_at=(START + relativedelta(hours=1)).isoformat())
+		r = self.assertOkJson(self.get('/measurements', query_string=params))
+		self.assertStatusCode(self.get('/measurements', query_string=params, headers={'If-None-Match': r.headers['ETag']}),
+			304)
+		self.assertEqual(self.get('/measurements', query_string=params).data, r.data)
+		self.assertEqual(len(calls), 1)
+
+	def test_convert(self):
+		with self.db.engine.begin() as connection:
+			insert_measurements(connection, rows(120, step=30))
+		with self.db.engine.connect() as connection:
+			self.assertEqual(export_to_log(connection, storage.log), 120)
+			self.assertEqual(export_to_log(connection, storage.log), 0)
+		storage.write(rows(130, step=30)[120:])
+
+		self.assertEqual(import_from_log(self.db.engine, storage.log, batch_size=4), 10)
+		self.assertEqual(import_from_log(self.db.engine, storage.log), 0)
+		self.assertEqual(Measurement.query.count(), 130)
+		self.assertEqual(Measurement.query.newest().created_at, START + relativedelta(seconds=129 * 30))
@@ -0,0 +1,100 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+from coolnhot.factory import resolve_paths
+from coolnhot.models import Measurement, MeasurementRollup
+from coolnhot.models.buffer import MeasurementBuffer
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+
+class MeasurementBufferTestCase(CoolnHotAppTestCase):
+	def setUp(self):
+		super(MeasurementBufferTestCase, self).setUp()
+		self.start = datetime.utcnow()
+		self.tmp = tempfile.mkdtemp()
+		self.spill_path = os.path.join(self.tmp, 'measurements.spill')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+		super(MeasurementBufferTestCase, self).tearDown()
+
+	def add(self, buffer, count, offset=0):
+		for i in range(offset, offset + count):
+			buffer.add(20 + i, 50, created_at=self.start + relativedelta(seconds=i))
+
+	def test_max_rows(self):
+		buffer = MeasurementBuffer(max_rows=3, max_age=3600)
+		self.add(buffer, 2)
+		self.assertEqual(Measurement.query.count(), 0)
+		self.add(buffer, 1, offset=2)
+		self.assertEqual(Measurement.query.count(), 3)
+		self.assertEqual(sum(r.temperature_sum for r in MeasurementRollup.query.filter_by(resolution=60)), 63)
+		self.assertEqual(buffer.rows, [])
+
+	def test_max_age(self):
+		buffer = MeasurementBuffer(max_rows=100, max_age=60)
+		self.add(buffer, 2)
+		self.assertFalse(buffer.due(self.start + relativedelta(seconds=59)))
+		self.assertTrue(buffer.due(self.start + relativedelta(seconds=60)))
+
+	def test_close(self):
+		buffer = MeasurementBuffer(max_rows=100, max_age=3600)
+		self.add(buffer, 5)
+		buffer.close()
+		self.assertEqual(Measurement.query.count(), 5)
+
+	def test_spill_recovery(self):
+		buffer = MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path)
+		self.add(buffer, 5)
+		buffer.close(flush=False)
+
+		buffer = MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path)
+		self.assertEqual(len(buffer.rows), 5)
+		self.assertEqual(buffer.rows[0][0], self.start)
+		self.add(buffer, 1, offset=5)
+		buffer.close()
+		self.assertEqual(Measurement.query.count(), 6)
+		self.assertEqual(os.path.getsize(self.spill_path), 0)
+
+	def test_spill_synced_on_close(self):
+		synced = []
+		fsync, os.fsync = os.fsync, synced.append
+		try:
+			buffer = MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path)
+			self.add(buffer, 2)
+			self.assertEqual(synced, [])
+			# Pending measurements are on disk before a one-shot process exits, flushed ones need no sync
+			buffer.close(flush=False)
+			self.assertEqual(len(synced), 1)
+			MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path).close()
+			self.assertEqual(len(synced), 1)
+		finally:
+			os.fsync = fsync
+		self.assertEqual(Measurement.query.count(), 2)
+
+	def test_spill_recovery_after_commit(self):
+		buffer = MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path)
+		self.add(buffer, 3)
+		with open(self.spill_path) as f:
+			spilled = f.read()
+		buffer.close()
+
+		# Crash between the commit and the truncation of the spill file
+		with open(self.spill_path, 'w') as f:
+			f.write(spilled)
+		MeasurementBuffer(max_rows=100, max_age=3600, spill_path=self.spill_path).close()
+		self.assertEqual(Measurement.query.count(), 3)
+
+	def test_spill_path_relative_to_app(self):
+		self.app.config['MEASUREMENT_BUFFER_SPILL'] = 'measurements.spill'
+		resolve_paths(self.app)
+		self.assertEqual(self.app.config['MEASUREMENT_BUFFER_SPILL'], os.path.join(self.app.root_path, 'measurements.spill'))
+		self.app.config['MEASUREMENT_BUFFER_SPILL'] = self.spill_path
+		resolve_paths(self.app)
+		self.assertEqual(MeasurementBuffer.from_config(self.app.config).spill_path, self.spill_path)
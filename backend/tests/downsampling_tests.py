@@ -0,0 +1,42 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+from coolnhot.downsampling import lttb, minmax
+from coolnhot.models import auto_interval
+from datetime import datetime
+import math
+
+__author__ = 'quentingerome'
+
+
+class DownsamplingTestCase(TestCase):
+	def setUp(self):
+		self.rows = [
+			dict(epoch=i * 60, temperature=20 + math.sin(i / 10.0), humidity=50 + math.cos(i / 7.0))
+			for i in range(1000)
+		]
+		# A single spike that averaging would flatten
+		self.rows[503]['temperature'] = 45
+
+	def test_lttb(self):
+		sampled = lttb(self.rows, 100, ('temperature', 'humidity'))
+		self.assertEqual(len(sampled), 100)
+		self.assertIs(sampled[0], self.rows[0])
+		self.assertIs(sampled[-1], self.rows[-1])
+		self.assertIn(self.rows[503], sampled)
+		self.assertEqual(sampled, sorted(sampled, key=lambda r: r['epoch']))
+
+	def test_minmax(self):
+		sampled = minmax(self.rows, 100, ('temperature', 'humidity'))
+		self.assertLessEqual(len(sampled), 100)
+		self.assertIn(self.rows[503], sampled)
+		self.assertEqual(sampled, sorted(sampled, key=lambda r: r['epoch']))
+
+	def test_small_inputs(self):
+		self.assertEqual(lttb(self.rows[:10], 100, ('temperature',)), self.rows[:10])
+		self.assertEqual(minmax(self.rows[:10], 100, ('temperature',)), self.rows[:10])
+
+	def test_auto_interval(self):
+		start = datetime(2015, 1, 1)
+		self.assertEqual(auto_interval(start, datetime(2015, 1, 2), 1000), 120)
+		self.assertEqual(auto_interval(start, datetime(2015, 1, 2), 288), 300)
+		self.assertEqual(auto_interval(start, datetime(2016, 1, 1), 100), 4 * 86400)
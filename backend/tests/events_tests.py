@@ -0,0 +1,99 @@
+# -*- coding: UTF-8 -*-
+from itertools import islice
+import json
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+from coolnhot.api.events import events
+from coolnhot.extensions import sample_cache
+
+
+def parse(event):
+	fields = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+	if 'data' in fields:
+		fields['data'] = json.loads(fields['data'])
+	return fields
+
+
+class MeasurementEventsTestCase(CoolnHotAppTestCase):
+	def setUp(self):
+		super(MeasurementEventsTestCase, self).setUp()
+		self.app.config['SAMPLE_CACHE_CAPACITY'] = 8
+		sample_cache.init_app(self.app)
+		self.now = 1443700800
+		self.pending = []
+
+	def clock(self):
+		return self.now
+
+	def sleep(self, seconds):
+		# The sampler writes while the subscriber waits
+		self.now += seconds
+		for sample in self.pending.pop(0) if self.pending else []:
+			sample_cache.append(*sample)
+
+	def events(self, count, **kwargs):
+		kwargs.setdefault('heartbeat', 15)
+		return list(islice(events(0, clock=self.clock, sleep=self.sleep, **kwargs), count))
+
+	def test_samples(self):
+		sample_cache.append(self.now, 20, 50, 'a')
+		self.pending = [[(self.now + 60, 21, 51, 'b'), (self.now + 60, 22, 52, 'a')]]
+		received = [parse(e) for e in self.events(3)]
+		self.assertEqual([e['id'] for e in received], ['0', '1', '2'])
+		self.assertEqual(received[0]['data'], dict(created_at='2015-10-01 12:00:00', temperature=20, humidity=50, sensor='a'))
+
+		received = [parse(e) for e in self.events(2, sensor_id='a')]
+		self.assertEqual([e['data']['temperature'] for e in received], [20, 22])
+
+	def test_heartbeat(self):
+		self.pending = [[], [], [(self.now, 20, 50, 'a')]]
+		received = self.events(2, heartbeat=2)
+		self.assertEqual(received[0], ': heartbeat\n\n')
+		self.assertEqual(parse(received[1])['event'], 'sample')
+
+	def test_buckets(self):
+		for i in range(5):
+			sample_cache.append(self.now + i * 20, 20 + i, 50, 'a')
+		received = [parse(e) for e in self.events(1, interval=60)]
+		self.assertEqual(received[0]['event'], 'bucket')
+		self.assertEqual(received[0]['data'], dict(created_at='2015-10-01 12:00:00', temperature=21, humidity=50, epoch=self.now))
+
+	def test_gap(self):
+		for i in range(12):
+			sample_cache.append(self.now + i, 20, 50, 'a')
+		received = [parse(e) for e in self.events(2)]
+		self.assertEqual(received[0], dict(event='gap', data=dict(dropped=5)))
+		self.assertEqual(received[1]['id'], '5')
+
+	def test_endpoint(self):
+		for i in range(3):
+			sample_cache.append(self.now + i, 20 + i, 50, 'a')
+		r = self.get('/measurements/events', headers={'Last-Event-ID': '0'})
+		self.assertContentType(r, 'text/event-stream; charset=utf-8')
+		retry, event = map(parse, islice(r.response, 2))
+		r.close()
+		self.assertEqual(retry, dict(retry='3000'))
+		self.assertEqual((event['id'], event['data']['temperature']), ('1', 21))
+		self.assertBadRequest(self.get('/measurements/events', query_string=dict(interval=0)))
+
+	def test_max_age(self):
+		self.pending = [[(self.now, 20, 50, 'a')]] + [[]] * 10
+		received = self.events(10, max_age=5, retry=1000)
+		self.assertEqual(received[0], 'retry: 1000\n\n')
+		self.assertEqual(parse(received[1])['event'], 'sample')
+		# The stream ends rather than keeping its thread
+		self.assertEqual(len(received), 2)
+
+	def test_max_streams(self):
+		self.app.config['EVENTS_MAX_STREAMS'] = 1
+		first = self.get('/measurements/events')
+		r = self.get('/measurements/events')
+		self.assertEqual(r.status_code, 503)
+		self.assertEqual(r.headers['Retry-After'], '3')
+		# Closed streams give their slot back
+		first.close()
+		r = self.get('/measurements/events')
+		self.assertContentType(r, 'text/event-stream; charset=utf-8')
+		r.close()
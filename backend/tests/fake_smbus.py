@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*-
+"""
+A stand-in for `smbus.SMBus` simulating Si7020 chips.
+"""
+
+__author__ = 'quentingerome'
+
+from coolnhot.si7020 import crc8
+
+
+class FakeSi7020(object):
+	def __init__(self, raw_temp=0x6000, raw_hum=0x8000, busy_polls=3):
+		self.raw_temp = raw_temp
+		self.raw_hum = raw_hum
+		#: Number of reads NACKed after a no hold master conversion is started
+		self.busy_polls = busy_polls
+		self.last_temp = None
+		self.busy = 0
+		self.output = []
+		#: Number of upcoming results sent with a wrong checksum
+		self.corrupt = 0
+		self.resets = 0
+
+	def _word(self, raw):
+		data = [raw >> 8, raw & 0xff]
+		crc = crc8(data)
+		if self.corrupt:
+			self.corrupt -= 1
+			crc ^= 0xff
+		return data + [crc]
+
+	def measure(self, cmd):
+		if cmd in (0xe5, 0xf5):
+			self.last_temp = self.raw_temp
+			return self._word(self.raw_hum)
+		if cmd in (0xe3, 0xf3):
+			return self._word(self.raw_temp)
+		if cmd == 0xe0:
+			return [self.last_temp >> 8, self.last_temp & 0xff]
+		if cmd == 0xfe:
+			self.resets += 1
+		return []
+
+	def write_byte(self, cmd):
+		self.output = self.measure(cmd)
+		self.busy = self.busy_polls
+
+	def read_byte(self):
+		if self.busy:
+			self.busy -= 1
+			raise IOError(121, 'Remote I/O error')
+		return self.output.pop(0)
+
+	def read_i2c_block_data(self, cmd, length):
+		return self.measure(cmd)[:length]
+
+
+class FakeSMBus(object):
+	def __init__(self, chips=None):
+		self.chips = chips if chips is not None else {0x40: FakeSi7020()}
+		self.transactions = []
+
+	def write_byte(self, address, value):
+		self.transactions.append(('write_byte', address, value))
+		self.chips[address].write_byte(value)
+
+	def read_byte(self, address):
+		self.transactions.append(('read_byte', address))
+		return self.chips[address].read_byte()
+
+	def read_i2c_block_data(self, address, cmd, length):
+		self.transactions.append(('read_i2c_block_data', address, cmd))
+		return self.chips[address].read_i2c_block_data(cmd, length)
@@ -0,0 +1,93 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+import threading
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+from coolnhot.extensions import db
+from coolnhot.manage import fixed_rate, SamplerCommand
+from coolnhot.manage.serve import gunicorn_application, gunicorn_options
+from coolnhot.models import Measurement
+
+
+class FakeClock(object):
+	"""
+	A clock and stop event pair where waiting advances the time, stopping after `ticks` waits.
+	"""
+	def __init__(self, now, ticks=5):
+		self.now = now
+		self.ticks = ticks
+
+	def __call__(self):
+		return self.now
+
+	def wait(self, timeout):
+		self.now += max(0, timeout)
+		self.ticks -= 1
+		return self.ticks < 0
+
+	set = lambda self: setattr(self, 'ticks', 0)
+
+
+class FixedRateTestCase(TestCase):
+	def ticks(self, now, interval, work):
+		clock = FakeClock(now)
+		ticks = []
+		for tick in fixed_rate(interval, clock, clock=clock):
+			ticks.append((tick, clock.now))
+			clock.now += work
+		return ticks
+
+	def test_aligned(self):
+		self.assertEqual(self.ticks(1003.5, 10, 0), [(1010, 1010), (1020, 1020), (1030, 1030), (1040, 1040), (1050, 1050)])
+
+	def test_no_drift(self):
+		self.assertEqual([t for t, _ in self.ticks(1000, 10, 3)], [1010, 1020, 1030, 1040, 1050])
+
+	def test_skip_missed(self):
+		self.assertEqual([t for t, _ in self.ticks(1000, 10, 25)], [1010, 1040, 1070, 1100, 1130])
+
+
+class SamplerTestCase(CoolnHotAppTestCase):
+	def test_run(self):
+		command = SamplerCommand()
+		command.stop = FakeClock(0, ticks=3)
+		command.run(interval=0.01)
+		self.assertEqual(Measurement.query.count(), 3)
+
+	def test_run_compacts_in_background(self):
+		threads = []
+		command = SamplerCommand()
+		command.compact_database = lambda engine, config: threads.append(threading.current_thread())
+		command.stop = FakeClock(0, ticks=3)
+		self.app.config['COMPACT_INTERVAL'] = 0.02
+		command.run(interval=0.01)
+		# Not on the first tick, and never in the sampling thread
+		self.assertEqual(len(threads), 1)
+		self.assertIsNot(threads[0], threading.current_thread())
+		self.assertEqual(Measurement.query.count(), 3)
+
+
+class ServeTestCase(CoolnHotAppTestCase):
+	def test_options(self):
+		options = gunicorn_options(self.app)
+		self.assertEqual(options['bind'], '0.0.0.0:5000')
+		self.assertEqual((options['workers'], options['threads']), (2, 8))
+		self.assertEqual(options['worker_class'], 'gunicorn.workers.gthread.ThreadWorker')
+
+		options = gunicorn_options(self.app, host='127.0.0.1', port=8000, workers=4, threads=1)
+		self.assertEqual(options['bind'], '127.0.0.1:8000')
+		self.assertEqual((options['workers'], options['threads'], options['worker_class']), (4, 1, 'sync'))
+
+	def test_gunicorn_application(self):
+		application = gunicorn_application(self.app, gunicorn_options(self.app, workers=3))
+		self.assertIs(application.load(), self.app)
+		self.assertEqual(application.cfg.workers, 3)
+		self.assertEqual(application.cfg.keepalive, 5)
+
+		# Forked workers drop the connections of the engine they inherited
+		engine = db.get_engine(self.app)
+		pool = engine.pool
+		application.cfg.post_fork(None, None)
+		self.assertIsNot(engine.pool, pool)
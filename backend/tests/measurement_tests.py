@@ -6,15 +6,16 @@ __author__ = 'quentingerome'
 
 import logging
 from . import CoolnHotAppTestCase
-from coolnhot.models import Measurement
+from coolnhot.models import Measurement, MeasurementRollup, insert_measurements, rebuild_rollups, to_epoch
 from datetime import datetime
 import random
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import event
 
 log = logging.getLogger(__name__)
 
 
-class MeasurementTestCase(CoolnHotAppTestCase):
+class BaseMeasurementTestCase(CoolnHotAppTestCase):
 	def create_measurement(self, temperature=None, humidity=None, created_at=None):
 		m = Measurement(
 			temperature=temperature or random.randint(-100, 300) / 10,
@@ -24,9 +25,8 @@ class MeasurementTestCase(CoolnHotAppTestCase):
 		self.session.add(m)
 		return m
 
-	def _create_fixtures(self):
-		super(MeasurementTestCase, self)._create_fixtures()
 
+class MeasurementTestCase(BaseMeasurementTestCase):
 	def test_create(self):
 		self.create_measurement()
 		self.session.commit()
@@ -35,3 +35,119 @@ class MeasurementTestCase(CoolnHotAppTestCase):
 		self.session.delete(Measurement.query.first())
 		self.session.commit()
 		self.assertTrue(Measurement.query.count() == 0)
+
+
+class RollupTestCase(BaseMeasurementTestCase):
+	start = datetime(2015, 10, 1, 12, 0, 0)
+
+	def _create_fixtures(self):
+		super(RollupTestCase, self)._create_fixtures()
+		for i in range(0, 3 * 3600, 90):
+			self.create_measurement(created_at=self.start + relativedelta(seconds=i))
+		self.session.commit()
+
+	def rows(self, q):
+		return [(x[0], round(x[1], 6), round(x[2], 6)) for x in self.session.execute(q)]
+
+	def test_rollups_maintained(self):
+		minutes = MeasurementRollup.query.filter_by(resolution=60).all()
+		self.assertEqual(sum(r.count for r in minutes), Measurement.query.count())
+		hours = MeasurementRollup.query.filter_by(resolution=3600).order_by(MeasurementRollup.bucket).all()
+		self.assertEqual(len(hours), 3)
+		self.assertEqual(hours[0].count, 40)
+		self.assertEqual(hours[0].temperature_max, max(
+			m.temperature for m in Measurement.query.filter(Measurement.created_at < self.start + relativedelta(hours=1))
+		))
+
+	def test_per_interval(self):
+		end_at = self.start + relativedelta(hours=2)
+		for interval in (300, 900, 3600):
+			self.assertEqual(
+				self.rows(Measurement.query.per_interval(interval, start_at=self.start, end_at=end_at)),
+				self.rows(Measurement.query.raw_per_interval(interval, start_at=self.start, end_at=end_at)),
+			)
+
+	def test_rollups_follow_updates_and_deletes(self):
+		end_at = self.start + relativedelta(hours=3)
+		hottest = Measurement.query.order_by(Measurement.temperature.desc()).first()
+		self.session.delete(hottest)
+		moved = Measurement.query.order_by(Measurement.epoch).first()
+		moved.temperature, moved.created_at = 99, self.start + relativedelta(hours=2, minutes=1)
+		self.session.commit()
+
+		stats = ('count', 'min', 'max')
+		for interval in (60, 300, 3600):
+			self.assertEqual(
+				self.session.execute(Measurement.query.per_interval(interval, self.start, end_at, stats=stats)).fetchall(),
+				self.session.execute(Measurement.query.raw_per_interval(interval, self.start, end_at, stats=stats)).fetchall(),
+			)
+
+	def test_rebuild_rollups(self):
+		expected = self.rows(Measurement.query.per_interval(300))
+		rebuild_rollups(self.session.connection())
+		self.assertEqual(self.rows(Measurement.query.per_interval(300)), expected)
+
+	def test_stats(self):
+		stats = ('count', 'min', 'max', 'stddev')
+		end_at = self.start + relativedelta(hours=2)
+		rollups = self.session.execute(Measurement.query.per_interval(900, self.start, end_at, stats=stats)).fetchall()
+		raw = self.session.execute(Measurement.query.raw_per_interval(900, self.start, end_at, stats=stats)).fetchall()
+		self.assertEqual(len(rollups), 8)
+		for r, e in zip(rollups, raw):
+			self.assertEqual((r['count'], r['temperature_min'], r['humidity_max']), (10, e['temperature_min'], e['humidity_max']))
+			self.assertAlmostEqual(r['temperature_stddev'], e['temperature_stddev'])
+			self.assertAlmostEqual(r['humidity_stddev'], e['humidity_stddev'])
+
+		# Percentiles can't be merged from the rollups, they are exact for up to 5 measurements per bucket
+		rows = self.session.execute(Measurement.query.per_interval(300, self.start, end_at, stats=('p50',))).fetchall()
+		temperatures = sorted(m.temperature for m in Measurement.query.filter(Measurement.epoch < to_epoch(self.start) + 300))
+		self.assertEqual(len(temperatures), 4)
+		self.assertEqual(rows[0]['temperature_p50'], (temperatures[1] + temperatures[2]) / 2.0)
+
+	def test_constant_stddev(self):
+		# Sums of squares cancel out to a slightly negative variance, which must not become NULL or NaN
+		start = datetime(2015, 11, 1)
+		rows = [(start + relativedelta(seconds=i), 20.1, 50, 'default') for i in range(30)]
+		insert_measurements(self.session.connection(), rows)
+		row, = self.session.execute(Measurement.query.per_interval(900, start, start + relativedelta(minutes=15),
+			stats=('stddev',))).fetchall()
+		self.assertEqual(row['temperature_stddev'], 0.0)
+
+
+class QueryPlanTestCase(BaseMeasurementTestCase):
+	start = datetime(2015, 10, 1, 12, 0, 0)
+
+	def query_plans(self, fn):
+		statements = []
+
+		def capture(conn, cursor, statement, parameters, context, executemany):
+			statements.append((statement, parameters))
+
+		engine = self.db.get_engine(self.app)
+		event.listen(engine, 'before_cursor_execute', capture)
+		try:
+			fn()
+		finally:
+			event.remove(engine, 'before_cursor_execute', capture)
+		return [
+			' '.join(row['detail'] for row in self.session.connection().execute('EXPLAIN QUERY PLAN ' + statement, tuple(parameters)).fetchall())
+			for statement, parameters in statements
+		]
+
+	def assertSearches(self, fn, index):
+		plans = self.query_plans(fn)
+		self.assertTrue(plans)
+		for plan in plans:
+			self.assertIn('SEARCH', plan)
+			self.assertIn(index, plan)
+
+	def test_avg_uses_index(self):
+		self.assertSearches(lambda: Measurement.query.avg(self.start), 'ix_measurements_epoch')
+
+	def test_raw_per_interval_uses_index(self):
+		q = Measurement.query.raw_per_interval(90, start_at=self.start, end_at=self.start + relativedelta(days=1))
+		self.assertSearches(lambda: self.session.execute(q).fetchall(), 'ix_measurements_epoch')
+
+	def test_per_interval_uses_index(self):
+		q = Measurement.query.per_interval(300, start_at=self.start, end_at=self.start + relativedelta(days=1))
+		self.assertSearches(lambda: self.session.execute(q).fetchall(), 'sqlite_autoindex_measurement_rollups_1')
@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+from datetime import datetime
+import json
+
+__author__ = 'quentingerome'
+
+from .measurement_tests import BaseMeasurementTestCase
+from coolnhot.models import Measurement, MeasurementRollup, partitions, insert_measurements, rebuild_rollups, to_epoch
+from coolnhot.models.retention import compact
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, inspect
+
+
+class PartitionTestCase(BaseMeasurementTestCase):
+	start = datetime(2015, 9, 30, 12)
+
+	def _create_fixtures(self):
+		super(PartitionTestCase, self)._create_fixtures()
+		self.app.config['MEASUREMENT_PARTITIONS'] = True
+		partitions.init_app(self.app)
+		# Every 3 hours from Sep 30 to Nov 1 noon, the temperature being the day of the month
+		rows = []
+		created_at = self.start
+		while created_at < datetime(2015, 11, 1, 12):
+			rows.append((created_at, created_at.day, 50, 'default'))
+			created_at += relativedelta(hours=3)
+		with self.db.engine.begin() as connection:
+			insert_measurements(connection, rows)
+		self.count = len(rows)
+
+	def tearDown(self):
+		partitions.enabled = False
+		super(PartitionTestCase, self).tearDown()
+
+	def execute(self, q):
+		return self.session.execute(q).fetchall()
+
+	def test_write(self):
+		self.assertEqual(partitions.names(self.session.connection()),
+			['measurements_201509', 'measurements_201510', 'measurements_201511'])
+		self.assertEqual(Measurement.query.count(), 0)
+		indexes = [i['name'] for i in inspect(self.session.connection()).get_indexes('measurements_201510')]
+		self.assertIn('ix_measurements_201510_epoch', indexes)
+
+	def test_fan_out(self):
+		# Sep 30 20:00 - Oct 1 02:00 spans two partitions
+		rows = self.execute(Measurement.query.raw_per_interval(7200, datetime(2015, 9, 30, 20), datetime(2015, 10, 1, 2)))
+		self.assertEqual([(r.created_at, r.temperature) for r in rows], [('2015-09-30 20:00:00', 30), ('2015-10-01 00:00:00', 1)])
+
+		self.assertEqual(Measurement.query.avg(datetime(2015, 10, 10), datetime(2015, 10, 10, 12))['temperature'], 10)
+		self.assertEqual(len(self.execute(Measurement.query.raw_per_interval(86400, self.start))), 33)
+
+	def test_time_order(self):
+		# Encoding the epochs as deltas relies on the buckets being in order, whatever the planner does with the union
+		for q in (Measurement.query.per_interval(7200, self.start), Measurement.query.raw_per_interval(7200, self.start)):
+			self.assertIn('ORDER BY', str(q))
+			epochs = [r.epoch for r in self.execute(q)]
+			self.assertEqual(epochs, sorted(epochs))
+
+	def test_downsampled_in_time_order(self):
+		for downsample in ('lttb', 'minmax'):
+			r = self.assertOkJson(self.get('/measurements', query_string=dict(start_at=self.start.isoformat(),
+				end_at=datetime(2015, 11, 1, 12).isoformat(), max_points=20, downsample=downsample)))
+			created_at = [item['created_at'] for item in json.loads(r.data)['items']]
+			self.assertEqual(created_at, sorted(created_at))
+			self.assertEqual(created_at[0], '2015-09-30 12:00:00')
+
+		newest = Measurement.query.newest()
+		self.assertEqual(newest.created_at, datetime(2015, 11, 1, 9))
+		self.create_measurement(created_at=datetime(2015, 11, 2))
+		self.session.commit()
+		self.assertEqual(Measurement.query.newest().created_at, datetime(2015, 11, 2))
+
+	def test_rebuild_rollups(self):
+		expected = sorted(tuple(r) for r in self.execute(MeasurementRollup.__table__.select()))
+		with self.db.engine.begin() as connection:
+			rebuild_rollups(connection)
+		self.assertEqual(sorted(tuple(r) for r in self.execute(MeasurementRollup.__table__.select())), expected)
+
+	def test_names_cached(self):
+		statements = []
+		listener = lambda conn, cursor, statement, *args: statements.append(statement)
+		event.listen(self.db.engine, 'before_cursor_execute', listener)
+		try:
+			with self.db.engine.connect() as connection:
+				names = partitions.names(connection)
+				self.assertEqual(partitions.names(connection), names)
+				self.assertEqual(len([s for s in statements if 'sqlite_master' in s]), 1)
+
+				# Another process dropping a partition changes the schema version
+				with self.db.engine.begin() as other:
+					other.execute('DROP TABLE measurements_201509')
+				self.assertEqual(partitions.names(connection), names[1:])
+		finally:
+			event.remove(self.db.engine, 'before_cursor_execute', listener)
+
+	def test_compact(self):
+		deleted = compact(self.db.engine, 20 * 86400, now=to_epoch(datetime(2015, 10, 25)))
+		# September is dropped as a whole, Oct 1 - 4 deleted from the October partition
+		self.assertEqual(deleted['partitions'], 1)
+		self.assertEqual(deleted['measurements'], 4 * 8)
+		self.assertEqual(partitions.names(self.session.connection()), ['measurements_201510', 'measurements_201511'])
+		self.assertEqual(self.execute(MeasurementRollup.query.filter_by(resolution=86400).with_entities(
+			self.db.func.sum(MeasurementRollup.count)).statement)[0][0], self.count)
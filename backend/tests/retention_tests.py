@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+from datetime import datetime
+import os
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+from .sqlite_tests import SQLiteTestCase
+from coolnhot.models import Measurement, MeasurementRollup, data_version, insert_measurements, to_epoch
+from coolnhot.models.retention import compact, compact_from_config, vacuum, RetentionError
+from dateutil.relativedelta import relativedelta
+
+DAY = 86400
+
+
+class CompactTestCase(CoolnHotAppTestCase):
+	start = datetime(2015, 10, 1)
+	now = to_epoch(datetime(2015, 10, 11, 12))
+
+	def _create_fixtures(self):
+		super(CompactTestCase, self)._create_fixtures()
+		# One measurement per 30 minutes for 10 days
+		rows = [(self.start + relativedelta(minutes=i), 20, 50, 'default') for i in range(0, 10 * 24 * 60, 30)]
+		with self.db.engine.begin() as connection:
+			insert_measurements(connection, rows)
+
+	def rollup_counts(self):
+		return dict(self.session.query(MeasurementRollup.resolution, self.db.func.sum(MeasurementRollup.count)).group_by(
+			MeasurementRollup.resolution))
+
+	def test_compact(self):
+		version = data_version(self.session.connection())
+		self.session.commit()
+		deleted = compact(self.db.engine, 5 * DAY, {60: 8 * DAY, 86400: 0}, batch_size=100, now=self.now)
+		# Whole days are deleted: everything before Oct 6
+		self.assertEqual(deleted['measurements'], 5 * 48)
+		self.assertEqual(Measurement.query.count(), 5 * 48)
+		self.assertEqual(self.session.query(self.db.func.min(Measurement.created_at)).scalar(), datetime(2015, 10, 6))
+		# Minute rollups are pruned, the daily ones are kept whatever the setting
+		self.assertEqual(deleted['measurement_rollups'], 2 * 48 + 24)
+		self.assertEqual(self.rollup_counts(), {60: 7 * 48 + 24, 300: 10 * 48, 3600: 10 * 48, 86400: 10 * 48})
+
+		self.assertEqual(compact(self.db.engine, 5 * DAY, {60: 8 * DAY}, now=self.now), dict(measurements=0, measurement_rollups=0, partitions=0))
+		# Cached responses computed from the deleted measurements are stale
+		self.assertGreater(data_version(self.session.connection()), version)
+
+	def test_compact_from_config(self):
+		self.app.config.update(RETENTION_RAW=5 * DAY, RETENTION_ROLLUPS={}, COMPACT_BATCH_SIZE=100, COMPACT_PAUSE=0)
+		# Everything is older than the retention window by now
+		deleted = compact_from_config(self.db.engine, self.app.config)
+		self.assertEqual((deleted['measurements'], Measurement.query.count()), (10 * 48, 0))
+
+	def test_unrolled_measurements(self):
+		self.session.query(MeasurementRollup).delete()
+		self.session.commit()
+		self.assertRaises(RetentionError, compact, self.db.engine, 5 * DAY, now=self.now)
+		self.assertEqual(Measurement.query.count(), 10 * 48)
+
+	def test_unrolled_after_compact(self):
+		compact(self.db.engine, 5 * DAY, now=self.now)
+		# The daily rollups of the days compacted away must not vouch for measurements of the following days
+		with self.db.engine.begin() as connection:
+			connection.execute(Measurement.__table__.insert(), [
+				dict(created_at=datetime(2015, 10, 7, 0, 15), epoch=to_epoch(datetime(2015, 10, 7, 0, 15)), temperature=20,
+					humidity=50, sensor_id='default')
+			])
+		self.assertRaises(RetentionError, compact, self.db.engine, 5 * DAY, now=self.now + 3 * DAY)
+		self.assertEqual(Measurement.query.count(), 5 * 48 + 1)
+
+
+class VacuumTestCase(SQLiteTestCase):
+	def test_incremental_vacuum(self):
+		self.assertEqual(self.pragma('auto_vacuum'), 2)
+		rows = [(datetime(2015, 10, 1) + relativedelta(minutes=i), 20, 50, 'default') for i in range(0, 30000, 10)]
+		with self.db.engine.begin() as connection:
+			insert_measurements(connection, rows)
+		path = os.path.join(self.tmp, 'app.db')
+		vacuum(self.db.engine)
+		size = os.path.getsize(path)
+
+		compact(self.db.engine, DAY, now=to_epoch(datetime(2015, 11, 1)), batch_size=5000)
+		self.assertGreater(self.pragma('freelist_count'), 0)
+		vacuum(self.db.engine)
+		self.assertEqual(self.pragma('freelist_count'), 0)
+		self.assertLess(os.path.getsize(path), size)
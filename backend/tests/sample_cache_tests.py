@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from . import FakeApp
+from coolnhot.extensions.samples import SampleCache
+from coolnhot.factory import resolve_paths
+
+
+class SampleCacheTestCase(TestCase):
+	def setUp(self):
+		self.cache = SampleCache(FakeApp(SAMPLE_CACHE_CAPACITY=4))
+
+	def test_latest(self):
+		self.assertIsNone(self.cache.latest())
+		self.cache.append(1.5, 20, 50, 'a')
+		self.cache.append(2.5, 21, 51, 'b')
+		self.assertEqual(self.cache.latest().sensor_id, 'b')
+		sample = self.cache.latest('a')
+		self.assertEqual((sample.sequence, sample.epoch, sample.temperature, sample.humidity), (0, 1.5, 20, 50))
+		self.assertIsNone(self.cache.latest('c'))
+
+	def test_since(self):
+		for i in range(3):
+			self.cache.append(i, 20, 50, 'a')
+		cursor, samples, dropped = self.cache.since(1)
+		self.assertEqual((cursor, [s.epoch for s in samples], dropped), (3, [1, 2], 0))
+		self.assertEqual(self.cache.since(cursor), (3, [], 0))
+
+	def test_lapped(self):
+		for i in range(10):
+			self.cache.append(i, 20, 50, 'a')
+		# The oldest slot is the next one overwritten
+		cursor, samples, dropped = self.cache.since(0)
+		self.assertEqual((cursor, [s.epoch for s in samples], dropped), (10, [7, 8, 9], 7))
+		self.assertIsNone(self.cache.latest('b'))
+
+
+class SharedSampleCacheTestCase(TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.app = FakeApp(SAMPLE_CACHE_PATH=os.path.join(self.tmp, 'samples.ring'), SAMPLE_CACHE_CAPACITY=8)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_shared(self):
+		writer, reader = SampleCache(self.app), SampleCache(self.app)
+		writer.append(1, 20, 50, 'a')
+		self.assertEqual(reader.latest('a').temperature, 20)
+		writer.close()
+		reader.close()
+
+		# Samples survive restarts, a new capacity starts a new ring
+		self.assertEqual(SampleCache(self.app).sequence, 1)
+		self.app.config['SAMPLE_CACHE_CAPACITY'] = 16
+		self.assertEqual(SampleCache(self.app).sequence, 0)
+
+	def test_path_relative_to_app(self):
+		# Every process maps the same file whatever its working directory
+		app = FakeApp(root_path=self.tmp, SAMPLE_CACHE_PATH='samples.ring', SAMPLE_CACHE_CAPACITY=8)
+		resolve_paths(app)
+		self.assertEqual(app.config['SAMPLE_CACHE_PATH'], os.path.join(self.tmp, 'samples.ring'))
+		writer, reader = SampleCache(app), SampleCache(self.app)
+		writer.append(1, 20, 50, 'a')
+		self.assertEqual(reader.latest('a').temperature, 20)
+		writer.close()
+		reader.close()
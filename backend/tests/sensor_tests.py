@@ -0,0 +1,90 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from coolnhot import si7020
+from coolnhot.extensions.sensor import Sensor, wait
+from coolnhot.models import Measurement
+from coolnhot.models.buffer import MeasurementBuffer
+from coolnhot.manage import measure
+from . import CoolnHotAppTestCase, FakeApp
+from .fake_smbus import FakeSMBus, FakeSi7020
+
+
+class SensorRegistryTestCase(TestCase):
+	def setUp(self):
+		self._sleep = si7020.time.sleep
+		si7020.time.sleep = lambda seconds: None
+		self.bus1 = FakeSMBus({0x40: FakeSi7020(raw_temp=0x6000), 0x41: FakeSi7020(raw_temp=0x7000)})
+		self.bus2 = FakeSMBus({0x40: FakeSi7020(raw_temp=0x5000)})
+		self.sensor = Sensor(FakeApp(SENSORS={
+			'kitchen': dict(bus=self.bus1, address=0x40),
+			'bedroom': dict(bus=self.bus1, address=0x41, offset_temp=-1),
+			'cellar': dict(bus=self.bus2, address=0x40),
+		}))
+
+	def tearDown(self):
+		si7020.time.sleep = self._sleep
+
+	def test_read_all(self):
+		values = self.sensor.read_all()
+		self.assertEqual(values.keys(), ['bedroom', 'cellar', 'kitchen'])
+		self.assertAlmostEqual(values['kitchen'][0], -46.85 + 175.72 * 0x6000 / 2 ** 16)
+		self.assertAlmostEqual(values['bedroom'][0], -47.85 + 175.72 * 0x7000 / 2 ** 16)
+		self.assertAlmostEqual(values['cellar'][0], -46.85 + 175.72 * 0x5000 / 2 ** 16)
+
+	def test_conversions_overlap(self):
+		self.sensor.read_all()
+		# Every conversion is started before any result is read, whatever the bus
+		self.assertEqual(self.bus1.transactions[:2], [('write_byte', 0x41, 0xf5), ('write_byte', 0x40, 0xf5)])
+		self.assertEqual(self.bus2.transactions[0], ('write_byte', 0x40, 0xf5))
+
+	def test_start_read(self):
+		clock = [0]
+		sleeps = []
+
+		def sleep(seconds):
+			sleeps.append(seconds)
+			clock[0] += seconds
+
+		si7020.time.time, time = lambda: clock[0], si7020.time.time
+		try:
+			pending = self.sensor.start_read_all()
+			self.assertFalse(any(p.done for p in pending.itervalues()))
+			self.assertEqual(len(self.bus1.transactions + self.bus2.transactions), 3)
+
+			wait(pending.values(), sleep=sleep, clock=lambda: clock[0])
+		finally:
+			si7020.time.time = time
+		self.assertAlmostEqual(pending['cellar'].result()[0], -46.85 + 175.72 * 0x5000 / 2 ** 16)
+		# The thread only sleeps until the first conversion is due, then between polls of the busy chips
+		self.assertAlmostEqual(sleeps[0], si7020.Si7020.CONVERSION_TIME)
+		self.assertEqual(len(sleeps), 1 + FakeSi7020().busy_polls)
+
+	def test_opened_on_first_use(self):
+		self.assertFalse(self.sensor.opened)
+		self.assertEqual(self.sensor.ids, ['bedroom', 'cellar', 'kitchen'])
+		self.assertEqual(self.bus1.transactions + self.bus2.transactions, [])
+		self.assertFalse(self.sensor.opened)
+		self.sensor.read_all()
+		self.assertTrue(self.sensor.opened)
+
+	def test_default_sensor(self):
+		self.assertEqual(self.sensor.ids[0], 'bedroom')
+		self.assertAlmostEqual(self.sensor.get_temp(), -47.85 + 175.72 * 0x7000 / 2 ** 16)
+
+
+class MultiSensorMeasurementTestCase(CoolnHotAppTestCase):
+	def test_measure(self):
+		self.app.config['SENSORS'] = dict(a={}, b={})
+		from coolnhot.extensions import sensor, sample_cache
+		sensor.init_app(self.app)
+		measure(MeasurementBuffer())
+		self.assertEqual(sorted(m.sensor_id for m in Measurement.query), ['a', 'b'])
+		self.assertAlmostEqual(sample_cache.latest('a').temperature, Measurement.query.filter_by(sensor_id='a').one().temperature, places=4)
+
+		q = Measurement.query.per_interval(60, sensor_id='a')
+		self.assertEqual(len(self.session.execute(q).fetchall()), 1)
+		self.assertEqual(self.session.execute(Measurement.query.per_interval(60)).fetchone().temperature,
+			sum(m.temperature for m in Measurement.query) / 2)
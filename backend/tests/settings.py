@@ -6,4 +6,6 @@ DEBUG = False
 TESTING = True
 SECRET_KEY = "TEST?"
 SENSOR_DEBUG = True
-SERVER_NAME = "127.0.0.1:5000"
\ No newline at end of file
+SERVER_NAME = "127.0.0.1:5000"
+MEASUREMENT_BUFFER_SPILL = None
+SAMPLE_CACHE_PATH = None
@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from coolnhot import si7020
+from .fake_smbus import FakeSMBus, FakeSi7020
+
+
+class Si7020TestCase(TestCase):
+	def setUp(self):
+		self.sleeps = []
+		self._sleep = si7020.time.sleep
+		si7020.time.sleep = self.sleeps.append
+		self.chip = FakeSi7020(raw_temp=0x6000, raw_hum=0x8000)
+		self.bus = FakeSMBus({0x40: self.chip})
+
+	def tearDown(self):
+		si7020.time.sleep = self._sleep
+
+	def test_read_hold_master(self):
+		sensor = si7020.Si7020(bus=self.bus)
+		temp, hum = sensor.read()
+		self.assertAlmostEqual(temp, -46.85 + 175.72 * 0.375)
+		self.assertAlmostEqual(hum, -6 + 125 * 0.5)
+		self.assertEqual(self.bus.transactions, [
+			('read_i2c_block_data', 0x40, si7020.Si7020.CMD_READ_HUM_HOLD),
+			('read_i2c_block_data', 0x40, si7020.Si7020.CMD_READ_TEMP_PREV),
+		])
+		self.assertEqual(self.sleeps, [])
+
+	def test_read_no_hold_master(self):
+		sensor = si7020.Si7020(bus=self.bus, hold_master=False)
+		self.assertAlmostEqual(sensor.get_rel_humidity(), -6 + 125 * 0.5)
+		self.assertEqual(len(self.sleeps), self.chip.busy_polls)
+		self.assertAlmostEqual(sensor.get_temp_from_previous(), -46.85 + 175.72 * 0.375)
+		self.assertAlmostEqual(sensor.get_temp(), -46.85 + 175.72 * 0.375)
+
+	def test_start_read(self):
+		sensor = si7020.Si7020(bus=self.bus)
+		pending = sensor.start_read()
+		self.assertEqual(self.bus.transactions, [('write_byte', 0x40, si7020.Si7020.CMD_READ_HUM_NOHOLD)])
+		self.assertRaises(si7020.Si7020Error, pending.result)
+		polls = 0
+		while not pending.poll():
+			polls += 1
+		self.assertEqual(polls, self.chip.busy_polls)
+		temp, hum = pending.result()
+		self.assertAlmostEqual(temp, -46.85 + 175.72 * 0.375)
+		self.assertAlmostEqual(hum, -6 + 125 * 0.5)
+		self.assertEqual(self.sleeps, [])
+
+	def test_start_read_retry(self):
+		self.chip.corrupt = 1
+		sensor = si7020.Si7020(bus=self.bus)
+		pending = sensor.start_read()
+		while not pending.poll():
+			pass
+		self.assertAlmostEqual(pending.result()[1], -6 + 125 * 0.5)
+		self.assertEqual(sensor.errors, {'crc': 1})
+		# The conversion is started again rather than read with the blocking hold master commands
+		self.assertEqual([t[2] for t in self.bus.transactions if t[0] == 'write_byte'],
+			[si7020.Si7020.CMD_READ_HUM_NOHOLD] * 2)
+		self.assertEqual(self.sleeps, [])
+
+	def test_start_read_failure(self):
+		self.chip.corrupt = 10
+		sensor = si7020.Si7020(bus=self.bus, retries=3, reset_after=3)
+		pending = sensor.start_read()
+		while not pending.poll():
+			pass
+		self.assertRaises(si7020.Si7020CRCError, pending.result)
+		self.assertEqual(sensor.errors, {'crc': 4, 'reset': 1})
+		self.assertEqual(self.chip.resets, 1)
+		self.assertEqual(self.sleeps, [])
+
+	def test_conversion_timeout(self):
+		self.chip.busy_polls = 10 ** 6
+		sensor = si7020.Si7020(bus=self.bus, hold_master=False)
+		sensor.CONVERSION_TIMEOUT = 0
+		self.assertRaises(si7020.Si7020Error, sensor.get_rel_humidity)
+
+	def test_crc8(self):
+		# Reference values for the x^8 + x^5 + x^4 + 1 polynomial
+		self.assertEqual(si7020.crc8([0xdc]), 0x79)
+		self.assertEqual(si7020.crc8([0x68, 0x3a]), 0x7c)
+
+	def test_crc_retry(self):
+		self.chip.corrupt = 2
+		sensor = si7020.Si7020(bus=self.bus)
+		self.assertAlmostEqual(sensor.get_rel_humidity(), -6 + 125 * 0.5)
+		self.assertEqual(sensor.errors, {'crc': 2})
+		self.assertEqual(self.sleeps, [.01, .02])
+		self.assertEqual(self.chip.resets, 0)
+
+	def test_crc_failure(self):
+		self.chip.corrupt = 10
+		sensor = si7020.Si7020(bus=self.bus, retries=3, reset_after=3)
+		self.assertRaises(si7020.Si7020CRCError, sensor.get_rel_humidity)
+		self.assertEqual(sensor.errors, {'crc': 4, 'reset': 1})
+		self.assertEqual(self.chip.resets, 1)
+		# The third failure resets the chip, which is waited for along with the backoff
+		self.assertEqual(len(self.sleeps), 3)
+		self.assertAlmostEqual(self.sleeps[2], .04 + si7020.Si7020.RESET_TIME)
+
+	def test_no_hold_master_crc(self):
+		self.chip.corrupt = 1
+		sensor = si7020.Si7020(bus=self.bus, hold_master=False)
+		self.assertAlmostEqual(sensor.get_temp(), -46.85 + 175.72 * 0.375)
+		self.assertEqual(sensor.errors, {'crc': 1})
@@ -0,0 +1,35 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+
+__author__ = 'quentingerome'
+
+from . import CoolnHotAppTestCase
+
+
+class SQLiteTestCase(CoolnHotAppTestCase):
+	def _create_app(self, *args, **kwargs):
+		self.tmp = tempfile.mkdtemp()
+		config = os.path.join(self.tmp, 'settings.py')
+		with open(config, 'w') as f:
+			f.write('SQLALCHEMY_DATABASE_URI = %r\n' % ('sqlite:///' + os.path.join(self.tmp, 'app.db')))
+		os.environ['APPLICATION_SETTINGS'] = config
+		try:
+			super(SQLiteTestCase, self)._create_app(*args, **kwargs)
+		finally:
+			del os.environ['APPLICATION_SETTINGS']
+
+	def tearDown(self):
+		super(SQLiteTestCase, self).tearDown()
+		shutil.rmtree(self.tmp)
+
+	def pragma(self, name):
+		return self.session.execute('PRAGMA %s' % name).scalar()
+
+	def test_pragmas(self):
+		self.assertEqual(self.pragma('journal_mode'), 'wal')
+		self.assertEqual(self.pragma('synchronous'), 1)
+		self.assertEqual(self.pragma('busy_timeout'), 5000)
+		self.assertEqual(self.pragma('cache_size'), -8 * 1024)
+		self.assertEqual(self.pragma('wal_autocheckpoint'), 1000)
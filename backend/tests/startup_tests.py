@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Modules only some commands need, which must not be imported to start the app
+LAZY_MODULES = ('coolnhot.si7020', 'smbus', 'flask_migrate', 'alembic', 'gunicorn')
+
+PROFILE = """
+import json, sys, time
+started = time.time()
+%s
+print(json.dumps(dict(seconds=time.time() - started, modules=[m for m in %r if sys.modules.get(m)])))
+"""
+
+
+class StartupTestCase(TestCase):
+	#: Upper bound of the seconds the imports and the app creation take, far above what they take on a Raspberry Pi
+	#: once the imports are cached, so it only trips on a heavy import creeping back in
+	MAX_SECONDS = 2.0
+
+	def profile(self, code):
+		"""
+		Run `code` in a new interpreter and return its wall clock time and the :data:`LAZY_MODULES` it imported.
+		"""
+		output = subprocess.check_output([sys.executable, '-c', PROFILE % (code, LAZY_MODULES)], cwd=BACKEND)
+		return json.loads(output.splitlines()[-1])
+
+	def test_web_app(self):
+		profile = self.profile("from coolnhot.factory import create_app; from tests import settings; "
+			"create_app('tests', settings)")
+		self.assertEqual(profile['modules'], [])
+		self.assertLess(profile['seconds'], self.MAX_SECONDS)
+
+	def test_measure(self):
+		profile = self.profile("import manage; from tests import settings; from coolnhot.extensions import db; "
+			"from coolnhot.manage import MeasureCommand; app = manage.create_app('tests', settings); "
+			"app.test_request_context().push(); db.create_all(); MeasureCommand().run()")
+		self.assertEqual(profile['modules'], [])
+		self.assertLess(profile['seconds'], self.MAX_SECONDS)
+
+	def test_manage_creates_the_app_lazily(self):
+		import manage
+		self.assertIs(manage.manager.app, manage.make_app)
@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase
+
+__author__ = 'quentingerome'
+
+from coolnhot.statistics import RunningStats, P2Quantile, Summary, is_stat, stat_columns
+import math
+import random
+
+
+def exact_percentile(values, q):
+	values = sorted(values)
+	position = (len(values) - 1) * q
+	below = int(math.floor(position))
+	above = min(below + 1, len(values) - 1)
+	return values[below] + (values[above] - values[below]) * (position - below)
+
+
+class RunningStatsTestCase(TestCase):
+	def test_welford(self):
+		values = [20 + random.gauss(0, 2) for _ in range(1000)]
+		stats = RunningStats()
+		for v in values:
+			stats.add(v)
+		mean = sum(values) / len(values)
+		self.assertEqual(stats.count, 1000)
+		self.assertAlmostEqual(stats.mean, mean)
+		self.assertEqual((stats.min, stats.max), (min(values), max(values)))
+		self.assertAlmostEqual(stats.stddev, math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)))
+		self.assertIsNone(RunningStats().stddev)
+
+
+class P2QuantileTestCase(TestCase):
+	def test_exact_for_few_values(self):
+		quantile = P2Quantile(0.95)
+		self.assertIsNone(quantile.value())
+		for v in (3, 1, 2, 5):
+			quantile.add(v)
+		self.assertAlmostEqual(quantile.value(), exact_percentile([3, 1, 2, 5], 0.95))
+
+	def test_estimate(self):
+		values = [random.uniform(10, 30) for _ in range(5000)]
+		for q in (0.5, 0.95):
+			quantile = P2Quantile(q)
+			for v in values:
+				quantile.add(v)
+			self.assertAlmostEqual(quantile.value(), exact_percentile(values, q), delta=0.5)
+
+	def test_extremes(self):
+		values = [random.uniform(0, 100) for _ in range(1000)]
+		for q, expected in ((0, min(values)), (1, max(values))):
+			quantile = P2Quantile(q)
+			for v in values:
+				quantile.add(v)
+			self.assertEqual(quantile.value(), expected)
+
+	def test_summary(self):
+		summary = Summary([50])
+		for v in range(1, 6):
+			summary.add(v)
+		self.assertEqual((summary.get('min'), summary.get('p50'), summary.get('count')), (1, 3, 5))
+		self.assertTrue(is_stat('p95') and is_stat('stddev') and not is_stat('p101') and not is_stat('median'))
+		# A single name per percentile
+		self.assertTrue(is_stat('p0') and is_stat('p5') and is_stat('p100') and not is_stat('p05') and not is_stat('p00'))
+		self.assertEqual(stat_columns(['count', 'p95']), ('count', 'temperature_p95', 'humidity_p95'))
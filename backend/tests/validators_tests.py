@@ -0,0 +1,100 @@
+# -*- coding: UTF-8 -*-
+import json
+import arrow
+
+__author__ = 'quentingerome'
+
+from flask import request
+from dateutil.parser import parse
+from werkzeug import MultiDict
+from . import CoolnHotAppTestCase
+from coolnhot import validators
+
+
+class CompiledSchemaTestCase(CoolnHotAppTestCase):
+	def schema(self):
+		return validators.Schema(dict(
+			name=validators.Validator(validators.String(lower=True)),
+			count=validators.Validator(validators.Int(), default=1),
+			flag=validators.CheckboxValidator(),
+			tags=validators.Validator(validators.Split(), aslist=True),
+			required=validators.Validator(validators.Required() | validators.Int(), field='req'),
+			default_first=validators.Validator(validators.Default(['3']) | validators.Int()),
+			options=validators.Validator(validators.String(), startswith='opt_', aslist=True),
+		), post_validators=[validators.FieldsMatch('count', 'required')])
+
+	def assertSameValidation(self, path, view_kwargs=None, **kwargs):
+		schema = self.schema()
+		compiled = schema.compile()
+		with self.app.test_request_context(path, **kwargs):
+			args = request.args.copy()
+			args.update(request.form)
+			if request.get_json(silent=True):
+				args.update(request.json)
+			args.update(request.files)
+			args.update(view_kwargs or {})
+			expected = schema.validate(args)
+			result = compiled.validate(compiled.sources(request, view_kwargs))
+
+		self.assertEqual(result[0], expected[0])
+		self.assertEqual(dict((k, e.msg) for k, e in result[1].items()), dict((k, e.msg) for k, e in expected[1].items()))
+		self.assertEqual(sorted(result[2].iterlists()), sorted(expected[2].iterlists()))
+		return result
+
+	def test_query_string(self):
+		values, errors, extra = self.assertSameValidation('/?name=%20Foo%20&req=1&tags=a,b&tags=c&flag=off&opt_x=hello&other=2')
+		self.assertEqual(values, dict(name='foo', count=1, flag=False, tags=['a', 'b', 'c'], required=1, default_first=3,
+			options=[('opt_x', 'hello')]))
+		self.assertEqual(extra, MultiDict([('opt_x', 'hello'), ('other', '2')]))
+		# Several prefixed fields keep their whole first value
+		values, errors, extra = self.assertSameValidation('/?req=1&opt_a=hello&opt_b=world&opt_b=again')
+		self.assertEqual(sorted(values['options']), [('opt_a', 'hello'), ('opt_b', 'world')])
+
+	def test_missing_and_invalid(self):
+		values, errors, extra = self.assertSameValidation('/?count=x')
+		self.assertEqual(sorted(errors), ['count', 'req'])
+		self.assertEqual(values['tags'], [])
+		self.assertSameValidation('/?req=2&count=3')
+
+	def test_body_and_view_kwargs(self):
+		self.assertSameValidation('/?name=a', method='POST', data=dict(name='b', req='1', unknown='x'))
+		self.assertSameValidation('/?tags=a', method='POST', data=json.dumps(dict(tags=['b', 'c'], req=1, flag=True)),
+			content_type='application/json')
+		self.assertSameValidation('/?count=2', view_kwargs=dict(req=2, name='view'))
+
+
+class DateFiltersTestCase(CoolnHotAppTestCase):
+	INPUTS = ['2015-10-01', '2015-10-01T12:00:00', '2015-10-01T12:00:00Z', '2015-10-01T12:00:00+02:00',
+		'2015-10-01T12:00-0530', '2015-10-01 12:00', '2015-10-01T12:00:00.123', '1443700800', '1443700800.5', '2015',
+		'2015-13-01', '2015-02-30', '2015/10/01']
+
+	def test_arrow_same_as_arrow_get(self):
+		for v in self.INPUTS:
+			for _ in range(2):
+				result, expected = validators.filters.parse_arrow(v), arrow.get(v)
+				self.assertEqual(result, expected, v)
+				self.assertEqual(result.utcoffset(), expected.utcoffset(), v)
+
+	def test_date_same_as_dateutil(self):
+		f = validators.Date()
+		for v in self.INPUTS[:7] + ['2015/10/01']:
+			result, expected = f.filter_value(v), parse(v)
+			self.assertEqual(result, expected, v)
+			self.assertEqual(result.utcoffset(), expected.utcoffset(), v)
+		self.assertRaises(validators.Invalid, f.filter_value, '2015-02-30')
+
+	def test_invalid_arrow(self):
+		self.assertRaises(validators.Invalid, validators.Arrow().filter_value, 'garbage')
+		self.assertNotIn('garbage', validators.filters.parse_arrow.cache)
+
+	def test_memoize_evicts_least_recently_used(self):
+		calls = []
+
+		@validators.filters.memoize(2)
+		def f(v):
+			calls.append(v)
+			return v * 2
+
+		self.assertEqual([f(1), f(2), f(1), f(3), f(1), f(2)], [2, 4, 2, 6, 2, 4])
+		self.assertEqual(calls, [1, 2, 3, 2])
+		self.assertEqual(list(f.cache), [1, 2])